@@ -38,11 +38,10 @@ function FarmerDashboard() {
         setLoading(false);
         if (res.data.farmer_id) {
           localStorage.setItem("farmer_id", res.data.farmer_id);
-          fetchTokens(res.data.farmer_id);
-        } else {
-          setTokens([]);
-          setTokenLoading(false);
         }
+        // The dashboard already carries the farmer's verified tokens
+        setTokens(res.data.tokens || []);
+        setTokenLoading(false);
       })
       .catch(err => {
         if (err.response && err.response.status === 401) {
@@ -53,19 +52,6 @@ function FarmerDashboard() {
         setLoading(false);
         setTokenLoading(false);
       });
-
-    // Fetch tokens for the farmer
-    function fetchTokens(farmerId) {
-      setTokenLoading(true);
-      axios.get(`http://127.0.0.1:8000/tokens_by_farmer?farmer_id=${farmerId}`)
-        .then(res => {
-          setTokens(res.data);
-          setTokenLoading(false);
-        })
-        .catch(err => {
-          setTokenLoading(false);
-        });
-    }
   }, []);
 
   // Check if farmer profile exists
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
-import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import { fetchAllPages } from './fetchAllPages';
 import riceField from '../assets/rice_field.jpg';
 
 function InvestorDashboard({ requireInvestorLogin }) {
@@ -19,11 +19,11 @@ function InvestorDashboard({ requireInvestorLogin }) {
       navigate("/");
       return;
     }
-    axios.get("http://127.0.0.1:8000/my_contracts", {
+    fetchAllPages("http://127.0.0.1:8000/my_contracts", {
       headers: { Authorization: `Bearer ${token}` }
     })
-      .then(res => {
-        setContracts(res.data);
+      .then(data => {
+        setContracts(data);
         setLoading(false);
       })
       .catch(err => {
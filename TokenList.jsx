@@ -1,9 +1,9 @@
 import React, { useEffect, useState } from 'react';
-import axios from 'axios';
 import Select from 'react-select';
 import countryList from 'react-select-country-list';
 import InvestmentModal from './InvestmentModal';
 import InvestorLoginModal from './InvestorLoginModal';
+import { fetchAllPages } from './fetchAllPages';
 
 function TokenList() {
   const [tokens, setTokens] = useState([]);
@@ -38,11 +38,11 @@ function TokenList() {
 
   useEffect(() => {
     // Fetch all tokens to extract unique dropdown options for crop type, variety, and country
-    axios.get("http://127.0.0.1:8000/tokens_available")
-      .then(res => {
-        setTokens(res.data);
+    fetchAllPages("http://127.0.0.1:8000/tokens_available")
+      .then(data => {
+        setTokens(data);
         // Extract unique crop types, varieties, and countries from open tokens (to match what is shown)
-        const openTokens = res.data.filter(t => t.status === 'open');
+        const openTokens = data.filter(t => t.status === 'open');
         setCropTypeOptions([...new Set(openTokens.map(t => t.crop_name))].map(val => ({ label: val, value: val })));
         setVarietyOptions([...new Set(openTokens.map(t => t.crop_variety))].map(val => ({ label: val, value: val })));
         setCountryDropdownOptions([...new Set(openTokens.map(t => t.country))].map(val => ({ label: val, value: val })));
@@ -50,6 +50,16 @@ function TokenList() {
       .catch(err => console.error("Error fetching tokens for dropdowns:", err));
   }, []);
 
+  useEffect(() => {
+    // Funding progress is pushed by the server: merge changed tokens into the list instead of re-fetching it
+    const source = new EventSource("http://127.0.0.1:8000/token_updates");
+    source.addEventListener('tokens', (event) => {
+      const updates = new Map(JSON.parse(event.data).map(t => [t.id, t]));
+      setTokens(prev => prev.map(t => updates.get(t.id) || t));
+    });
+    return () => source.close();
+  }, []);
+
   const fetchTokens = () => {
     const url = new URL("http://127.0.0.1:8000/tokens_available");
     const params = new URLSearchParams();
@@ -62,8 +72,8 @@ function TokenList() {
 
     url.search = params.toString();
 
-    axios.get(url.toString())
-      .then((res) => setTokens(res.data))
+    fetchAllPages(url.toString())
+      .then((data) => setTokens(data))
       .catch((err) => console.error("Error fetching tokens:", err));
   };
 
@@ -0,0 +1,237 @@
+# Precomputed funding totals per farmer, crop, country and investor (models.FundingAggregate).
+# Writers add their deltas inside their own transaction (tokens_offered / purchased), so the totals commit or
+# roll back together with the change; reads are a primary-key lookup whatever the size of contracts and
+# investments. The marketplace total is not stored: every purchase would update that one row, and concurrent
+# purchases would queue on its lock. It is summed from the farmer rows when read (one row per farmer).
+# rebuild() recomputes everything from the tokens and investments tables, check() compares.
+# Usage: python -m aggregates {rebuild,check}
+import argparse
+import sys
+from collections import defaultdict
+from typing import Optional
+from sqlalchemy import bindparam, delete, func, insert, select
+from sqlalchemy.orm import Session
+import database, http_cache, models
+
+COUNTERS = ("tokens_offered", "tokens_sold", "amount_raised", "purchases")
+
+
+# Statements are built once per dialect; constructing them costs more than running them
+_UPSERTS = {}
+
+
+def _upsert_statement(dialect: str):
+    if dialect not in _UPSERTS:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        table = models.FundingAggregate.__table__
+        stmt = dialect_insert(table)
+        _UPSERTS[dialect] = stmt.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.key],
+            set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS}
+        )
+    return _UPSERTS[dialect]
+
+
+def _upsert(db: Session, deltas: dict):
+    """Add {(scope, key): {counter: delta}} to the aggregate rows, creating missing ones."""
+    if not deltas:
+        return
+    # Sorted, so concurrent writers lock rows in the same order
+    db.execute(_upsert_statement(db.bind.dialect.name), [
+        {"scope": scope, "key": key, **{name: values.get(name, 0) for name in COUNTERS}}
+        for (scope, key), values in sorted(deltas.items())
+    ])
+
+
+def _groups(farmer_id, crop_name, country):
+    return [("farmer", str(farmer_id)), ("crop", crop_name or ""), ("country", country or "")]
+
+
+_TOKEN_GROUPS = select(models.Token.id, models.Token.farmer_id, models.Crop.crop_name, models.Farmer.country,
+                       models.Token.price_per_token) \
+    .select_from(models.Token) \
+    .outerjoin(models.Crop, models.Crop.id == models.Token.crop_id) \
+    .outerjoin(models.Farmer, models.Farmer.id == models.Token.farmer_id) \
+    .where(models.Token.id.in_(bindparam("token_ids", expanding=True)))
+
+
+def _token_groups(db: Session, token_ids) -> dict:
+    """{token_id: (farmer id, crop name, country, price_per_token)} in one query."""
+    rows = db.execute(_TOKEN_GROUPS, {"token_ids": sorted(set(token_ids))}).all()
+    return {row[0]: row[1:] for row in rows}
+
+
+def tokens_offered(db: Session, tokens):
+    """Count new tokens (pairs of token id, token_count) in the current transaction; the caller commits."""
+    tokens = list(tokens)
+    if not tokens:
+        return
+    groups = _token_groups(db, [token_id for token_id, _ in tokens])
+    deltas = defaultdict(lambda: defaultdict(int))
+    for token_id, count in tokens:
+        farmer_id, crop_name, country, _ = groups[token_id]
+        for group in _groups(farmer_id, crop_name, country):
+            deltas[group]["tokens_offered"] += count or 0
+    _upsert(db, deltas)
+
+
+def purchased(db: Session, purchases):
+    """Count purchases (triples of token id, investor id, quantity) in the current transaction."""
+    purchases = list(purchases)
+    if not purchases:
+        return
+    groups = _token_groups(db, [token_id for token_id, _, _ in purchases])
+    deltas = defaultdict(lambda: defaultdict(int))
+    for token_id, investor_id, quantity in purchases:
+        farmer_id, crop_name, country, price = groups[token_id]
+        for group in _groups(farmer_id, crop_name, country) + [("investor", str(investor_id))]:
+            deltas[group]["tokens_sold"] += quantity
+            deltas[group]["amount_raised"] += quantity * (price or 0)
+            deltas[group]["purchases"] += 1
+    _upsert(db, deltas)
+
+
+def compute(db: Session) -> dict:
+    """Every aggregate recomputed from tokens and investments: {(scope, key): {counter: value}}.
+
+    Supply-side totals come from the tokens themselves; purchases and investor totals from the investments
+    ledger (every contract also writes an investment).
+    """
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    tokens = db.execute(
+        select(models.Token.farmer_id, models.Crop.crop_name, models.Farmer.country,
+               func.sum(models.Token.token_count), func.sum(models.Token.tokens_sold),
+               func.sum(models.Token.tokens_sold * models.Token.price_per_token))
+        .select_from(models.Token)
+        .outerjoin(models.Crop, models.Crop.id == models.Token.crop_id)
+        .outerjoin(models.Farmer, models.Farmer.id == models.Token.farmer_id)
+        .group_by(models.Token.farmer_id, models.Crop.crop_name, models.Farmer.country)
+    ).all()
+    for farmer_id, crop_name, country, offered, sold, raised in tokens:
+        for group in _groups(farmer_id, crop_name, country):
+            totals[group]["tokens_offered"] += offered or 0
+            totals[group]["tokens_sold"] += sold or 0
+            totals[group]["amount_raised"] += raised or 0
+
+    investments = db.execute(
+        select(models.Investment.investor_id, models.Token.farmer_id, models.Crop.crop_name, models.Farmer.country,
+               func.count(), func.sum(models.Investment.quantity),
+               func.sum(models.Investment.quantity * models.Token.price_per_token))
+        .select_from(models.Investment)
+        .join(models.Token, models.Token.id == models.Investment.token_id)
+        .outerjoin(models.Crop, models.Crop.id == models.Token.crop_id)
+        .outerjoin(models.Farmer, models.Farmer.id == models.Token.farmer_id)
+        .group_by(models.Investment.investor_id, models.Token.farmer_id, models.Crop.crop_name, models.Farmer.country)
+    ).all()
+    for investor_id, farmer_id, crop_name, country, count, quantity, raised in investments:
+        for group in _groups(farmer_id, crop_name, country):
+            totals[group]["purchases"] += count
+        investor = totals[("investor", str(investor_id))]
+        investor["purchases"] += count
+        investor["tokens_sold"] += quantity or 0
+        investor["amount_raised"] += raised or 0
+    return dict(totals)
+
+
+def rebuild(db: Session) -> int:
+    """Replace every aggregate with values recomputed from scratch. Returns the number of rows."""
+    totals = compute(db)
+    db.execute(delete(models.FundingAggregate))
+    rows = [{"scope": scope, "key": key, **values} for (scope, key), values in totals.items()]
+    for start in range(0, len(rows), 1000):
+        db.execute(insert(models.FundingAggregate), rows[start:start + 1000])
+    db.commit()
+    http_cache.versions.bump("funding_aggregates")
+    return len(rows)
+
+
+def check(db: Session) -> list:
+    """Aggregates that differ from a recomputation: [(scope, key, stored counters, expected counters)]."""
+    expected = compute(db)
+    stored = {
+        (row.scope, row.key): {name: getattr(row, name) for name in COUNTERS}
+        for row in db.query(models.FundingAggregate).all()
+    }
+    empty = dict.fromkeys(COUNTERS, 0)
+    return [
+        (scope, key, stored.get((scope, key)), expected.get((scope, key)))
+        for scope, key in sorted(set(expected) | set(stored))
+        if stored.get((scope, key), empty) != expected.get((scope, key), empty)
+    ]
+
+
+_TOTAL = select(func.count(), *(func.coalesce(func.sum(models.FundingAggregate.__table__.c[name]), 0).label(name)
+                                 for name in COUNTERS)) \
+    .where(models.FundingAggregate.scope == "farmer")
+
+
+def get(db: Session, scope: str, key: str = ""):
+    """One aggregate row, or None when nothing was offered or bought in that group yet.
+
+    The "total" scope is the sum of the farmer rows (every token has exactly one farmer group).
+    """
+    if scope == "total":
+        row = db.execute(_TOTAL).one()
+        return row if row[0] else None
+    return db.get(models.FundingAggregate, (scope, key))
+
+
+def as_stats(scope: str, key: str, row=None) -> dict:
+    """schemas.FundingStats fields for an aggregate row (all zero without one)."""
+    values = {name: getattr(row, name) if row is not None else 0 for name in COUNTERS}
+    offered = values["tokens_offered"]
+    return {
+        "scope": scope, "key": key, **values,
+        "tokens_left": offered - values["tokens_sold"] if offered else None,
+        "funding_percentage": round(values["tokens_sold"] / offered * 100, 2) if offered else None,
+    }
+
+
+def stats(db: Session, scope: str, key: str = "") -> dict:
+    return as_stats(scope, key, get(db, scope, key))
+
+
+def token_stats(db: Session, token_id: int) -> Optional[dict]:
+    """Funding progress of one token from its own counters (purchases is not tracked per token)."""
+    token = db.query(models.Token.token_count, models.Token.tokens_sold, models.Token.price_per_token) \
+        .filter(models.Token.id == token_id).first()
+    if token is None:
+        return None
+    offered, sold = token.token_count or 0, token.tokens_sold or 0
+    return {
+        "scope": "token", "key": str(token_id), "tokens_offered": offered, "tokens_sold": sold,
+        "amount_raised": sold * (token.price_per_token or 0), "purchases": None, "tokens_left": offered - sold,
+        "funding_percentage": round(sold / offered * 100, 2) if offered else 0.0,
+    }
+
+
+def top(db: Session, scope: str, limit: int = 20) -> list:
+    """Groups of a scope with the most raised first."""
+    rows = db.query(models.FundingAggregate).filter(models.FundingAggregate.scope == scope) \
+        .order_by(models.FundingAggregate.amount_raised.desc()).limit(limit).all()
+    return [as_stats(row.scope, row.key, row) for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aggregates", description="Maintain the funding aggregates.")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args(argv)
+    db = database.SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(db)} aggregates")
+            return
+        mismatches = check(db)
+    finally:
+        db.close()
+    for scope, key, stored, expected in mismatches:
+        print(f"{scope} {key!r}: stored {stored}, expected {expected}")
+    print(f"{len(mismatches)} mismatched aggregates")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# In-process caches for authenticated requests: decoded JWT claims by token string (so a repeat bearer
+# token skips the HMAC check) and account ids by (kind, email) (so the route skips its account lookup).
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class AuthCache:
+    """Bounded LRU map; entries may carry an absolute expiry (epoch seconds) after which they are dropped."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, expires_at: float = None):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# token string -> claims, expiring at the token's exp
+tokens = AuthCache(int(os.getenv("CROPCHAIN_TOKEN_CACHE_SIZE", 10_000)))
+# ("farmer" | "investor", email) -> account id
+principals = AuthCache(int(os.getenv("CROPCHAIN_PRINCIPAL_CACHE_SIZE", 10_000)))
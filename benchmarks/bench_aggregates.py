@@ -0,0 +1,118 @@
+# Funding totals per country, farmer and investor: GROUP BY scans over tokens/investments versus the
+# precomputed aggregates, at two table sizes (aggregate reads should not grow with the tables). Then many
+# concurrent buyers (create_contract, create_contracts and invest_in_token) run against the same groups,
+# and the incrementally maintained aggregates must equal a full recomputation (aggregates.check).
+# Usage: python -m benchmarks.bench_aggregates [buyers] [purchases_per_buyer]
+import random
+import sys
+import threading
+import time
+from sqlalchemy import func, insert
+import aggregates, crud, migrations, models, schemas
+from benchmarks.common import temp_engine, populate, timed
+
+
+def _scan_country(db, country):
+    return db.query(func.sum(models.Token.tokens_sold * models.Token.price_per_token)) \
+        .join(models.Farmer, models.Farmer.id == models.Token.farmer_id) \
+        .filter(models.Farmer.country == country).scalar()
+
+
+def _scan_investor(db, investor_id):
+    return db.query(func.sum(models.Investment.quantity * models.Token.price_per_token)) \
+        .join(models.Token, models.Token.id == models.Investment.token_id) \
+        .filter(models.Investment.investor_id == investor_id).scalar()
+
+
+def _setup(tokens: int):
+    engine, SessionLocal = temp_engine(f"aggregates_{tokens}")
+    migrations.upgrade(engine)
+    populate(engine, tokens=tokens)
+    rng = random.Random(3)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [
+            {"email": f"investor{i}@example.com", "hashed_password": "x"} for i in range(1, 101)
+        ])
+        conn.execute(insert(models.Investment), [
+            {"token_id": rng.randint(1, tokens), "investor_id": str(rng.randint(1, 100)), "quantity": rng.randint(1, 20)}
+            for _ in range(tokens * 2)
+        ])
+    with SessionLocal() as db:
+        aggregates.rebuild(db)
+    return engine, SessionLocal
+
+
+def _reads(tokens: int):
+    engine, SessionLocal = _setup(tokens)
+    with SessionLocal() as db:
+        scan_country, raised = timed(lambda: _scan_country(db, "Kenya"))
+        scan_investor, exposure = timed(lambda: _scan_investor(db, "7"))
+        read_country, stats = timed(lambda: aggregates.stats(db, "country", "Kenya"), repeat=50)
+        read_investor, mine = timed(lambda: aggregates.stats(db, "investor", "7"), repeat=50)
+    assert stats["amount_raised"] == raised and mine["amount_raised"] == exposure
+    print(f"{tokens:>9,} tokens  country scan {scan_country * 1000:8.2f} ms  aggregate {read_country * 1000:6.3f} ms   "
+          f"investor scan {scan_investor * 1000:8.2f} ms  aggregate {read_investor * 1000:6.3f} ms")
+    engine.dispose()
+
+
+def _buyer(SessionLocal, seed, purchases, errors):
+    rng = random.Random(seed)
+    for _ in range(purchases):
+        db = SessionLocal()
+        investor_id = rng.randint(1, 100)
+        try:
+            kind = rng.random()
+            if kind < 0.4:
+                crud.create_contract(db=db, investor_id=investor_id, contract_data=schemas.ContractCreate(
+                    token_id=rng.randint(1, 50), quantity=rng.randint(1, 5), delivery_type="money"))
+            elif kind < 0.7:
+                crud.create_contracts(db=db, investor_id=investor_id, items=[
+                    schemas.ContractCreate(token_id=rng.randint(1, 50), quantity=rng.randint(1, 5), delivery_type="product")
+                    for _ in range(rng.randint(2, 5))
+                ])
+            else:
+                crud.invest_in_token(db=db, token_id=rng.randint(1, 50), investor_id=str(investor_id),
+                                     quantity=rng.randint(1, 5))
+        except ValueError:
+            pass  # sold out or already funded: nothing may be counted
+        except Exception as e:
+            errors.append(repr(e))
+        finally:
+            db.close()
+
+
+def main():
+    buyers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    purchases = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    for tokens in (10_000, 100_000):
+        _reads(tokens)
+
+    engine, SessionLocal = _setup(200)
+    with engine.begin() as conn:
+        # Small hot tokens so some purchases fail and roll back
+        conn.execute(models.Token.__table__.update().where(models.Token.id <= 50).values(
+            token_count=300, tokens_sold=0, is_funded=False, status="open"))
+    with SessionLocal() as db:
+        aggregates.rebuild(db)
+
+    errors = []
+    threads = [threading.Thread(target=_buyer, args=(SessionLocal, i, purchases, errors)) for i in range(buyers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    assert not errors, errors[:5]
+    with SessionLocal() as db:
+        mismatches = aggregates.check(db)
+        total = aggregates.stats(db, "total")
+    assert not mismatches, mismatches[:5]
+    print(f"{buyers} buyers x {purchases} purchases in {elapsed:.2f} s; aggregates consistent "
+          f"(sold {total['tokens_sold']:,}, {total['purchases']:,} purchases)")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
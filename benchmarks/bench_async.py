@@ -0,0 +1,90 @@
+# Mixed read/write load against the app in sync (threadpool) mode and async (CROPCHAIN_ASYNC_DB=1) mode.
+# Each mode runs in its own process on a copy of the same synthetic database, driven in-process over ASGI.
+# Usage: python -m benchmarks.bench_async [requests] [concurrency]
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from sqlalchemy import insert
+
+READ_SHARE = float(os.getenv("BENCH_READ_SHARE", "0.9"))
+
+
+async def _load(total: int, concurrency: int, token_count: int):
+    import httpx
+    import main
+    from jwt_auth import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench@example.com'})}"}
+    rng = random.Random(1)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                if rng.random() < READ_SHARE:
+                    # Distinct min_roi per request so the response cache never answers.
+                    response = await client.get(f"/tokens_available?limit=50&min_roi={2 + i / 10_000}")
+                else:
+                    response = await client.post("/create_contract", headers=headers, json={
+                        "token_id": rng.randint(1, token_count), "quantity": 1, "delivery_type": "money"})
+                latencies.append(time.perf_counter() - start)
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed, statuses
+
+
+def child(total: int, concurrency: int, token_count: int):
+    from benchmarks.common import percentiles
+
+    latencies, elapsed, statuses = asyncio.run(_load(total, concurrency, token_count))
+    print(json.dumps({
+        "mode": "async" if os.getenv("CROPCHAIN_ASYNC_DB") else "sync",
+        "requests": total, "concurrency": concurrency,
+        "throughput_rps": round(total / elapsed, 1), **percentiles(latencies),
+        "errors": sum(1 for s in statuses if s >= 500),
+    }))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    token_count = 20_000
+
+    import migrations, models
+    from benchmarks.common import temp_engine, populate
+
+    engine, _ = temp_engine("async")
+    migrations.upgrade(engine)
+    populate(engine, tokens=token_count)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "bench@example.com", "hashed_password": "x"}])
+    source = engine.url.database
+    engine.dispose()
+
+    for mode in ("sync", "async"):
+        path = f"{source}.{mode}.db"
+        shutil.copy(source, path)
+        env = dict(os.environ, CROPCHAIN_DATABASE_URL=f"sqlite:///{path}")
+        env.pop("CROPCHAIN_ASYNC_DB", None)
+        if mode == "async":
+            env["CROPCHAIN_ASYNC_DB"] = "1"
+        subprocess.run([sys.executable, "-W", "ignore", "-m", "benchmarks.bench_async", "--child",
+                        str(total), str(concurrency), str(token_count)], env=env, check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(*map(int, sys.argv[2:5]))
+    else:
+        main()
@@ -0,0 +1,47 @@
+# Per-request auth overhead: JWT verification and the account lookup, uncached versus the auth_cache caches.
+# Usage: python -m benchmarks.bench_auth_cache [iterations]
+import sys
+import time
+from sqlalchemy import insert
+import auth_cache, crud, migrations, models
+from jwt_auth import create_access_token, decode_access_token
+from benchmarks.common import temp_engine
+
+
+def _per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    engine, SessionLocal = temp_engine("auth_cache")
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "bench@example.com", "hashed_password": "x"}])
+    token = create_access_token({"sub": "bench@example.com"})
+    db = SessionLocal()
+
+    def uncached_decode():
+        auth_cache.tokens.clear()
+        decode_access_token(token)
+
+    def uncached_lookup():
+        auth_cache.principals.clear()
+        crud.get_investor_id_by_email(db, "bench@example.com")
+
+    rows = [
+        ("jwt decode", _per_call(uncached_decode, iterations), _per_call(lambda: decode_access_token(token), iterations)),
+        ("account lookup", _per_call(uncached_lookup, iterations),
+         _per_call(lambda: crud.get_investor_id_by_email(db, "bench@example.com"), iterations)),
+    ]
+    for name, cold, warm in rows:
+        print(f"{name:<16} uncached {cold:8.1f} us   cached {warm:8.2f} us   x{cold / warm:,.0f}")
+    db.close()
+    print(auth_cache.tokens.stats(), auth_cache.principals.stats())
+
+
+if __name__ == "__main__":
+    run()
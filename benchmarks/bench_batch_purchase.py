@@ -0,0 +1,45 @@
+# Buying into N tokens: N create_contract calls (one commit each) versus one create_contracts batch.
+# Usage: python -m benchmarks.bench_batch_purchase [batch_size] [rounds]
+import sys
+import time
+from sqlalchemy import insert
+import crud, migrations, models, schemas
+from benchmarks.common import temp_engine, populate
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    engine, SessionLocal = temp_engine("batch_purchase")
+    migrations.upgrade(engine)
+    populate(engine, tokens=batch_size * rounds * 2)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "bench@example.com", "hashed_password": "x"}])
+        conn.execute(models.Token.__table__.update().values(token_count=1000, tokens_sold=0, is_funded=False))
+
+    db = SessionLocal()
+    items = lambda first: [schemas.ContractCreate(token_id=first + i, quantity=1, delivery_type="money")
+                           for i in range(batch_size)]
+
+    start = time.perf_counter()
+    for r in range(rounds):
+        for item in items(1 + r * batch_size):
+            crud.create_contract(db=db, contract_data=item, investor_id=1)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for r in range(rounds):
+        results = crud.create_contracts(db=db, items=items(1 + (rounds + r) * batch_size), investor_id=1)
+        assert [c.token_id for c in results] == [1 + (rounds + r) * batch_size + i for i in range(batch_size)]
+    batched = time.perf_counter() - start
+
+    contracts = batch_size * rounds
+    print(f"{'one create_contract each':<26} {single / contracts * 1000:8.3f} ms/contract  {contracts / single:9,.0f}/s")
+    print(f"{'create_contracts batch':<26} {batched / contracts * 1000:8.3f} ms/contract  {contracts / batched:9,.0f}/s")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
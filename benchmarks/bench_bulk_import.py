@@ -0,0 +1,86 @@
+# Onboarding throughput: bulk_import.import_sheets on generated cooperative sheets (farmers, crops, tokens)
+# versus the per-row crud.create_farmer / create_crop / create_token path the endpoints use.
+# Usage: python -m benchmarks.bench_bulk_import [farmers]   (crops = 2x, tokens = 3x farmers)
+import csv
+import io
+import random
+import sys
+import time
+import bulk_import, crud, migrations, schemas
+from benchmarks.common import temp_engine, COUNTRIES, CROPS
+
+
+def _sheets(farmers: int, seed: int = 3):
+    rng = random.Random(seed)
+    farmer_rows = []
+    for i in range(farmers):
+        country = rng.choice(list(COUNTRIES))
+        farmer_rows.append({"ref": f"F{i}", "name": f"Member {i}", "country": country,
+                            "region": rng.choice(COUNTRIES[country]), "address": f"{i} Coop Lane",
+                            "farm_size_ha": round(rng.uniform(0.5, 20), 1)})
+    crop_rows = []
+    for i in range(farmers * 2):
+        name = rng.choice(list(CROPS))
+        crop_rows.append({"ref": f"C{i}", "farmer_ref": f"F{rng.randrange(farmers)}", "crop_name": name,
+                          "variety": rng.choice(CROPS[name]), "planting_date": "2025-03-01",
+                          "expected_harvest_month": "September", "organic_certified": rng.random() < 0.3})
+    token_rows = [{"crop_ref": f"C{rng.randrange(farmers * 2)}", "token_count": 1000, "price_per_token": 10,
+                   "expected_yield_unit": "kg", "expected_total_yield": 10_000,
+                   "expected_roi": round(rng.uniform(2, 20), 2), "funding_deadline": "2026-03-01"}
+                  for _ in range(farmers * 3)]
+    return farmer_rows, crop_rows, token_rows
+
+
+def _csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    out.seek(0)
+    return out
+
+
+def per_row(db, farmer_rows, crop_rows, token_rows):
+    farmers = {row["ref"]: crud.create_farmer(db, schemas.FarmerCreate(**row), account_id=None).id
+               for row in farmer_rows}
+    crops = {row["ref"]: crud.create_crop(db, schemas.CropCreate(**row, farmer_id=farmers[row["farmer_ref"]])).id
+             for row in crop_rows if row["farmer_ref"] in farmers}
+    for row in token_rows:
+        if row["crop_ref"] in crops:
+            crud.create_token(db, schemas.TokenCreate(**row, crop_id=crops[row["crop_ref"]]))
+
+
+def main():
+    farmers = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    farmer_rows, crop_rows, token_rows = _sheets(farmers)
+    total = len(farmer_rows) + len(crop_rows) + len(token_rows)
+
+    engine, SessionLocal = temp_engine("bulk_import")
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    start = time.perf_counter()
+    report = bulk_import.import_sheets(db, *(bulk_import.sheet_rows(_csv(rows), "csv")
+                                             for rows in (farmer_rows, crop_rows, token_rows)))
+    elapsed = time.perf_counter() - start
+    db.close()
+    assert report.error_count == 0, report.errors[:5]
+    assert report.inserted == {"farmers": len(farmer_rows), "crops": len(crop_rows), "tokens": len(token_rows)}
+    print(f"{'bulk_import':<10} {total:8,} rows  {elapsed:7.2f} s  {total / elapsed * 60:12,.0f} rows/min")
+
+    # The per-row path on a slice of the same sheets, for comparison
+    sample = max(1, farmers // 20)
+    engine, SessionLocal = temp_engine("bulk_import_per_row")
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    rows = (farmer_rows[:sample], [r for r in crop_rows if int(r["farmer_ref"][1:]) < sample],
+            [r for r in token_rows[:sample * 3]])
+    start = time.perf_counter()
+    per_row(db, *rows)
+    elapsed = time.perf_counter() - start
+    db.close()
+    count = sum(len(r) for r in rows)
+    print(f"{'per row':<10} {count:8,} rows  {elapsed:7.2f} s  {count / elapsed * 60:12,.0f} rows/min")
+
+
+if __name__ == "__main__":
+    main()
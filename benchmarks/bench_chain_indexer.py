@@ -0,0 +1,60 @@
+# Reading on-chain state back into the database. Reconciling by calling investments(contractId) once per
+# contract versus chain_indexer catching up on logs in block ranges, after which one joined query answers
+# the confirmation status of a whole contracts page.
+# Usage: python -m benchmarks.bench_chain_indexer [contracts] [purchases]
+import asyncio
+import random
+import sys
+import time
+import chain_indexer, crud
+from benchmarks.bench_chain_sync import drain, setup_contracts, sync_worker
+from benchmarks.fake_chain import FakeChain, INVESTMENTS_SELECTOR
+
+
+def _purchase(chain: FakeChain, rng, contracts: int, count: int):
+    for _ in range(count):
+        chain.purchase(rng.randint(1, contracts), f"0x{rng.getrandbits(160):040x}", rng.randint(1, 5))
+
+
+def main():
+    contracts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    purchases = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(7)
+
+    engine, SessionLocal = setup_contracts(contracts)
+    chain = FakeChain()
+    asyncio.run(drain(sync_worker(SessionLocal, chain, batch_size=100, concurrency=32)))
+    _purchase(chain, rng, contracts, purchases)
+    rpc = sync_worker(SessionLocal, chain).chain
+
+    async def reconcile():
+        for contract_id in range(1, contracts + 1):
+            data = "0x" + INVESTMENTS_SELECTOR + contract_id.to_bytes(32, "big").hex()
+            assert int(await rpc.rpc("eth_call", [{"to": rpc.contract, "data": data}, "latest"]), 16) == contract_id
+    start = time.perf_counter()
+    asyncio.run(reconcile())
+    per_contract = time.perf_counter() - start
+
+    indexer = chain_indexer.ChainIndexer(rpc, session_factory=SessionLocal, block_range=500)
+    start = time.perf_counter()
+    asyncio.run(drain(indexer))
+    catch_up = time.perf_counter() - start
+
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        rows = crud.get_contract_rows_by_investor(db, investor_id=1)
+        query = time.perf_counter() - start
+    assert len(rows) == contracts and all(row.chain_block is not None for row in rows)
+
+    blocks = len(chain.blocks)
+    print(f"{'investments() per contract':<30} {per_contract:7.3f} s  ({contracts} RPC calls)")
+    print(f"{'indexer catch-up':<30} {catch_up:7.3f} s  ({blocks} blocks, {indexer.logs} logs, "
+          f"{blocks / catch_up:,.0f} blocks/s)")
+    print(f"{'confirmation status query':<30} {query:7.3f} s  ({contracts} contracts, one query)")
+    with SessionLocal() as db:
+        print(f"status: {chain_indexer.index_status(db)}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
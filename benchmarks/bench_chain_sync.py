@@ -0,0 +1,76 @@
+# Draining the contract outbox to a fake chain (benchmarks/fake_chain.py) with simulated RPC latency:
+# one transaction at a time, as syncContractsToBlockchain.js did, versus batched sends with bounded concurrency.
+# Usage: python -m benchmarks.bench_chain_sync [contracts] [latency_ms]
+import asyncio
+import sys
+import time
+from sqlalchemy import func, insert
+import httpx
+import chain_sync, crud, migrations, models, schemas
+from benchmarks.common import temp_engine, populate
+from benchmarks.fake_chain import FakeChain
+
+
+def setup_contracts(contracts: int):
+    engine, SessionLocal = temp_engine("chain_sync")
+    migrations.upgrade(engine)
+    populate(engine, tokens=max(100, contracts // 10))
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "bench@example.com", "hashed_password": "x"}])
+        conn.execute(models.Token.__table__.update().values(token_count=100_000, tokens_sold=0, is_funded=False))
+    tokens = max(100, contracts // 10)
+    with SessionLocal() as db:
+        for first in range(0, contracts, crud.MAX_BATCH_CONTRACTS):
+            crud.create_contracts(db=db, investor_id=1, items=[
+                schemas.ContractCreate(token_id=1 + i % tokens, quantity=1, delivery_type="money")
+                for i in range(first, min(first + crud.MAX_BATCH_CONTRACTS, contracts))
+            ])
+    return engine, SessionLocal
+
+
+def sync_worker(SessionLocal, chain: FakeChain, **options):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=chain), base_url="http://chain")
+    rpc = chain_sync.JsonRpcChain(url="http://chain/", client=client)
+    return chain_sync.SyncWorker(rpc, session_factory=SessionLocal, **options)
+
+
+async def drain(worker) -> float:
+    start = time.perf_counter()
+    while await worker.run_once():
+        pass
+    return time.perf_counter() - start
+
+
+def _check(SessionLocal, chain: FakeChain, contracts: int):
+    with SessionLocal() as db:
+        statuses = dict(db.query(models.Contract.chain_status, func.count()).group_by(models.Contract.chain_status).all())
+        status = chain_sync.sync_status(db)
+    assert statuses == {"synced": contracts}, statuses
+    assert status["events"] == {"pending": 0, "inflight": 0, "sent": contracts, "failed": 0}, status
+    assert sorted(chain.investments) == list(range(1, contracts + 1))
+
+
+def _run(contracts: int, latency: float, label: str, **options):
+    engine, SessionLocal = setup_contracts(contracts)
+    with SessionLocal() as db:
+        lag = chain_sync.sync_status(db)["lag_seconds"]
+    chain = FakeChain(latency=latency)
+    worker = sync_worker(SessionLocal, chain, **options)
+    elapsed = asyncio.run(drain(worker))
+    _check(SessionLocal, chain, contracts)
+    print(f"{label:<34} {elapsed:7.2f} s  {contracts / elapsed:8,.0f} contracts/s  (lag before: {lag:.1f} s)")
+    engine.dispose()
+    return elapsed
+
+
+def main():
+    contracts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+
+    serial = _run(contracts, latency, "serial (batch 1, concurrency 1)", batch_size=1, concurrency=1)
+    batched = _run(contracts, latency, "batch 100, concurrency 32", batch_size=100, concurrency=32)
+    print(f"speedup: {serial / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Mixed read/write concurrency under each database configuration: SQLite defaults (rollback journal),
+# WAL + synchronous=NORMAL, and the full pragma set from database.SQLITE_PRAGMAS. Set BENCH_DATABASE_URL
+# to an empty server database (e.g. postgresql://...) to run the same workload against it with pooling.
+# Usage: python -m benchmarks.bench_db_config [seconds] [readers] [writers]
+import json
+import os
+import random
+import sys
+import threading
+import time
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+import crud, database, migrations, models, schemas
+from benchmarks.common import temp_engine, populate, percentiles
+
+TOKENS = 20_000
+
+CONFIGS = {
+    "sqlite defaults (rollback journal)": {},
+    "sqlite WAL + synchronous=NORMAL": {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000},
+    "sqlite WAL + full tuning": database.SQLITE_PRAGMAS,
+}
+
+
+def _prepare(engine):
+    migrations.upgrade(engine)
+    populate(engine, tokens=TOKENS)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "bench@example.com", "hashed_password": "x"}])
+    investor_id = 1
+    return investor_id
+
+
+def _worker(SessionLocal, kind, stop, results, seed, investor_id):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            if kind == "read":
+                crud.get_filtered_tokens(db=db, limit=50, min_roi=rng.uniform(2, 19))
+            else:
+                crud.create_contract(db=db, investor_id=investor_id, contract_data=schemas.ContractCreate(
+                    token_id=rng.randint(1, TOKENS), quantity=1, delivery_type="money"))
+            results[kind].append(time.perf_counter() - start)
+        except ValueError:
+            results[kind].append(time.perf_counter() - start)  # sold out: still a completed request
+        except Exception:
+            db.rollback()
+            results["errors"] += 1
+        finally:
+            db.close()
+
+
+def run(name, engine, seconds, readers, writers):
+    investor_id = _prepare(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    results = {"read": [], "write": [], "errors": 0}
+    stop = threading.Event()
+    threads = [threading.Thread(target=_worker, args=(SessionLocal, "read", stop, results, i, investor_id))
+               for i in range(readers)]
+    threads += [threading.Thread(target=_worker, args=(SessionLocal, "write", stop, results, 1000 + i, investor_id))
+                for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    report = {"config": name, "readers": readers, "writers": writers, "errors": results["errors"]}
+    for kind in ("read", "write"):
+        if results[kind]:
+            report[kind] = {"ops_per_s": round(len(results[kind]) / seconds, 1), **percentiles(results[kind])}
+    print(json.dumps(report))
+    engine.dispose()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    for name, pragmas in CONFIGS.items():
+        engine, _ = temp_engine("db_config", sqlite_pragmas=pragmas)
+        run(name, engine, seconds, readers, writers)
+    server_url = os.getenv("BENCH_DATABASE_URL")
+    if server_url:
+        run(f"server pool ({database.POOL_SIZE}+{database.MAX_OVERFLOW})", database.make_engine(server_url),
+            seconds, readers, writers)
+
+
+if __name__ == "__main__":
+    main()
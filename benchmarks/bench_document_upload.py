@@ -0,0 +1,69 @@
+# Peak Python memory and throughput storing an identity document: the old whole-file read() + write versus
+# document_store's chunked, hashed copy. Also checks deduplication, the size limit and range reads.
+# Usage: python -m benchmarks.bench_document_upload [megabytes]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from starlette.datastructures import UploadFile
+import document_store
+
+
+def _upload(path):
+    return UploadFile(open(path, "rb"), filename="scan.pdf")
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    workdir = tempfile.mkdtemp(prefix="cropchain_docs_")
+    source = os.path.join(workdir, "scan.pdf")
+    with open(source, "wb") as f:
+        for _ in range(megabytes):
+            f.write(os.urandom(1024 * 1024))
+    size = megabytes * 1024 * 1024
+
+    def legacy():
+        upload = _upload(source)
+        with open(os.path.join(workdir, "legacy.pdf"), "wb") as f:
+            f.write(upload.file.read())
+
+    backend = document_store.LocalDiskBackend(os.path.join(workdir, "store"))
+    store = lambda: asyncio.run(document_store.store(_upload(source), backend, max_bytes=size))
+
+    for name, fn in [("whole-file read()", legacy), ("chunked + sha256", store)]:
+        _, elapsed, peak = _measure(fn)
+        print(f"{name:<18} {elapsed * 1000:8.1f} ms  {megabytes / elapsed:8.1f} MB/s  peak {peak / 2 ** 20:7.1f} MiB")
+
+    first, second = store(), store()
+    stored = [f for _, _, files in os.walk(backend.root) for f in files]
+    assert first == second and stored == [first.digest], stored
+
+    try:
+        asyncio.run(document_store.store(_upload(source), backend, max_bytes=size - 1))
+        raise AssertionError("oversized document was stored")
+    except document_store.DocumentTooLarge:
+        pass
+    assert os.listdir(os.path.join(backend.root, "tmp")) == []
+
+    async def read_range(start, end):
+        return b"".join([chunk async for chunk in backend.read(first.digest, start, end)])
+    with open(source, "rb") as f:
+        f.seek(size - 100)
+        assert asyncio.run(read_range(size - 100, size - 1)) == f.read()
+    print("OK: deduplicated, size limit enforced, ranges match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Exporting a large contracts table: loading it with .all() (what the list endpoints do) versus export.encode,
+# which streams it in batches. Reports rows/s and peak Python memory; the streamed peak should stay flat.
+# Usage: python -m benchmarks.bench_export [contracts]   (default 300,000)
+import sys
+import time
+import tracemalloc
+import pydantic_core
+import export, migrations, models
+from benchmarks.common import temp_engine, populate
+
+
+def _measure(fn):
+    """(output bytes, seconds, peak traced bytes); timed without tracemalloc, which slows allocation down."""
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    contracts = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    engine, SessionLocal = temp_engine("export")
+    migrations.upgrade(engine)
+    print(f"Populating {populate(engine, tokens=10_000, contracts=contracts)}")
+
+    def legacy():
+        db = SessionLocal()
+        rows = db.query(models.Contract).all()
+        body = pydantic_core.to_json([{c.name: getattr(row, c.name) for c in models.Contract.__table__.columns}
+                                      for row in rows])
+        db.close()
+        return len(body)
+
+    def streamed(fmt):
+        def run():
+            db = SessionLocal()
+            size = sum(len(chunk) for chunk in export.encode(db, export.export_statement(db, "contracts"), fmt))
+            db.close()
+            return size
+        return run
+
+    for name, fn in [("ORM .all() + JSON", legacy)] + [(f"export {fmt}", streamed(fmt)) for fmt in export.FORMATS]:
+        size, elapsed, peak = _measure(fn)
+        print(f"{name:<20} {elapsed:7.2f} s  {contracts / elapsed:10,.0f} rows/s  {size / 2 ** 20:8.1f} MiB out"
+              f"  peak {peak / 2 ** 20:8.1f} MiB")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
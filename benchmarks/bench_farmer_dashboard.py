@@ -0,0 +1,83 @@
+# /farmer_dashboard statements and latency as a farmer's crops, tokens and contracts grow, against the
+# /crops_by_farmer + /tokens_by_farmer requests the dashboard page used to make, and its 304 revalidation.
+# tests/test_read_endpoints.py checks the statement count stays constant and the data matches.
+# Usage: python -m benchmarks.bench_farmer_dashboard
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, insert
+import aggregates, migrations, models
+from jwt_auth import create_access_token
+from benchmarks.common import app_client, temp_engine, populate, timed
+
+TOKEN_COUNTS = [1, 10, 100, 500]
+
+
+def _seed_farmers(engine):
+    """One farmer account per entry of TOKEN_COUNTS, with that many tokens (over half as many crops) and contracts."""
+    rng = random.Random(11)
+    now = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        for n, count in enumerate(TOKEN_COUNTS, start=1):
+            account_id = conn.execute(insert(models.FarmerAccount).returning(models.FarmerAccount.id), [{
+                "email": f"farmer{n}@example.com", "hashed_password": "x",
+            }]).scalar()
+            farmer_id = conn.execute(insert(models.Farmer).returning(models.Farmer.id), [{
+                "name": f"Dashboard farmer {n}", "country": "Kenya", "region": "Central", "address": f"{n} Hill Road",
+                "identity_document": None, "registration_status": models.RegistrationStatusEnum.verified,
+                "registered_at": now, "account_id": account_id,
+            }]).scalar()
+            crop_ids = conn.execute(insert(models.Crop).returning(models.Crop.id), [{
+                "crop_name": "Coffee", "variety": "Arabica", "planting_date": date(2024, 3, 1),
+                "expected_harvest_month": rng.choice(list(models.MonthEnum)), "farmer_id": farmer_id,
+                "organic_certified": False,
+            } for _ in range(max(1, count // 2))]).scalars().all()
+            token_ids = conn.execute(insert(models.Token).returning(models.Token.id), [{
+                "crop_id": rng.choice(crop_ids), "farmer_id": farmer_id, "token_count": 1000, "price_per_token": 10,
+                "expected_yield_unit": "kg", "expected_total_yield": 5000, "expected_roi": 9.5,
+                "tokens_sold": rng.randint(0, 500), "is_funded": False, "funding_deadline": date(2025, 9, 1),
+                "currency": "USDT", "status": "open", "created_at": now + timedelta(seconds=i),
+                "token_status": models.TokenStatusEnum.verified if i % 5 else models.TokenStatusEnum.pending,
+            } for i in range(count)]).scalars().all()
+            conn.execute(insert(models.Contract), [{
+                "token_id": rng.choice(token_ids), "farmer_id": farmer_id, "investor_id": rng.randint(1, 100),
+                "quantity": 3, "price_per_token": 10, "total_value": 30, "delivery_type": "money",
+                "expected_roi": 9.5, "expected_harvest_month": models.MonthEnum.june,
+                "payout_status": rng.choice(list(models.PayoutStatusEnum)), "created_at": now,
+            } for _ in range(count * 4)])
+
+
+def run():
+    engine, SessionLocal = temp_engine("farmer_dashboard")
+    migrations.upgrade(engine)
+    populate(engine, tokens=1000)
+    _seed_farmers(engine)
+    with SessionLocal() as db:
+        aggregates.rebuild(db)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with app_client(SessionLocal) as client:
+        for n, count in enumerate(TOKEN_COUNTS, start=1):
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': f'farmer{n}@example.com'})}"}
+            client.get("/farmer_dashboard", headers=headers)  # warm the account lookup cache
+            statements.clear()
+            response = client.get("/farmer_dashboard", headers=headers)
+            issued = len(statements)
+            assert response.status_code == 200, response.text
+            farmer_id = response.json()["farmer_id"]
+
+            def separate():
+                client.get(f"/crops_by_farmer?farmer_id={farmer_id}")
+                client.get(f"/tokens_by_farmer?farmer_id={farmer_id}&limit=500")
+            revalidate = {**headers, "If-None-Match": response.headers["etag"]}
+
+            composite, _ = timed(lambda: client.get("/farmer_dashboard", headers=headers))
+            three, _ = timed(separate)
+            cached, _ = timed(lambda: client.get("/farmer_dashboard", headers=revalidate))
+            print(f"tokens={count:<4} statements={issued}  dashboard {composite * 1000:7.2f} ms "
+                  f"({len(response.content):>7,} bytes)   304 {cached * 1000:6.2f} ms   "
+                  f"crops + tokens requests {three * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    run()
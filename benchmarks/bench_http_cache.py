@@ -0,0 +1,68 @@
+# Conditional GET on the polled read endpoints: a full 200 response versus a 304 revalidation with its ETag
+# (answered before the endpoint runs, without SQL), and the size of large bodies gzipped. tests/test_http_cache.py
+# checks the ETags change exactly when a write changes what a page shows.
+# Usage: python -m benchmarks.bench_http_cache
+import gzip
+from sqlalchemy import event
+import http_cache, migrations, models
+from jwt_auth import create_access_token
+from benchmarks import dataset
+from benchmarks.common import app_client, temp_engine, timed
+
+INVESTOR = {"Authorization": f"Bearer {create_access_token({'sub': 'investor1@' + dataset.EMAIL_DOMAIN})}"}
+FARMER = {"Authorization": f"Bearer {create_access_token({'sub': 'farmer1@' + dataset.EMAIL_DOMAIN})}"}
+
+
+def _open_tokens(SessionLocal, n: int) -> list:
+    with SessionLocal() as db:
+        return [row.id for row in db.query(models.Token.id).filter(
+            models.Token.is_funded == False, models.Token.token_status == models.TokenStatusEnum.verified,
+            models.Token.tokens_sold < models.Token.token_count,
+        ).order_by(models.Token.id).limit(n)]
+
+
+def run():
+    engine, SessionLocal = temp_engine("http_cache")
+    migrations.upgrade(engine)
+    dataset.generate(engine, 20_000)
+    [bought] = _open_tokens(SessionLocal, 1)
+    # One process: without an epoch in the ETag, a revalidation timed across a window boundary stays a 304
+    http_cache.ETAG_WINDOW_SECONDS = 0
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    routes = {
+        "/tokens_all?limit=100": {},
+        "/tokens_available?limit=100": {},
+        "/stats/totals": {},
+        "/stats/countries": {},
+        f"/stats/tokens/{bought}": {},
+        "/farmer_dashboard": FARMER,
+        "/my_contracts?limit=100": INVESTOR,
+        "/investments?limit=100": INVESTOR,
+        "/portfolio_summary": INVESTOR,
+    }
+    with app_client(SessionLocal) as client:
+        for path, headers in routes.items():
+            client.get(path, headers=headers)  # warm the account lookup and count caches
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, (path, response.text)
+            revalidate = {**headers, "If-None-Match": response.headers["etag"]}
+            full, _ = timed(lambda: client.get(path, headers=headers))
+            statements.clear()
+            cached, not_modified = timed(lambda: client.get(path, headers=revalidate))
+            print(f"{path:<30} 200 {full * 1000:7.2f} ms ({len(response.content):>7,} bytes)   "
+                  f"{not_modified.status_code} {cached * 1000:6.2f} ms, {len(statements)} statements")
+
+        plain = client.get("/tokens_all?limit=500", headers={"Accept-Encoding": "identity"})
+        compressed = client.send(client.build_request("GET", "/tokens_all?limit=500",
+                                                      headers={"Accept-Encoding": "gzip"}), stream=True)
+        body = b"".join(compressed.iter_raw())
+        assert gzip.decompress(body) == plain.content
+        print(f"/tokens_all?limit=500: {len(plain.content):,} bytes, {len(body):,} gzipped "
+              f"({len(body) / len(plain.content):.0%})")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
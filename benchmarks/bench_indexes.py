@@ -0,0 +1,61 @@
+# Query plans and latencies of the marketplace filters before and after the index migration.
+# Usage: python -m benchmarks.bench_indexes [token_count]
+import sys
+from datetime import date, datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Query
+import crud, migrations
+from benchmarks.common import temp_engine, populate, timed
+
+WORKLOADS = {
+    "open, min_roi=19": dict(min_roi=19),
+    "funded_only, min_roi=19.5": dict(funded_only=True, min_roi=19.5),
+    "farmer_id=42": dict(farmer_id=42),
+    "deadline<=2025-01-05": dict(deadline=date(2025, 1, 5)),
+    "created_after=2024-12-31": dict(created_after=datetime(2024, 12, 31, 22)),
+}
+
+
+def _plan(db, kwargs):
+    captured = {}
+    original = Query.all
+
+    def capture(self):
+        captured["sql"] = self.statement.compile(compile_kwargs={"literal_binds": True})
+        return original(self)
+
+    Query.all = capture
+    try:
+        crud.get_filtered_tokens(db=db, **kwargs)
+    finally:
+        Query.all = original
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {captured['sql']}")).fetchall()
+    return [row[-1] for row in rows]
+
+
+def run(db_factory, label):
+    print(f"\n== {label} ==")
+    for name, kwargs in WORKLOADS.items():
+        db = db_factory()
+        try:
+            seconds, rows = timed(lambda: crud.get_filtered_tokens(db=db, **kwargs))
+            db.expunge_all()
+            print(f"{name:<28} {seconds * 1000:9.2f} ms  rows={len(rows)}")
+            for step in _plan(db, kwargs):
+                print(f"    {step}")
+        finally:
+            db.close()
+
+
+def main():
+    token_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    engine, SessionLocal = temp_engine("indexes")
+    migrations.upgrade(engine, target=1)
+    print(f"Populating {populate(engine, tokens=token_count)}")
+    run(SessionLocal, "schema version 1 (no secondary indexes)")
+    migrations.upgrade(engine)
+    run(SessionLocal, f"schema version {migrations.current_version(engine)} (marketplace indexes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Cost of the request instrumentation (instrumentation.py). Per statement: the same primary-key lookups on
+# an engine with and without the cursor hooks, inside a request context, which must count every statement
+# and row. Per request: a cached /tokens_all page with and without MetricsMiddleware.
+# Usage: python -m benchmarks.bench_instrumentation [statements]
+import asyncio
+import sys
+from sqlalchemy import bindparam, select
+import instrumentation, migrations, models
+from benchmarks.common import app_client, temp_engine, populate, timed
+
+
+_LOOKUP = select(models.Token.id, models.Token.tokens_sold).where(models.Token.id == bindparam("token_id"))
+
+
+def _lookups(engine, count: int):
+    with engine.connect() as conn:
+        for token_id in range(1, count + 1):
+            conn.execute(_LOOKUP, {"token_id": token_id}).one()
+
+
+def _alternate(baseline, instrumented, rounds: int = 7):
+    """Fastest of rounds alternating runs of each (the machine's noise is larger than the overhead)."""
+    best, result = [float("inf"), float("inf")], None
+    for _ in range(rounds):
+        for i, fn in enumerate((baseline, instrumented)):
+            seconds, result = timed(fn, repeat=1)
+            best[i] = min(best[i], seconds)
+    return best[0], best[1], result
+
+
+def _in_request(fn):
+    stats = instrumentation.RequestStats()
+    token = instrumentation._current.set(stats)
+    try:
+        fn()
+    finally:
+        instrumentation._current.reset(token)
+    return stats
+
+
+def _per_statement(count: int):
+    plain_engine, _ = temp_engine("instrumentation_plain")
+    hooked_engine, Hooked = temp_engine("instrumentation_hooked")
+    instrumentation.instrument_engine(hooked_engine)
+    for engine in (plain_engine, hooked_engine):
+        migrations.upgrade(engine)
+        populate(engine, tokens=max(count, 1000))
+
+    plain, hooked, stats = _alternate(lambda: _in_request(lambda: _lookups(plain_engine, count)),
+                                      lambda: _in_request(lambda: _lookups(hooked_engine, count)))
+    assert stats.statements == count and stats.rows == count, (stats.statements, stats.rows)
+    overhead = (hooked - plain) / count * 1e6
+    print(f"{count} lookups: plain {plain * 1000:7.2f} ms  instrumented {hooked * 1000:7.2f} ms  "
+          f"({overhead:+.1f} us per statement)")
+    plain_engine.dispose()
+    return hooked_engine, Hooked
+
+
+def _asgi_requests(app, path: str, query: bytes, count: int):
+    """count GET requests straight through an ASGI app (no HTTP client), returning the last status."""
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    async def requests():
+        for _ in range(count):
+            scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": path,
+                     "raw_path": path.encode(), "root_path": "", "query_string": query, "headers": [],
+                     "client": ("127.0.0.1", 1), "server": ("testserver", 80)}
+            await app(scope, receive, send)
+    asyncio.run(requests())
+    return statuses[-1]
+
+
+def _per_request(SessionLocal):
+    with app_client(SessionLocal) as client:
+        client.get("/tokens_all?limit=20")  # builds the middleware stack and fills the response cache
+        middleware = client.app.middleware_stack
+    while not isinstance(middleware, instrumentation.MetricsMiddleware):
+        middleware = middleware.app
+    requests = 2000
+    without, with_metrics, status = _alternate(lambda: _asgi_requests(middleware.app, "/tokens_all", b"limit=20", requests),
+                                               lambda: _asgi_requests(middleware, "/tokens_all", b"limit=20", requests))
+    assert status == 200
+    print(f"{requests} cached /tokens_all requests: bare {without * 1000:7.1f} ms  with middleware "
+          f"{with_metrics * 1000:7.1f} ms  ({(with_metrics - without) / requests * 1e6:+.1f} us per request)")
+
+
+def run():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    engine, SessionLocal = _per_statement(count)
+    _per_request(SessionLocal)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,101 @@
+# Marketplace read latency while a burst of logins runs: bcrypt in the request threads (CROPCHAIN_HASH_WORKERS=0,
+# how the login endpoints used to work) versus the password_hashing process pool. Each mode runs in its own
+# process on a copy of the same database, driven in-process over ASGI.
+# Usage: python -m benchmarks.bench_login_storm [logins] [readers]
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from sqlalchemy import insert
+
+READ_SECONDS = 3.0
+
+
+async def _load(logins: int, readers: int):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def read_until(done, latencies):
+            rng = random.Random(len(latencies))
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get(f"/tokens_available?limit=50&min_roi={rng.uniform(2, 19)}")
+                latencies.append(time.perf_counter() - start)
+
+        async def reads_for(seconds, storm=None):
+            done, latencies = asyncio.Event(), []
+            tasks = [asyncio.create_task(read_until(done, latencies)) for _ in range(readers)]
+            if storm is None:
+                await asyncio.sleep(seconds)
+                result = None
+            else:
+                result = await storm
+            done.set()
+            await asyncio.gather(*tasks)
+            return latencies, result
+
+        async def storm():
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(client.post("/investor_login", json={
+                "email": f"storm{i}@example.com", "password": "correct horse"}) for i in range(logins)))
+            return time.perf_counter() - start, [r.status_code for r in statuses]
+
+        idle, _ = await reads_for(READ_SECONDS)
+        busy, (elapsed, statuses) = await reads_for(None, storm())
+    return idle, busy, elapsed, statuses
+
+
+def child(logins: int, readers: int):
+    from benchmarks.common import percentiles
+    import password_hashing
+
+    idle, busy, elapsed, statuses = asyncio.run(_load(logins, readers))
+    password_hashing.hasher.shutdown()
+    print(json.dumps({
+        "mode": f"process pool ({password_hashing.WORKERS} workers)" if password_hashing.WORKERS else "request threads",
+        "logins": logins, "login_seconds": round(elapsed, 2),
+        "login_ok": statuses.count(200), "login_503": statuses.count(503),
+        "read_idle": percentiles(idle), "read_during_storm": percentiles(busy),
+    }))
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    import migrations, models, password_hashing
+    from benchmarks.common import temp_engine, populate
+
+    engine, _ = temp_engine("login_storm")
+    migrations.upgrade(engine)
+    populate(engine, tokens=20_000)
+    hashed = password_hashing.hash_password("correct horse")
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [
+            {"email": f"storm{i}@example.com", "hashed_password": hashed} for i in range(logins)])
+    source = engine.url.database
+    engine.dispose()
+
+    # The thread mode gets an unbounded queue, as before; the pool keeps its default backpressure
+    for mode, workers, max_pending in (("threads", "0", str(logins)), ("pool", str(os.cpu_count() or 1), None)):
+        path = f"{source}.{mode}.db"
+        shutil.copy(source, path)
+        env = dict(os.environ, CROPCHAIN_DATABASE_URL=f"sqlite:///{path}", CROPCHAIN_HASH_WORKERS=workers)
+        env.pop("CROPCHAIN_HASH_MAX_PENDING", None)
+        if max_pending:
+            env["CROPCHAIN_HASH_MAX_PENDING"] = max_pending
+        subprocess.run([sys.executable, "-W", "ignore", "-m", "benchmarks.bench_login_storm", "--child",
+                        str(logins), str(readers)], env=env, check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(*map(int, sys.argv[2:4]))
+    else:
+        main()
@@ -0,0 +1,51 @@
+# /my_contracts statements and latency as an investor's contracts grow (tests/test_contracts.py checks the
+# statement count stays constant).
+# Usage: python -m benchmarks.bench_my_contracts
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+import migrations, models
+from jwt_auth import create_access_token
+from benchmarks.common import app_client, temp_engine, populate, timed
+
+CONTRACT_COUNTS = [1, 10, 100, 500]
+
+
+def _seed_investors(engine):
+    rng = random.Random(7)
+    now = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        for investor_id, count in enumerate(CONTRACT_COUNTS, start=1):
+            conn.execute(insert(models.InvestorAccount), [{
+                "id": investor_id, "email": f"investor{investor_id}@example.com", "hashed_password": "x",
+            }])
+            conn.execute(insert(models.Contract), [{
+                "token_id": rng.randint(1, 1000), "farmer_id": 1, "investor_id": investor_id,
+                "quantity": 1, "price_per_token": 10, "total_value": 10, "delivery_type": "money",
+                "expected_roi": 8.0, "expected_harvest_month": models.MonthEnum.june,
+                "payout_status": models.PayoutStatusEnum.pending, "created_at": now + timedelta(seconds=i),
+            } for i in range(count)])
+
+
+def run():
+    engine, SessionLocal = temp_engine("my_contracts")
+    migrations.upgrade(engine)
+    populate(engine, tokens=1000)
+    _seed_investors(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with app_client(SessionLocal) as client:
+        for investor_id, count in enumerate(CONTRACT_COUNTS, start=1):
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': f'investor{investor_id}@example.com'})}"}
+            url = f"/my_contracts?limit={max(CONTRACT_COUNTS)}"
+            statements.clear()
+            response = client.get(url, headers=headers)
+            issued = len(statements)
+            seconds, _ = timed(lambda: client.get(url, headers=headers), repeat=5)
+            assert response.status_code == 200 and len(response.json()) == count
+            print(f"contracts={count:<5} statements={issued}  {seconds * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,68 @@
+# /portfolio_summary for one investor with many contracts: the NumPy engine (portfolio.py) versus the same
+# figures computed row by row in Python over the /my_contracts rows, as the dashboard did. Both must agree.
+# Usage: python -m benchmarks.bench_portfolio [contracts ...]
+import sys
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import update
+import crud, migrations, models, portfolio
+from benchmarks.common import temp_engine, populate, timed
+
+TODAY = date(2025, 6, 15)
+
+
+def _row_by_row(db, investor_id):
+    """Reference: totals and exposure by looping over ContractOut-shaped rows plus a country lookup."""
+    rows = crud.get_contract_rows_by_investor(db, investor_id)
+    countries = dict(db.query(models.Farmer.id, models.Farmer.country).all())
+    invested = payout = 0.0
+    by_crop, by_country = defaultdict(float), defaultdict(float)
+    calendar = defaultdict(float)
+    for row in rows:
+        expected = row.total_value * (1 + row.expected_roi / 100)
+        invested += row.total_value
+        payout += expected
+        if row.payout_status == models.PayoutStatusEnum.pending:
+            by_crop[row.crop_name or portfolio.UNKNOWN] += row.total_value
+            by_country[countries.get(row.farmer_id) or portfolio.UNKNOWN] += row.total_value
+            if row.delivery_type == "money":
+                calendar[row.expected_harvest_month.value] += expected
+    return invested, payout, dict(by_crop), dict(by_country), dict(calendar)
+
+
+def _close(a, b):
+    return abs(a - b) <= 0.01 + 1e-9 * abs(b)
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10_000, 50_000]
+    for contracts in sizes:
+        engine, SessionLocal = temp_engine(f"portfolio_{contracts}")
+        migrations.upgrade(engine)
+        populate(engine, tokens=max(1000, contracts // 5), contracts=contracts, investors=1)
+        with engine.begin() as conn:
+            # A third already paid out, so outstanding figures differ from the totals
+            conn.execute(update(models.Contract).where(models.Contract.id % 3 == 0)
+                         .values(payout_status=models.PayoutStatusEnum.delivered))
+
+        with SessionLocal() as db:
+            load, columns = timed(lambda: portfolio.load(db, 1))
+            compute, summary = timed(lambda: portfolio.summarize(columns, TODAY))
+            engine_total, _ = timed(lambda: portfolio.portfolio_summary(db, 1, TODAY))
+            python_total, reference = timed(lambda: _row_by_row(db, 1))
+
+        invested, payout, by_crop, by_country, calendar = reference
+        assert summary["contracts"] == contracts
+        assert _close(summary["invested"], invested) and _close(summary["expected_payout"], payout)
+        assert all(_close(g["invested"], by_crop[g["key"]]) for g in summary["by_crop"]) and len(summary["by_crop"]) == len(by_crop)
+        assert all(_close(g["invested"], by_country[g["key"]]) for g in summary["by_country"])
+        assert all(_close(m["cash_payout"], calendar.get(m["month"], 0.0)) for m in summary["calendar"])
+
+        print(f"{contracts:>7,} contracts  numpy {engine_total * 1000:7.1f} ms (load {load * 1000:6.1f}, "
+              f"compute {compute * 1000:5.2f})   row by row {python_total * 1000:7.1f} ms   "
+              f"x{python_total / engine_total:.1f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
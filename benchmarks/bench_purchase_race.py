@@ -0,0 +1,75 @@
+# Many concurrent buyers on one hot token. Checks nothing is oversold or lost (tokens_sold equals the sum of
+# contract quantities and never exceeds token_count) and reports purchase throughput and latency.
+# Usage: python -m benchmarks.bench_purchase_race [buyers] [token_count]
+import json
+import random
+import sys
+import threading
+import time
+from sqlalchemy import func, insert
+import crud, migrations, models, schemas
+from benchmarks.common import temp_engine, populate, percentiles
+
+
+def _buyer(SessionLocal, token_id, investor_id, results, seed):
+    rng = random.Random(seed)
+    while True:
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            crud.create_contract(db=db, investor_id=investor_id, contract_data=schemas.ContractCreate(
+                token_id=token_id, quantity=rng.randint(1, 3), delivery_type="money"))
+            results["latencies"].append(time.perf_counter() - start)
+        except ValueError:
+            results["rejected"] += 1  # fewer tokens left than requested
+            if crud.get_token_row(db, token_id).tokens_left == 0:
+                return
+        except Exception as e:
+            results["errors"].append(repr(e))
+            return
+        finally:
+            db.close()
+
+
+def main():
+    buyers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    token_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    engine, SessionLocal = temp_engine("purchase_race")
+    migrations.upgrade(engine)
+    populate(engine, tokens=10)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "bench@example.com", "hashed_password": "x"}])
+        conn.execute(models.Token.__table__.update().where(models.Token.id == 1).values(
+            token_count=token_count, tokens_sold=0, is_funded=False, status="open"))
+
+    results = {"latencies": [], "rejected": 0, "errors": []}
+    threads = [threading.Thread(target=_buyer, args=(SessionLocal, 1, 1, results, i)) for i in range(buyers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    token = db.query(models.Token).filter(models.Token.id == 1).one()
+    contracted = db.query(func.coalesce(func.sum(models.Contract.quantity), 0)) \
+        .filter(models.Contract.token_id == 1).scalar()
+    invested = db.query(func.coalesce(func.sum(models.Investment.quantity), 0)) \
+        .filter(models.Investment.token_id == 1).scalar()
+    db.close()
+
+    print(json.dumps({
+        "buyers": buyers, "token_count": token_count, "tokens_sold": token.tokens_sold,
+        "contracts": len(results["latencies"]), "rejected": results["rejected"], "errors": len(results["errors"]),
+        "purchases_per_s": round(len(results["latencies"]) / elapsed, 1), **percentiles(results["latencies"]),
+    }))
+    assert not results["errors"], results["errors"][:5]
+    assert token.tokens_sold == contracted == invested, (token.tokens_sold, contracted, invested)
+    assert token.tokens_sold == token.token_count and token.is_funded and token.status == "funded"
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
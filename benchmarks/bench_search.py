@@ -0,0 +1,42 @@
+# Marketplace substring filters: legacy leading-wildcard ILIKE versus the trigram search index.
+# Usage: python -m benchmarks.bench_search [token_count]
+import sys
+import crud, migrations, search_index
+from benchmarks.common import temp_engine, populate, timed
+
+WORKLOADS = {
+    "country=nam": dict(country="nam"),
+    "region=delta": dict(region="delta"),
+    "crop_name=coff": dict(crop_name="coff"),
+    "crop_variety=ST2": dict(crop_variety="ST2"),
+    "country=ghana, crop_name=cocoa": dict(country="ghana", crop_name="cocoa", min_roi=19),
+}
+
+
+def _legacy_filter(db, field, needle):
+    return search_index.SEARCH_FIELDS[field][1].ilike(f"%{needle}%")
+
+
+def main():
+    token_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    engine, SessionLocal = temp_engine("search")
+    migrations.upgrade(engine)
+    print(f"Populating {populate(engine, tokens=token_count)}")
+    db = SessionLocal()
+    indexed_filter = search_index.substring_filter
+    print(f"{'workload':<34}{'ILIKE ms':>10}{'index ms':>10}{'lookup us':>11}  rows  same")
+    for name, kwargs in WORKLOADS.items():
+        search_index.substring_filter = _legacy_filter
+        legacy_s, legacy = timed(lambda: crud.get_filtered_tokens(db=db, **kwargs), repeat=3)
+        search_index.substring_filter = indexed_filter
+        indexed_s, indexed = timed(lambda: crud.get_filtered_tokens(db=db, **kwargs), repeat=3)
+        field, needle = next(iter(kwargs.items()))
+        lookup_s, _ = timed(lambda: search_index.catalog_for(engine).search(db, field, needle), repeat=50)
+        same = sorted(t.id for t in legacy) == sorted(t.id for t in indexed)
+        print(f"{name:<34}{legacy_s * 1000:10.2f}{indexed_s * 1000:10.2f}{lookup_s * 1e6:11.1f}  {len(indexed):5}  {same}")
+        db.expunge_all()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
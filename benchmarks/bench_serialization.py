@@ -0,0 +1,59 @@
+# Encoding a 10k-row TokenOut list: FastAPI's response_model path (a TokenOut per row, validated again and
+# dumped by the list's TypeAdapter), ORJSONResponse (the same validation, then orjson on the plain Python
+# dump), model_construct without validation, and the read-model rows encoded directly (pydantic_core, then
+# fast_json). Every variant must produce the same bytes (tests/test_read_endpoints.py checks that the list
+# endpoints answer what validating their rows against the response_model would).
+# Usage: python -m benchmarks.bench_serialization [rows]
+import sys
+import orjson
+import pydantic_core
+from pydantic import TypeAdapter
+import crud, fast_json, migrations, schemas
+from benchmarks import dataset
+from benchmarks.common import temp_engine, timed
+
+
+def _variants(rows):
+    adapter = TypeAdapter(list[schemas.TokenOut])
+    return {
+        "response_model (validate + dump_json)": lambda: adapter.dump_json(
+            adapter.validate_python([schemas.TokenOut.model_validate(row) for row in rows]), by_alias=True),
+        "ORJSONResponse (validate + orjson)": lambda: orjson.dumps(
+            adapter.dump_python(adapter.validate_python([schemas.TokenOut.model_validate(row) for row in rows]),
+                                mode="json", by_alias=True)),
+        "model_construct + dump_json": lambda: adapter.dump_json(
+            [schemas.TokenOut.model_construct(**row._asdict()) for row in rows], by_alias=True),
+        "rows, pydantic_core.to_json": lambda: pydantic_core.to_json([row._asdict() for row in rows]),
+        "rows, fast_json": lambda: fast_json.rows(rows),
+    }
+
+
+def _encoders(rows):
+    results = {}
+    for name, fn in _variants(rows).items():
+        seconds, body = timed(fn, repeat=7)
+        results[name] = seconds, body
+        print(f"{name:<40} {seconds * 1000:8.2f} ms  {len(body):>10,} bytes")
+    bodies = {body for _, body in results.values()}
+    assert len(bodies) == 1, "encoders disagree"
+    baseline = results["response_model (validate + dump_json)"][0]
+    fast = results["rows, fast_json"][0]
+    assert fast < baseline, (fast, baseline)
+    print(f"fast_json: {baseline / fast:.1f}x faster than the response_model path")
+
+
+def run():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    engine, SessionLocal = temp_engine("serialization")
+    migrations.upgrade(engine)
+    dataset.generate(engine, max(int(count / dataset.SHARES["tokens"]) + 1000, 20_000))
+    with SessionLocal() as db:
+        rows = crud.get_all_tokens(db, limit=count)
+    assert len(rows) == count, len(rows)
+    print(f"fast_json encoder: {'orjson ' + orjson.__version__ if fast_json.orjson else 'pydantic_core'}")
+    _encoders(rows)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
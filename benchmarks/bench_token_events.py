@@ -0,0 +1,105 @@
+# Server push of token updates (routing and coalescing are checked in tests/test_token_events.py): 10k idle
+# /token_updates event streams are opened on one event loop (driving the ASGI app directly: the server's own
+# per-connection buffers are not counted), one purchase is fanned out to all of them, and they are closed again.
+# Usage: python -m benchmarks.bench_token_events [streams]
+import asyncio
+import resource
+import sys
+import time
+import crud, main, migrations, models, token_events
+from benchmarks import dataset
+from benchmarks.common import temp_engine
+
+
+def _tokens(SessionLocal, n: int) -> list:
+    """n open verified tokens with room for many purchases, with their farmer and country."""
+    with SessionLocal() as db:
+        return db.query(models.Token.id, models.Token.farmer_id, models.Farmer.country) \
+            .join(models.Farmer, models.Token.farmer).filter(
+                models.Token.is_funded == False, models.Token.token_status == models.TokenStatusEnum.verified,
+                models.Token.token_count - models.Token.tokens_sold >= 200,
+            ).order_by(models.Token.id).limit(n).all()
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _Stream:
+    """One /token_updates client driven through the ASGI interface."""
+
+    def __init__(self, query: str):
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/token_updates", "raw_path": b"/token_updates",
+            "query_string": query.encode(), "root_path": "", "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 1), "server": ("bench", 80),
+        }
+        self.disconnect = asyncio.Event()
+        self.events = []
+        self.received = asyncio.Event()
+        self.status = None
+
+    async def receive(self):
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message.get("body", b"").startswith(b"event: tokens"):
+            self.events.append(message["body"])
+            self.received.set()
+
+
+async def _idle_streams(n: int, SessionLocal, token, other):
+    streams = [_Stream(f"token_id={token.id}" if i % 2 else f"token_id={other.id}&token_id={token.id}")
+               for i in range(n)]
+    before = _rss_mb()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(main.app(s.scope, s.receive, s.send)) for s in streams]
+    while token_events.broker.subscribers < n:
+        await asyncio.sleep(0.05)
+    opened = time.perf_counter() - start
+    await asyncio.sleep(0.5)
+    rss = _rss_mb() - before
+    assert all(s.status == 200 for s in streams)
+    print(f"{n:,} idle event streams open in {opened:.2f} s, +{rss:.0f} MB RSS ({rss * 1024 / n:.1f} KB each)")
+
+    def buy():
+        with SessionLocal() as db:
+            crud.invest_in_token(db, token.id, "1", 1)
+    start = time.perf_counter()
+    await asyncio.to_thread(buy)
+    await asyncio.wait_for(asyncio.gather(*(s.received.wait() for s in streams)), 30)
+    fanout = time.perf_counter() - start
+    assert all(len(s.events) == 1 for s in streams)
+    print(f"one purchase delivered to all {n:,} streams in {fanout * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    for s in streams:
+        s.disconnect.set()
+    await asyncio.wait_for(asyncio.gather(*tasks), 60)
+    assert token_events.broker.subscribers == 0, token_events.broker.stats()
+    print(f"closed in {time.perf_counter() - start:.2f} s, no subscriber left")
+
+
+def run():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    engine, SessionLocal = temp_engine("token_events")
+    migrations.upgrade(engine)
+    dataset.generate(engine, 20_000)
+    tokens = _tokens(SessionLocal, 200)
+    token = tokens[0]
+    other = next(t for t in tokens if t.country.lower() not in token.country.lower()
+                 and token.country.lower() not in t.country.lower())
+    asyncio.run(_idle_streams(n, SessionLocal, token, other))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,53 @@
+# Rows/sec of the token listing: legacy ORM hydration + TokenOut versus the column-projection read model.
+# Usage: python -m benchmarks.bench_token_listing [token_count]
+import sys
+import pydantic_core
+from pydantic import TypeAdapter
+from sqlalchemy.orm import joinedload
+import crud, migrations, models, schemas
+from benchmarks.common import temp_engine, populate, timed
+
+TOKEN_LIST = TypeAdapter(list[schemas.TokenOut])
+
+
+def legacy_listing(db):
+    """What /tokens_all did before the read model: hydrate ORM objects, copy into TokenOut, validate, encode."""
+    tokens = db.query(models.Token).options(joinedload(models.Token.crop), joinedload(models.Token.farmer)).all()
+    out = []
+    for token in tokens:
+        out.append(schemas.TokenOut(
+            id=token.id, crop_id=token.crop_id, crop_name=token.crop.crop_name,
+            crop_variety=token.crop.variety, country=token.farmer.country, region=token.farmer.region,
+            organic_certified=token.crop.organic_certified, token_count=token.token_count,
+            price_per_token=token.price_per_token, expected_yield_unit=token.expected_yield_unit,
+            expected_total_yield=token.expected_total_yield, expected_roi=token.expected_roi,
+            tokens_sold=token.tokens_sold, is_funded=token.is_funded, funding_deadline=token.funding_deadline,
+            currency=token.currency, status=token.status, created_at=token.created_at,
+            funding_percentage=round((token.tokens_sold / token.token_count) * 100, 2) if token.token_count else 0.0,
+            tokens_left=token.token_count - token.tokens_sold, token_status=token.token_status,
+            planting_date=token.crop.planting_date, expected_harvest_month=token.crop.expected_harvest_month,
+        ))
+    body = TOKEN_LIST.dump_json(TOKEN_LIST.validate_python(out, from_attributes=True), by_alias=True)
+    db.expunge_all()
+    return len(out), body
+
+
+def projected_listing(db):
+    rows = crud.get_all_tokens(db=db)
+    return len(rows), pydantic_core.to_json([row._asdict() for row in rows])
+
+
+def main():
+    token_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    engine, SessionLocal = temp_engine("token_listing")
+    migrations.upgrade(engine)
+    print(f"Populating {populate(engine, tokens=token_count)}")
+    db = SessionLocal()
+    for name, fn in [("legacy ORM + TokenOut", legacy_listing), ("column projection", projected_listing)]:
+        seconds, (rows, body) = timed(lambda: fn(db), repeat=3)
+        print(f"{name:<24} {seconds * 1000:9.1f} ms  {rows / seconds:12,.0f} rows/s  {len(body):,} bytes")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
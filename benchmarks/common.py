@@ -0,0 +1,147 @@
+# Shared helpers for the benchmark scripts: throwaway SQLite databases and synthetic marketplace data.
+# Run every benchmark from the repository root, e.g. `python -m benchmarks.bench_indexes`.
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.orm import sessionmaker
+import models
+from database import make_engine
+from schemas import MonthEnum, RegistrationStatusEnum
+
+COUNTRIES = {
+    "Vietnam": ["Mekong Delta", "Red River Delta", "Central Highlands"],
+    "Kenya": ["Rift Valley", "Central", "Nyanza"],
+    "Ghana": ["Ashanti", "Volta", "Northern"],
+    "Nigeria": ["Kaduna", "Kano", "Oyo"],
+    "Ethiopia": ["Oromia", "Amhara", "Sidama"],
+    "Indonesia": ["Java", "Sumatra", "Sulawesi"],
+}
+CROPS = {
+    "Rice": ["Jasmine", "ST25", "Basmati"],
+    "Coffee": ["Arabica", "Robusta"],
+    "Cocoa": ["Forastero", "Trinitario"],
+    "Maize": ["White", "Yellow"],
+    "Cassava": ["TME 419", "Sweet"],
+    "Tea": ["Black", "Green"],
+}
+
+
+def temp_engine(name: str = "bench", sqlite_pragmas: dict = None):
+    """Create an engine, configured like the app's, on a fresh SQLite file in the temp directory."""
+    path = os.path.join(tempfile.mkdtemp(prefix="cropchain-"), f"{name}.db")
+    engine = make_engine(f"sqlite:///{path}", sqlite_pragmas=sqlite_pragmas)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@contextmanager
+def app_client(SessionLocal):
+    """A TestClient on the app whose sessions (get_db, get_session, database.SessionLocal) come from SessionLocal."""
+    from fastapi.testclient import TestClient
+    import database, main
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[main.get_db] = get_db
+    main.app.dependency_overrides[main.get_session] = get_db
+    saved, database.SessionLocal = database.SessionLocal, SessionLocal
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
+        database.SessionLocal = saved
+
+
+def populate(engine, tokens: int = 100_000, contracts: int = 0, investors: int = 100, seed: int = 42):
+    """Insert a deterministic synthetic catalog: tokens/20 farmers, tokens/5 crops, and optional contracts."""
+    rng = random.Random(seed)
+    months = list(MonthEnum)
+    now = datetime(2025, 1, 1)
+    n_farmers = max(1, tokens // 20)
+    n_crops = max(1, tokens // 5)
+    countries = list(COUNTRIES)
+    crop_names = list(CROPS)
+
+    farmer_rows = []
+    for i in range(1, n_farmers + 1):
+        country = rng.choice(countries)
+        farmer_rows.append({
+            "id": i, "name": f"Farmer {i}", "country": country, "region": rng.choice(COUNTRIES[country]),
+            "address": f"{i} Farm Road", "farm_size_ha": round(rng.uniform(0.5, 50), 1),
+            "registration_status": RegistrationStatusEnum.verified, "registered_at": now, "account_id": None,
+        })
+    crop_rows = []
+    for i in range(1, n_crops + 1):
+        name = rng.choice(crop_names)
+        crop_rows.append({
+            "id": i, "crop_name": name, "variety": rng.choice(CROPS[name]),
+            "planting_date": date(2024, 1, 1) + timedelta(days=rng.randrange(365)),
+            "expected_harvest_month": rng.choice(months), "farmer_id": rng.randint(1, n_farmers),
+            "farm_location": None, "organic_certified": rng.random() < 0.3,
+        })
+    token_rows = []
+    for i in range(1, tokens + 1):
+        crop = crop_rows[rng.randrange(n_crops)]
+        count = rng.choice([100, 500, 1000, 5000])
+        sold = rng.randint(0, count) if rng.random() < 0.6 else 0
+        funded = sold == count or rng.random() < 0.1
+        token_rows.append({
+            "id": i, "crop_id": crop["id"], "farmer_id": crop["farmer_id"], "token_count": count,
+            "price_per_token": rng.choice([5, 10, 20, 50]), "expected_yield_unit": "kg",
+            "expected_total_yield": count * 10, "expected_roi": round(rng.uniform(2, 20), 2),
+            "tokens_sold": count if funded else sold, "is_funded": funded,
+            "funding_deadline": date(2025, 1, 1) + timedelta(days=rng.randrange(365)),
+            "currency": "USDT", "status": "funded" if funded else "open",
+            "created_at": now - timedelta(minutes=tokens - i),
+            "token_status": models.TokenStatusEnum.verified if rng.random() < 0.8 else models.TokenStatusEnum.pending,
+        })
+    contract_rows = []
+    for i in range(1, contracts + 1):
+        token = token_rows[rng.randrange(tokens)]
+        quantity = rng.randint(1, 50)
+        contract_rows.append({
+            "id": i, "token_id": token["id"], "farmer_id": token["farmer_id"],
+            "investor_id": rng.randint(1, investors), "quantity": quantity,
+            "price_per_token": token["price_per_token"], "total_value": quantity * token["price_per_token"],
+            "delivery_type": rng.choice(["money", "product"]), "expected_roi": token["expected_roi"],
+            "expected_harvest_month": rng.choice(months), "payout_status": models.PayoutStatusEnum.pending,
+            "created_at": now + timedelta(seconds=i),
+        })
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.Farmer), farmer_rows)
+        conn.execute(insert(models.Crop), crop_rows)
+        conn.execute(insert(models.Token), token_rows)
+        if contract_rows:
+            conn.execute(insert(models.Contract), contract_rows)
+        if engine.dialect.name == "sqlite":
+            # Planner statistics, as a long-lived database would have them.
+            conn.execute(text("ANALYZE"))
+    return {"farmers": n_farmers, "crops": n_crops, "tokens": tokens, "contracts": contracts}
+
+
+def timed(fn, repeat: int = 5):
+    """Run fn repeat times and return (median seconds, last result)."""
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99/max in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"p50_ms": round(pick(0.50), 2), "p95_ms": round(pick(0.95), 2),
+            "p99_ms": round(pick(0.99), 2), "max_ms": round(ordered[-1] * 1000, 2)}
@@ -0,0 +1,287 @@
+# Deterministic synthetic marketplace for the load tests: farmers and their accounts, crops, tokens, investor
+# accounts, contracts and their investments, from 1k to 10M rows in total. The same rows and seed always give
+# the same database. Countries, crops per country, harvest seasons and farm sizes follow rough real-world
+# shares; purchases go to a few popular tokens and come from a few active investors (power laws), never
+# oversell a token, and the tokens' sold counts and funding aggregates agree with them.
+# Rows are generated and inserted a chunk at a time; only a few compact per-crop and per-token arrays stay in
+# memory. Databases are cached by scale, seed and generator version (CROPCHAIN_BENCH_DATA, default the temp
+# directory); generating 1M rows takes about half a minute.
+# Usage: python -m benchmarks.dataset [--rows N] [--seed S] [--force]
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from array import array
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+import aggregates, migrations, models, password_hashing
+from database import make_engine
+from schemas import MonthEnum, RegistrationStatusEnum
+from benchmarks.common import COUNTRIES, CROPS
+
+# Bump whenever the generated rows change, so cached databases are rebuilt
+VERSION = 1
+DATA_DIR = os.getenv("CROPCHAIN_BENCH_DATA", os.path.join(tempfile.gettempdir(), "cropchain-bench-data"))
+CHUNK = 10_000
+PASSWORD = "bench password"
+EMAIL_DOMAIN = "example.com"
+
+# Share of the row budget per table
+SHARES = {
+    "farmers": 0.02, "farmer_accounts": 0.02, "investor_accounts": 0.01, "crops": 0.04, "tokens": 0.08,
+    "contracts": 0.415, "investments": 0.415,
+}
+COUNTRY_WEIGHTS = {"Nigeria": 24, "Ethiopia": 18, "Kenya": 16, "Vietnam": 16, "Indonesia": 14, "Ghana": 12}
+CROP_WEIGHTS = {
+    "Vietnam": {"Rice": 50, "Coffee": 35, "Tea": 10, "Cassava": 5},
+    "Kenya": {"Tea": 40, "Maize": 30, "Coffee": 25, "Cassava": 5},
+    "Ghana": {"Cocoa": 55, "Cassava": 25, "Maize": 20},
+    "Nigeria": {"Cassava": 40, "Maize": 30, "Cocoa": 15, "Rice": 15},
+    "Ethiopia": {"Coffee": 55, "Maize": 30, "Tea": 15},
+    "Indonesia": {"Rice": 40, "Cocoa": 25, "Coffee": 25, "Tea": 10},
+}
+MONTHS = list(MonthEnum)
+M = MonthEnum
+HARVEST_MONTHS = {
+    "Rice": [M.may, M.june, M.october, M.november],
+    "Coffee": [M.october, M.november, M.december, M.january],
+    "Cocoa": [M.october, M.november, M.december, M.january, M.february, M.march],
+    "Maize": [M.july, M.august, M.september],
+    "Cassava": list(MonthEnum),
+    "Tea": list(MonthEnum),
+}
+START = datetime(2024, 1, 1)
+
+
+def counts(rows: int) -> dict:
+    """Rows per table for a total row budget."""
+    return {table: max(1, int(rows * share)) for table, share in SHARES.items()}
+
+
+def path(rows: int, seed: int = 42) -> str:
+    """Cached database file for a scale and seed (bcrypt cost included: it sets the login cost)."""
+    name = f"marketplace-{rows}-s{seed}-b{password_hashing.BCRYPT_ROUNDS}-v{VERSION}.db"
+    return os.path.join(DATA_DIR, name)
+
+
+def skewed(rng: random.Random, n: int, exponent: float = 3.0) -> int:
+    """1..n, heavily favouring low numbers (a power law: the first 10% get about half the picks at 3.0)."""
+    return min(n, int(n * rng.random() ** exponent) + 1)
+
+
+def _weighted(weights: dict):
+    return list(weights), list(weights.values())
+
+
+def _farmers(rng: random.Random, n: int, country_of: array):
+    countries, weights = _weighted(COUNTRY_WEIGHTS)
+    for i in range(1, n + 1):
+        country = rng.choices(countries, weights)[0]
+        country_of.append(countries.index(country))
+        yield {
+            "id": i, "name": f"Farmer {i}", "country": country, "region": rng.choice(COUNTRIES[country]),
+            "address": f"{i} Farm Road", "farm_size_ha": round(min(200.0, max(0.2, rng.lognormvariate(0.7, 1.0))), 1),
+            "registration_status": RegistrationStatusEnum.verified if rng.random() < 0.9
+            else RegistrationStatusEnum.pending,
+            "registered_at": START + timedelta(minutes=i), "account_id": i,
+        }
+
+
+def _crops(rng: random.Random, n: int, n_farmers: int, country_of: array, farmer_of: array, harvest_of: array):
+    by_country = [_weighted(CROP_WEIGHTS[country]) for country in COUNTRY_WEIGHTS]
+    for i in range(1, n + 1):
+        farmer_id = skewed(rng, n_farmers, 1.5)
+        name = rng.choices(*by_country[country_of[farmer_id - 1]])[0]
+        harvest = rng.choice(HARVEST_MONTHS[name])
+        farmer_of.append(farmer_id)
+        harvest_of.append(MONTHS.index(harvest))
+        yield {
+            "id": i, "crop_name": name, "variety": rng.choice(CROPS[name]),
+            "planting_date": date(2024, 1, 1) + timedelta(days=rng.randrange(365)),
+            "expected_harvest_month": harvest, "farmer_id": farmer_id,
+            "farm_location": None, "organic_certified": rng.random() < 0.25,
+        }
+
+
+class _Tokens:
+    """Per-token attributes the purchases need, as compact arrays (index = token id - 1)."""
+
+    def __init__(self, rng: random.Random, n: int, n_crops: int, farmer_of: array):
+        self.crop = array("i", (skewed(rng, n_crops, 1.5) for _ in range(n)))
+        self.farmer = array("i", (farmer_of[crop_id - 1] for crop_id in self.crop))
+        self.count = array("i", (rng.choice([100, 500, 1000, 1000, 5000, 10000]) for _ in range(n)))
+        self.price = array("i", (rng.choice([5, 10, 10, 20, 50]) for _ in range(n)))
+        self.roi = array("d", (round(rng.triangular(2, 25, 9), 2) for _ in range(n)))
+        self.verified = array("b", (rng.random() < 0.85 for _ in range(n)))
+        self.sold = array("i", bytes(4 * n))
+
+    def rows(self, rng: random.Random):
+        for i in range(len(self.crop)):
+            count, sold = self.count[i], self.sold[i]
+            funded = sold == count
+            yield {
+                "id": i + 1, "crop_id": self.crop[i], "farmer_id": self.farmer[i], "token_count": count,
+                "price_per_token": self.price[i], "expected_yield_unit": "kg", "expected_total_yield": count * 10,
+                "expected_roi": self.roi[i], "tokens_sold": sold, "is_funded": funded,
+                "funding_deadline": date(2025, 1, 1) + timedelta(days=rng.randrange(365)),
+                "currency": "USDT", "status": "funded" if funded else "open",
+                "created_at": START + timedelta(minutes=i),
+                "token_status": models.TokenStatusEnum.verified if self.verified[i] else models.TokenStatusEnum.pending,
+            }
+
+
+def _purchases(seed: int, tokens: _Tokens, n: int, n_investors: int):
+    """(token id, investor id, quantity) for n purchases of verified tokens that are not sold out.
+
+    Deterministic for a seed and the tokens' counts: running it twice gives the same purchases, so sold
+    counts can be known before the tokens are inserted and the contracts after.
+    """
+    rng = random.Random(seed)
+    sold = array("i", bytes(4 * len(tokens.count)))
+    for _ in range(n):
+        for _attempt in range(20):
+            token = skewed(rng, len(tokens.count)) - 1
+            left = tokens.count[token] - sold[token]
+            if tokens.verified[token] and left > 0:
+                break
+        else:
+            continue
+        quantity = min(left, 1 + int(rng.expovariate(1 / 8)))
+        sold[token] += quantity
+        yield token + 1, skewed(rng, n_investors, 2.0), quantity
+
+
+def _insert(conn, table, rows, progress: str = None):
+    chunk, total = [], 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            conn.execute(insert(table), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(table), chunk)
+        total += len(chunk)
+    if progress:
+        print(f"  {progress}: {total:,}", flush=True)
+    return total
+
+
+def generate(engine, rows: int, seed: int = 42, verbose: bool = False) -> dict:
+    """Fill a migrated, empty database with the marketplace for a row budget. Returns rows per table."""
+    n = counts(rows)
+    rng = random.Random(seed)
+    say = (lambda name: name) if verbose else (lambda name: None)
+    hashed = password_hashing.hash_password(PASSWORD)
+    country_of, farmer_of, harvest_of = array("b"), array("i"), array("b")
+    inserted = {}
+
+    with engine.begin() as conn:
+        inserted["farmer_accounts"] = _insert(conn, models.FarmerAccount, (
+            {"id": i, "email": f"farmer{i}@{EMAIL_DOMAIN}", "hashed_password": hashed, "created_at": START}
+            for i in range(1, n["farmers"] + 1)), say("farmer accounts"))
+        inserted["investor_accounts"] = _insert(conn, models.InvestorAccount, (
+            {"id": i, "email": f"investor{i}@{EMAIL_DOMAIN}", "hashed_password": hashed, "created_at": START}
+            for i in range(1, n["investor_accounts"] + 1)), say("investor accounts"))
+        inserted["farmers"] = _insert(conn, models.Farmer, _farmers(rng, n["farmers"], country_of), say("farmers"))
+        inserted["crops"] = _insert(conn, models.Crop, _crops(rng, n["crops"], n["farmers"], country_of, farmer_of,
+                                                              harvest_of), say("crops"))
+
+        tokens = _Tokens(rng, n["tokens"], n["crops"], farmer_of)
+        purchase_seed = rng.randrange(2 ** 32)
+        for token_id, _, quantity in _purchases(purchase_seed, tokens, n["contracts"], n["investor_accounts"]):
+            tokens.sold[token_id - 1] += quantity
+        inserted["tokens"] = _insert(conn, models.Token, tokens.rows(rng), say("tokens"))
+
+        def purchase_rows():
+            for i, (token_id, investor_id, quantity) in enumerate(
+                    _purchases(purchase_seed, tokens, n["contracts"], n["investor_accounts"]), start=1):
+                price = tokens.price[token_id - 1]
+                created = START + timedelta(days=30, seconds=i * 7)
+                yield {
+                    "id": i, "token_id": token_id, "farmer_id": tokens.farmer[token_id - 1],
+                    "investor_id": investor_id, "quantity": quantity, "price_per_token": price,
+                    "total_value": quantity * price, "delivery_type": "money" if rng.random() < 0.7 else "product",
+                    "expected_roi": tokens.roi[token_id - 1],
+                    "expected_harvest_month": MONTHS[harvest_of[tokens.crop[token_id - 1] - 1]],
+                    "payout_status": rng.choices(list(models.PayoutStatusEnum), [80, 17, 3])[0],
+                    "created_at": created, "chain_status": "synced",
+                }
+
+        def contracts_and_investments():
+            investments = []
+            for contract in purchase_rows():
+                investments.append({"id": contract["id"], "token_id": contract["token_id"],
+                                    "investor_id": str(contract["investor_id"]), "quantity": contract["quantity"],
+                                    "invested_at": contract["created_at"]})
+                yield contract
+                if len(investments) == CHUNK:
+                    conn.execute(insert(models.Investment), investments)
+                    investments.clear()
+            if investments:
+                conn.execute(insert(models.Investment), investments)
+        inserted["contracts"] = _insert(conn, models.Contract, contracts_and_investments(), say("contracts"))
+        inserted["investments"] = inserted["contracts"]
+
+    with Session(engine) as db:
+        aggregates.rebuild(db)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return inserted
+
+
+def ensure(rows: int, seed: int = 42, force: bool = False, verbose: bool = True) -> str:
+    """Path of the cached marketplace database for rows and seed, generating it first if needed."""
+    target = path(rows, seed)
+    if os.path.exists(target) and not force:
+        return target
+    os.makedirs(DATA_DIR, exist_ok=True)
+    building = f"{target}.{os.getpid()}.tmp"
+    # A scratch file: no journal or fsync while loading, and no WAL left beside the finished copy
+    engine = make_engine(f"sqlite:///{building}", sqlite_pragmas={
+        "journal_mode": "OFF", "synchronous": "OFF", "cache_size": -64000, "temp_store": "MEMORY"})
+    try:
+        if verbose:
+            print(f"Generating {rows:,} rows (seed {seed}) into {target}", flush=True)
+        start = time.perf_counter()
+        migrations.upgrade(engine)
+        inserted = generate(engine, rows, seed, verbose)
+        engine.dispose()
+        with open(f"{target}.json", "w") as f:
+            json.dump({"rows": rows, "seed": seed, "version": VERSION, "tables": inserted}, f)
+        shutil.move(building, target)
+        if verbose:
+            print(f"Generated {sum(inserted.values()):,} rows in {time.perf_counter() - start:.1f} s", flush=True)
+    finally:
+        engine.dispose()
+        if os.path.exists(building):
+            os.remove(building)
+    return target
+
+
+def describe(database: str) -> dict:
+    """Scale, seed and rows per table of a generated database."""
+    with open(f"{database}.json") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.dataset",
+                                     description="Generate (or find the cached) synthetic marketplace database.")
+    parser.add_argument("--rows", type=int, default=100_000, help="total rows, 1000 to 10000000")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="regenerate even if cached")
+    args = parser.parse_args(argv)
+    if not 1000 <= args.rows <= 10_000_000:
+        parser.error("--rows must be between 1000 and 10000000")
+    database = ensure(args.rows, args.seed, args.force)
+    print(database)
+    print(json.dumps(describe(database)["tables"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# In-process stand-in for a Hardhat node running CropChainTokenizedInvestment, for the chain benchmarks.
+# Speaks just enough JSON-RPC: eth_sendTransaction (createInvestment only; a repeated contractId reverts with
+# "Already exists" like the real contract), eth_getTransactionReceipt, eth_getLogs, eth_getBlockByNumber,
+# eth_call (investments), eth_chainId and eth_blockNumber. Every transaction is mined in its own block, as
+# Hardhat's automine does; purchase() and reorg() simulate investor purchases and a chain reorganisation.
+# Serve it to httpx with httpx.ASGITransport(app=FakeChain(...)).
+import asyncio
+import hashlib
+import json
+import random
+from chain_indexer import INVESTMENT_CREATED, TOKENS_PURCHASED
+from chain_sync import CREATE_INVESTMENT_SELECTOR, _string, _word
+
+INVESTMENTS_SELECTOR = "fd345c8a"  # investments(uint256)
+
+
+def _event_data(call: bytes) -> str:
+    """InvestmentCreated data from createInvestment call arguments (the first seven of them)."""
+    strings = [call[int.from_bytes(call[32 * i:32 * i + 32], "big"):] for i in (5, 6)]
+    strings = [s[32:32 + int.from_bytes(s[:32], "big")].decode() for s in strings]
+    return "0x" + (call[:32 * 5] + _word(7 * 32) + _word(7 * 32 + len(_string(strings[0])))
+                   + _string(strings[0]) + _string(strings[1])).hex()
+
+
+class FakeChain:
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0,
+                 address: str = "0xe7f1725e7734ce288f8367e1bb143e90bb3f0512"):
+        self.latency = latency  # seconds per eth_sendTransaction
+        self.failure_rate = failure_rate  # share of sends answered with a transient error
+        self.rng = random.Random(seed)
+        self.address = address
+        self.forks = 0
+        self.blocks = [self._block(0, "0x" + "00" * 32, [])]  # genesis
+        self.investments = {}  # contract id -> tx hash
+        self.receipts = {}  # tx hash -> receipt
+        self.sends = 0
+
+    def _block(self, number, parent, logs):
+        block_hash = "0x" + hashlib.sha256(f"{parent}{number}{self.forks}{len(logs)}".encode()).hexdigest()
+        for log in logs:
+            log.update(blockNumber=hex(number), blockHash=block_hash)
+        return {"number": number, "hash": block_hash, "parentHash": parent, "logs": logs}
+
+    def _mine(self, topic, data, tx_hash):
+        number = len(self.blocks)
+        log = {"address": self.address, "topics": [topic], "data": data, "transactionHash": tx_hash,
+               "logIndex": "0x0", "removed": False}
+        self.blocks.append(self._block(number, self.blocks[-1]["hash"], [log]))
+        self.receipts[tx_hash] = {"transactionHash": tx_hash, "blockNumber": hex(number), "status": "0x1"}
+
+    def purchase(self, contract_id: int, investor: str, quantity: int):
+        """An investor's purchaseTokens transaction."""
+        data = "0x" + (_word(contract_id) + _word(int(investor, 16)) + _word(quantity)).hex()
+        self._mine(TOKENS_PURCHASED, data, "0x" + hashlib.sha256(f"{data}{len(self.blocks)}".encode()).hexdigest())
+
+    def reorg(self, depth: int, keep=lambda log: True):
+        """Replace the last depth blocks with a fork holding only the logs keep() accepts."""
+        self.forks += 1
+        dropped = self.blocks[-depth:]
+        del self.blocks[-depth:]
+        for block in dropped:
+            logs = []
+            for log in block["logs"]:
+                if keep(log):
+                    logs.append(dict(log))
+                elif log["topics"][0] == INVESTMENT_CREATED:
+                    self.investments.pop(int(log["data"][2:66], 16), None)
+            self.blocks.append(self._block(block["number"], self.blocks[-1]["hash"], logs))
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        request = json.loads(body)
+        try:
+            response = {"result": await self.handle(request["method"], request.get("params", []))}
+        except Exception as e:
+            response = {"error": {"code": -32000, "message": str(e)}}
+        payload = json.dumps({"jsonrpc": "2.0", "id": request.get("id"), **response}).encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+    async def handle(self, method, params):
+        if method == "eth_chainId":
+            return "0x7a69"
+        if method == "eth_blockNumber":
+            return hex(len(self.blocks) - 1)
+        if method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            if number >= len(self.blocks):
+                return None
+            block = self.blocks[number]
+            return {"number": hex(number), "hash": block["hash"], "parentHash": block["parentHash"]}
+        if method == "eth_getLogs":
+            return self.get_logs(params[0])
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        if method == "eth_sendTransaction":
+            return await self.send_transaction(params[0])
+        if method == "eth_call" and params[0]["data"][2:10] == INVESTMENTS_SELECTOR:
+            # investments(contractId); only the leading contractId word (0 when absent) of the struct
+            contract_id = int(params[0]["data"][10:74], 16)
+            return "0x" + _word(contract_id if contract_id in self.investments else 0).hex()
+        raise ValueError(f"Method {method} not supported")
+
+    def get_logs(self, query):
+        start, end = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        topics = query.get("topics", [None])[0]
+        return [
+            log for block in self.blocks[start:end + 1] for log in block["logs"]
+            if log["address"] == query["address"].lower() and (topics is None or log["topics"][0] in topics)
+        ]
+
+    async def send_transaction(self, tx):
+        self.sends += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            raise ValueError("nonce too low")
+        data = tx["data"]
+        if data[2:10] != CREATE_INVESTMENT_SELECTOR:
+            raise ValueError("unknown function selector")
+        contract_id = int(data[10:74], 16)
+        if contract_id in self.investments:
+            raise ValueError("VM Exception while processing transaction: reverted with reason string 'Already exists'")
+        tx_hash = "0x" + hashlib.sha256(data.encode()).hexdigest()
+        self.investments[contract_id] = tx_hash
+        self._mine(INVESTMENT_CREATED, _event_data(bytes.fromhex(data[10:])), tx_hash)
+        return tx_hash
@@ -0,0 +1,345 @@
+# Scripted load tests against the FastAPI app, in-process over ASGI, on a synthetic marketplace
+# (benchmarks.dataset). Each workload runs in its own process on a fresh copy of the database, with
+# `concurrency` virtual users issuing requests back to back:
+#   browse          marketplace listings with filters and next pages, tokens of a crop, funding stats
+#   purchase_burst  investors buying the most popular open tokens at once
+#   login_storm     investor and farmer logins (a few with a wrong password)
+#   dashboard       farmers refreshing their dashboard (revalidating with its ETag), investors their
+#                   portfolio summary and contracts
+# `run` writes one JSON report: the commit, machine and dataset, then per workload the throughput,
+# p50/p95/p99/max latency, statuses, SQL statements per request and the same figures per endpoint.
+# `compare` lines two reports up and exits 1 when a workload got slower than the threshold.
+# Usage: python -m benchmarks.load run [--rows N] [--seed S] [--workloads a,b] [--requests N]
+#                                      [--concurrency N] [--output FILE]
+#        python -m benchmarks.load compare BASELINE CURRENT [--threshold PCT]
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import httpx
+import instrumentation, password_hashing
+from jwt_auth import create_access_token
+from benchmarks import dataset
+from benchmarks.common import percentiles
+from benchmarks.dataset import skewed
+
+REPORT_VERSION = 1
+# Workload -> (requests, virtual users)
+WORKLOADS = {
+    "browse": (2000, 16),
+    "purchase_burst": (1000, 64),
+    "login_storm": (200, 32),
+    "dashboard": (1000, 16),
+}
+# Share of each workload's requests run first and left out of the figures (fills caches, starts workers)
+WARMUP = 0.1
+# Latency figures compared by `compare`; throughput is compared the other way round
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+class _User:
+    """One virtual user: its own random stream, identity and what it remembers between requests."""
+
+    def __init__(self, number: int, seed: int, tables: dict):
+        self.rng = random.Random(seed * 1_000_003 + number)
+        self.farmer = self.rng.randint(1, tables["farmer_accounts"])
+        # Active investors are the ones with the most contracts
+        self.investor = skewed(self.rng, tables["investor_accounts"], 2.0)
+        self.farmer_headers = {"Authorization": f"Bearer {create_access_token({'sub': _email('farmer', self.farmer)})}"}
+        self.investor_headers = {
+            "Authorization": f"Bearer {create_access_token({'sub': _email('investor', self.investor)})}"}
+        self.cursor = None
+        self.etag = None
+
+
+def _email(kind: str, number: int) -> str:
+    return f"{kind}{number}@{dataset.EMAIL_DOMAIN}"
+
+
+def _listing_filters(rng: random.Random) -> dict:
+    countries = dataset.COUNTRY_WEIGHTS
+    filters = {"limit": rng.choice([20, 20, 50])}
+    if rng.random() < 0.4:
+        filters["country"] = rng.choices(list(countries), list(countries.values()))[0]
+    if rng.random() < 0.4:
+        filters["crop_name"] = rng.choice(list(dataset.CROP_WEIGHTS[filters.get("country", "Vietnam")]))
+    if rng.random() < 0.3:
+        filters["min_roi"] = rng.choice([5, 8, 10, 12, 15])
+    if rng.random() < 0.1:
+        filters["organic_only"] = "true"
+    return filters
+
+
+async def browse(client, user: _User, ctx: dict):
+    rng = user.rng
+    pick = rng.random()
+    if user.cursor and pick < 0.25:
+        # Next page of the listing the user is on
+        path, params = user.cursor
+        response = await client.get(path, params=params)
+        label = f"{path} (next page)"
+    elif pick < 0.6:
+        path, params = "/tokens_available", _listing_filters(rng)
+        response = await client.get(path, params=params)
+        label = path
+    elif pick < 0.7:
+        path, params = "/tokens_all", {"limit": 20}
+        response = await client.get(path, params=params)
+        label = path
+    elif pick < 0.82:
+        response = await client.get(f"/tokens_by_crop/{skewed(rng, ctx['tables']['crops'], 1.5)}")
+        return "/tokens_by_crop/{crop_id}", response
+    elif pick < 0.9:
+        response = await client.get(f"/stats/tokens/{skewed(rng, ctx['tables']['tokens'])}")
+        return "/stats/tokens/{token_id}", response
+    elif pick < 0.97:
+        response = await client.get(f"/stats/{rng.choice(['crops', 'countries', 'farmers'])}")
+        return "/stats/{group}", response
+    else:
+        response = await client.get("/stats/totals")
+        return "/stats/totals", response
+    cursor = response.headers.get("x-next-cursor")
+    user.cursor = (path, {**params, "cursor": cursor}) if cursor else None
+    return label, response
+
+
+async def purchase_burst(client, user: _User, ctx: dict):
+    response = await client.post("/create_contract", headers=user.investor_headers, json={
+        "token_id": user.rng.choice(ctx["hot_tokens"]), "quantity": user.rng.randint(1, 5),
+        "delivery_type": "money" if user.rng.random() < 0.7 else "product"})
+    return "/create_contract", response
+
+
+async def login_storm(client, user: _User, ctx: dict):
+    rng = user.rng
+    password = dataset.PASSWORD if rng.random() < 0.95 else "wrong password"
+    if rng.random() < 0.8:
+        number = rng.randint(1, ctx["tables"]["investor_accounts"])
+        return "/investor_login", await client.post("/investor_login", json={
+            "email": _email("investor", number), "password": password})
+    number = rng.randint(1, ctx["tables"]["farmer_accounts"])
+    return "/farmer_login", await client.post("/farmer_login", json={
+        "email": _email("farmer", number), "password": password})
+
+
+async def dashboard(client, user: _User, ctx: dict):
+    pick = user.rng.random()
+    if pick < 0.5:
+        headers = dict(user.farmer_headers)
+        if user.etag:
+            headers["If-None-Match"] = user.etag
+        response = await client.get("/farmer_dashboard", headers=headers)
+        user.etag = response.headers.get("etag", user.etag)
+        return "/farmer_dashboard", response
+    if pick < 0.8:
+        return "/portfolio_summary", await client.get("/portfolio_summary", headers=user.investor_headers)
+    return "/my_contracts", await client.get("/my_contracts", params={"limit": 20}, headers=user.investor_headers)
+
+
+STEPS = {"browse": browse, "purchase_burst": purchase_burst, "login_storm": login_storm, "dashboard": dashboard}
+
+
+def _hot_tokens(database: str, count: int = 20) -> list:
+    """The most bought verified tokens that still have tokens left: what a purchase burst goes for."""
+    with sqlite3.connect(database) as conn:
+        rows = conn.execute(
+            "SELECT t.id FROM tokens t JOIN contracts c ON c.token_id = t.id"
+            " WHERE t.token_status = 'verified' AND t.tokens_sold < t.token_count"
+            " GROUP BY t.id ORDER BY count(*) DESC, t.id LIMIT ?", (count,)).fetchall()
+    return [row[0] for row in rows]
+
+
+async def _drive(step, requests: int, concurrency: int, seed: int, ctx: dict):
+    """requests calls of step shared by concurrency users, after a warmup.
+
+    Returns [(label, status, seconds)], the elapsed seconds and the SQL statements the app ran meanwhile.
+    """
+    import main  # in the child only, on the database it is pointed at
+
+    main.prepare_database()
+
+    users = [_User(i, seed, ctx["tables"]) for i in range(concurrency)]
+    # A failing request is a 500 in the figures, not the end of the run
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        async def phase(total):
+            remaining = total
+            recorded = []
+
+            async def user_loop(user):
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    start = time.perf_counter()
+                    label, response = await step(client, user, ctx)
+                    recorded.append((label, response.status_code, time.perf_counter() - start))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(user_loop(user) for user in users))
+            return recorded, time.perf_counter() - start
+
+        await phase(max(1, int(requests * WARMUP)))
+        statements_before = _statements()
+        samples, elapsed = await phase(requests)
+    return samples, elapsed, _statements() - statements_before
+
+
+def _statements() -> int:
+    return sum(values[0] for values in list(instrumentation.metrics.db.values()))
+
+
+def _figures(samples: list, elapsed: float = None) -> dict:
+    statuses = Counter(status for _, status, _ in samples)
+    figures = {"requests": len(samples)}
+    if elapsed is not None:
+        figures["seconds"] = round(elapsed, 3)
+        figures["throughput_rps"] = round(len(samples) / elapsed, 1)
+    figures.update(percentiles([seconds for _, _, seconds in samples]))
+    figures["statuses"] = {str(status): count for status, count in sorted(statuses.items())}
+    figures["errors"] = sum(count for status, count in statuses.items() if status >= 500)
+    return figures
+
+
+def child(workload: str, database: str, requests: int, concurrency: int, seed: int):
+    # Requests over the slow threshold are the point here, not something to log one by one
+    logging.getLogger("cropchain.requests").setLevel(logging.ERROR)
+    ctx = {"tables": dataset.describe(database)["tables"]}
+    if workload == "purchase_burst":
+        ctx["hot_tokens"] = _hot_tokens(database)
+    samples, elapsed, statements = asyncio.run(_drive(STEPS[workload], requests, concurrency, seed, ctx))
+    password_hashing.hasher.shutdown()
+
+    result = {"concurrency": concurrency, **_figures(samples, elapsed),
+              "statements_per_request": round(statements / len(samples), 2)}
+    by_label = defaultdict(list)
+    for sample in samples:
+        by_label[sample[0]].append(sample)
+    result["endpoints"] = {label: _figures(by_label[label]) for label in sorted(by_label)}
+    print(json.dumps(result))
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workloads = args.workloads.split(",") if args.workloads else list(WORKLOADS)
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        sys.exit(f"Unknown workloads: {', '.join(sorted(unknown))} (choose from {', '.join(WORKLOADS)})")
+    source = dataset.ensure(args.rows, args.seed)
+
+    report = {
+        "version": REPORT_VERSION,
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "dataset": dataset.describe(source),
+        "workloads": {},
+    }
+    scratch = tempfile.mkdtemp(prefix="cropchain-load-")
+    try:
+        for workload in workloads:
+            requests, concurrency = WORKLOADS[workload]
+            requests, concurrency = args.requests or requests, args.concurrency or concurrency
+            copy = os.path.join(scratch, f"{workload}.db")
+            shutil.copy(source, copy)
+            shutil.copy(f"{source}.json", f"{copy}.json")
+            print(f"{workload}: {requests} requests, {concurrency} users", file=sys.stderr, flush=True)
+            env = dict(os.environ, CROPCHAIN_DATABASE_URL=f"sqlite:///{copy}")
+            output = subprocess.run([sys.executable, "-W", "ignore", "-m", "benchmarks.load", "--child", workload,
+                                     copy, str(requests), str(concurrency), str(args.seed)],
+                                    env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+            report["workloads"][workload] = json.loads(output.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for workload, figures in report["workloads"].items():
+        print(f"{workload:<15} {figures['throughput_rps']:>8.1f} req/s  p50 {figures['p50_ms']:>8.2f} ms  "
+              f"p95 {figures['p95_ms']:>8.2f} ms  p99 {figures['p99_ms']:>8.2f} ms  errors {figures['errors']}",
+              file=sys.stderr)
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for report in (baseline, current):
+        print(f"{report['commit'] or 'unknown'}{' (dirty)' if report['dirty'] else ''}  {report['created_at']}  "
+              f"{report['dataset']['rows']:,} rows, seed {report['dataset']['seed']}")
+    if (baseline["dataset"]["rows"], baseline["dataset"]["seed"]) != (current["dataset"]["rows"],
+                                                                      current["dataset"]["seed"]):
+        print("warning: the reports were run on different datasets")
+
+    regressions = []
+    for workload in sorted(set(baseline["workloads"]) & set(current["workloads"])):
+        before, after = baseline["workloads"][workload], current["workloads"][workload]
+        print(workload)
+        for name in COMPARED + ("throughput_rps",):
+            change = _change(before[name], after[name])
+            print(f"  {name:<15} {before[name]:>10.2f} -> {after[name]:>10.2f}  {change:+6.1f}%")
+            # Slower: a higher latency percentile or a lower throughput
+            if (-change if name == "throughput_rps" else change) > args.threshold:
+                regressions.append(f"{workload} {name}")
+    if regressions:
+        print(f"Slower by more than {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="Load-test the app in-process.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run workloads and write a JSON report")
+    run_parser.add_argument("--rows", type=int, default=100_000, help="dataset size, 1000 to 10000000 rows")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--workloads", help=f"comma-separated, from {', '.join(WORKLOADS)} (default all)")
+    run_parser.add_argument("--requests", type=int, help="requests per workload (default per workload)")
+    run_parser.add_argument("--concurrency", type=int, help="virtual users per workload (default per workload)")
+    run_parser.add_argument("--output", help="report file (default stdout)")
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0,
+                                help="percent slowdown of a latency percentile or throughput that fails")
+    args = parser.parse_args(argv)
+    if args.command == "run" and not 1000 <= args.rows <= 10_000_000:
+        parser.error("--rows must be between 1000 and 10000000")
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        workload, database, requests, concurrency, seed = sys.argv[2:7]
+        child(workload, database, int(requests), int(concurrency), int(seed))
+    else:
+        main()
@@ -0,0 +1,258 @@
+# Bulk onboarding of a cooperative's farmers, crops and tokens from CSV or NDJSON sheets.
+# Rows are validated with the API schemas (FarmerCreate/CropCreate/TokenCreate) a batch at a time, references
+# between sheets are resolved in memory, and each chunk is inserted with one executemany and committed on
+# its own. Bad rows are reported with their line number and skipped; they never fail the rest of the import.
+#
+# Sheets refer to each other with spreadsheet-local keys: a farmer row may carry a `ref`, a crop row names
+# its farmer by `farmer_ref` (or an existing `farmer_id`) and may carry its own `ref`, and a token row names
+# its crop by `crop_ref` (or an existing `crop_id`).
+# Usage: python -m bulk_import [--farmers FILE] [--crops FILE] [--tokens FILE] [--chunk-size N]
+import argparse
+import csv
+import json
+import sys
+from typing import NamedTuple, Optional
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+import aggregates, crud, database, http_cache, models, schemas
+
+CHUNK_SIZE = 1000
+# Errors listed in a report; the count covers all of them
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(NamedTuple):
+    sheet: str
+    line: int
+    ref: Optional[str]
+    message: str
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = {"farmers": 0, "crops": 0, "tokens": 0}
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, sheet: str, line: int, ref, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(sheet, line, ref, message))
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "error_count": self.error_count,
+                "errors": [error._asdict() for error in self.errors]}
+
+
+def _validate(adapter: TypeAdapter, rows: list) -> tuple:
+    """Validate rows in one pass. Returns (models for the valid rows, {index: message} for the others)."""
+    try:
+        return adapter.validate_python(rows), {}
+    except ValidationError as e:
+        failed = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            field = ".".join(str(part) for part in error["loc"][1:])
+            failed.setdefault(index, f"{field}: {error['msg']}" if field else error["msg"])
+    valid = adapter.validate_python([row for i, row in enumerate(rows) if i not in failed]) if len(failed) < len(rows) else []
+    return valid, failed
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(db: Session, model, values: list) -> list:
+    """executemany INSERT of values; returns the new ids in the same order. The caller commits."""
+    if not values:
+        return []
+    return db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), values).scalars().all()
+
+
+def _existing_ids(db: Session, column, ids) -> dict:
+    return dict(db.execute(select(column.table.c.id, column).where(column.table.c.id.in_(ids))).all()) if ids else {}
+
+
+FARMERS = TypeAdapter(list[schemas.FarmerCreate])
+CROPS = TypeAdapter(list[schemas.CropCreate])
+TOKENS = TypeAdapter(list[schemas.TokenCreate])
+
+
+def import_sheets(db: Session, farmers=(), crops=(), tokens=(), chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    """Import (line, row) iterables for each sheet: farmers, then crops, then tokens. Returns the report."""
+    report = ImportReport()
+    farmer_refs = {}  # ref -> farmer id
+    crop_refs = {}  # ref -> (crop id, farmer id)
+
+    for chunk in _chunks(farmers, chunk_size):
+        prepared, refs = [], set()
+        for line, row in chunk:
+            if not isinstance(row, dict):
+                report.error("farmers", line, None, "Unreadable row")
+            elif row.get("ref") is not None and (str(row["ref"]) in farmer_refs or str(row["ref"]) in refs):
+                report.error("farmers", line, row["ref"], "Duplicate ref")
+            else:
+                prepared.append((line, row))
+                refs.add(str(row["ref"]) if row.get("ref") is not None else None)
+        valid, failed = _validate(FARMERS, [row for _, row in prepared])
+        for index, message in failed.items():
+            line, row = prepared[index]
+            report.error("farmers", line, row.get("ref"), message)
+        kept = [item for i, item in enumerate(prepared) if i not in failed]
+        ids = _insert(db, models.Farmer, [{**farmer.model_dump(), "account_id": None} for farmer in valid])
+        db.commit()
+        for (line, row), farmer_id in zip(kept, ids):
+            if row.get("ref") is not None:
+                farmer_refs[str(row["ref"])] = farmer_id
+        report.inserted["farmers"] += len(ids)
+
+    for chunk in _chunks(crops, chunk_size):
+        prepared, refs = [], set()
+        for line, row in chunk:
+            if not isinstance(row, dict):
+                report.error("crops", line, None, "Unreadable row")
+                continue
+            ref = row.get("ref")
+            if ref is not None and (str(ref) in crop_refs or str(ref) in refs):
+                report.error("crops", line, ref, "Duplicate ref")
+            elif row.get("farmer_ref") is not None:
+                if str(row["farmer_ref"]) not in farmer_refs:
+                    report.error("crops", line, ref, f"Unknown farmer_ref {row['farmer_ref']!r}")
+                else:
+                    prepared.append((line, {**row, "farmer_id": farmer_refs[str(row["farmer_ref"])]}))
+                    refs.add(str(ref) if ref is not None else None)
+            else:
+                prepared.append((line, row))
+                refs.add(str(ref) if ref is not None else None)
+        valid, failed = _validate(CROPS, [row for _, row in prepared])
+        for index, message in failed.items():
+            line, row = prepared[index]
+            report.error("crops", line, row.get("ref"), message)
+        # A farmer_id given directly is looked up once validated, so "5", 5.0 and 5 are all checked as 5
+        validated = list(zip([item for i, item in enumerate(prepared) if i not in failed], valid))
+        existing = _existing_ids(db, models.Farmer.id, {
+            crop.farmer_id for (_, row), crop in validated if row.get("farmer_ref") is None})
+        kept = []
+        for (line, row), crop in validated:
+            if row.get("farmer_ref") is None and crop.farmer_id not in existing:
+                report.error("crops", line, row.get("ref"), f"Farmer {crop.farmer_id} not found")
+            else:
+                kept.append((row, crop))
+        ids = _insert(db, models.Crop, [crop.model_dump() for _, crop in kept])
+        db.commit()
+        for (row, crop), crop_id in zip(kept, ids):
+            if row.get("ref") is not None:
+                crop_refs[str(row["ref"])] = (crop_id, crop.farmer_id)
+        report.inserted["crops"] += len(ids)
+
+    for chunk in _chunks(tokens, chunk_size):
+        prepared = []
+        for line, row in chunk:
+            if not isinstance(row, dict):
+                report.error("tokens", line, None, "Unreadable row")
+                continue
+            farmer_id = None  # crop_id given directly: looked up after validation
+            if row.get("crop_ref") is not None:
+                if str(row["crop_ref"]) not in crop_refs:
+                    report.error("tokens", line, None, f"Unknown crop_ref {row['crop_ref']!r}")
+                    continue
+                crop_id, farmer_id = crop_refs[str(row["crop_ref"])]
+                row = {**row, "crop_id": crop_id}
+            prepared.append((line, row, farmer_id))
+        valid, failed = _validate(TOKENS, [row for _, row, _ in prepared])
+        for index, message in failed.items():
+            report.error("tokens", prepared[index][0], None, message)
+        validated = list(zip([item for i, item in enumerate(prepared) if i not in failed], valid))
+        direct = _existing_ids(db, models.Crop.farmer_id, {
+            token.crop_id for (_, _, farmer_id), token in validated if farmer_id is None})
+        kept = []
+        for (line, _, farmer_id), token in validated:
+            if farmer_id is None and token.crop_id not in direct:
+                report.error("tokens", line, None, f"Crop {token.crop_id} not found")
+            else:
+                kept.append((token, direct[token.crop_id] if farmer_id is None else farmer_id))
+        # Same defaults as crud.create_token: new tokens always start pending
+        ids = _insert(db, models.Token, [
+            {**token.model_dump(), "farmer_id": farmer_id, "token_status": models.TokenStatusEnum.pending}
+            for token, farmer_id in kept
+        ])
+        aggregates.tokens_offered(db, [(token_id, token.token_count) for (token, _), token_id in zip(kept, ids)])
+        db.commit()
+        report.inserted["tokens"] += len(ids)
+
+    if report.inserted["farmers"]:
+        http_cache.versions.bump("farmers")
+    if report.inserted["crops"]:
+        http_cache.versions.bump("crops")
+    if report.inserted["tokens"]:
+        http_cache.versions.bump("funding_aggregates")
+        crud._tokens_changed(membership=True)
+    return report
+
+
+def _numbered_csv(text):
+    """csv rows paired with the line they start on (header is line 1)."""
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, {k.strip(): (v.strip() or None) if isinstance(v, str) else v
+                                for k, v in row.items() if k}
+
+
+def sheet_rows(text, fmt: str):
+    """(line, row) pairs from a CSV or NDJSON text stream; rows that are not valid JSON come back as None."""
+    if fmt == "csv":
+        return _numbered_csv(text)
+    if fmt == "ndjson":
+        return _ndjson(text)
+    raise ValueError(f"Unknown format {fmt!r}")
+
+
+def _ndjson(text):
+    for number, line in enumerate(text, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+def format_of(filename: str) -> str:
+    return "ndjson" if filename.lower().endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bulk_import", description="Import cooperative sheets.")
+    for sheet in ("farmers", "crops", "tokens"):
+        parser.add_argument(f"--{sheet}", metavar="FILE", help=f"{sheet} sheet (.csv, or .ndjson/.jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    handles, sheets = [], {}
+    try:
+        for sheet in ("farmers", "crops", "tokens"):
+            path = getattr(args, sheet)
+            if path:
+                handles.append(open(path, encoding="utf-8-sig", newline=""))
+                sheets[sheet] = sheet_rows(handles[-1], format_of(path))
+        db = database.SessionLocal()
+        try:
+            report = import_sheets(db, chunk_size=args.chunk_size, **sheets)
+        finally:
+            db.close()
+    finally:
+        for handle in handles:
+            handle.close()
+    json.dump(report.as_dict(), sys.stdout, indent=2, default=str)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# Incremental indexer for CropChainTokenizedInvestment logs. Reads InvestmentCreated and TokensPurchased with
+# eth_getLogs in block ranges from a checkpoint and writes them to chain_investments / chain_purchases, so
+# confirmation state is one indexed join against contracts instead of an investments(contractId) call per
+# contract.
+#
+# Each range is applied in one transaction together with the new checkpoint, so a crash never skips or
+# doubles a log. The checkpoint keeps its block hash: when the chain no longer has that block, the indexer
+# rewinds REORG_DEPTH blocks (further if stored logs still disagree with the chain), drops everything indexed
+# past the fork and indexes forward again.
+# Usage: python -m chain_indexer [--once] [--from-block N] [--block-range N]
+#        (CROPCHAIN_CHAIN_RPC_URL, CROPCHAIN_CHAIN_CONTRACT)
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+import chain_sync, database, http_cache, models
+
+logger = logging.getLogger(__name__)
+
+BLOCK_RANGE = int(os.getenv("CROPCHAIN_INDEXER_BLOCK_RANGE", 2000))
+REORG_DEPTH = 12
+# Blocks behind the head to stay; 0 indexes up to the latest block and relies on reorg handling
+CONFIRMATIONS = int(os.getenv("CROPCHAIN_INDEXER_CONFIRMATIONS", 0))
+
+# keccak256 of the event signatures
+INVESTMENT_CREATED = "0xeecbf04187c0867906f15a23e66177c16cf65d28103ff907c48f60f07da25008"  # InvestmentCreated(uint256,uint256,uint256,uint256,address,string,string)
+TOKENS_PURCHASED = "0xaf357506555a8fdf38c81d9a8fa2c6bca372e817f179cf596c9645902a927aea"  # TokensPurchased(uint256,address,uint256)
+
+
+def _uint(data: bytes, i: int) -> int:
+    return int.from_bytes(data[32 * i:32 * i + 32], "big")
+
+
+def _address(data: bytes, i: int) -> str:
+    return "0x" + data[32 * i + 12:32 * i + 32].hex()
+
+
+def _string(data: bytes, i: int) -> str:
+    offset = _uint(data, i)
+    length = int.from_bytes(data[offset:offset + 32], "big")
+    return data[offset + 32:offset + 32 + length].decode(errors="replace")
+
+
+def decode_log(log: dict):
+    """(model, row) for a contract log, or None for logs of other events."""
+    topic = log["topics"][0] if log.get("topics") else None
+    data = bytes.fromhex(log["data"][2:])
+    origin = {
+        "block_number": int(log["blockNumber"], 16),
+        "block_hash": log["blockHash"],
+        "tx_hash": log["transactionHash"],
+        "log_index": int(log["logIndex"], 16),
+    }
+    if topic == INVESTMENT_CREATED:
+        return models.ChainInvestment, {
+            "contract_id": _uint(data, 0), "token_id": _uint(data, 1), "farmer_id": _uint(data, 2),
+            "investor_id": _uint(data, 3), "farmer_address": _address(data, 4),
+            "crop_name": _string(data, 5), "crop_variety": _string(data, 6), "tokens_sold": 0, **origin,
+        }
+    if topic == TOKENS_PURCHASED:
+        return models.ChainPurchase, {
+            "contract_id": _uint(data, 0), "investor_address": _address(data, 1), "quantity": _uint(data, 2),
+            **origin,
+        }
+    return None
+
+
+def _recount(db: Session, contract_ids):
+    """Set chain_investments.tokens_sold from chain_purchases for the given contracts."""
+    if not contract_ids:
+        return
+    sold = select(func.coalesce(func.sum(models.ChainPurchase.quantity), 0)) \
+        .where(models.ChainPurchase.contract_id == models.ChainInvestment.contract_id).scalar_subquery()
+    db.execute(
+        update(models.ChainInvestment).where(models.ChainInvestment.contract_id.in_(contract_ids))
+        .values(tokens_sold=sold).execution_options(synchronize_session=False)
+    )
+
+
+class ChainIndexer:
+    def __init__(self, chain: chain_sync.JsonRpcChain, session_factory=None, start_block: int = 0,
+                 block_range: int = BLOCK_RANGE, confirmations: int = CONFIRMATIONS):
+        self.chain = chain
+        self.address = chain.contract.lower()
+        self.session_factory = session_factory or database.SessionLocal
+        self.start_block = start_block
+        self.block_range = block_range
+        self.confirmations = confirmations
+        self.logs = 0
+        self.reorgs = 0
+        self.rewound_blocks = 0
+
+    async def _block_hash(self, number: int):
+        block = await self.chain.rpc("eth_getBlockByNumber", [hex(number), False])
+        return block["hash"] if block else None
+
+    async def _logs(self, start: int, end: int) -> list:
+        """Logs of the contract in start..end; halves the range when the node refuses it as too large."""
+        try:
+            return await self.chain.rpc("eth_getLogs", [{
+                "address": self.chain.contract, "fromBlock": hex(start), "toBlock": hex(end),
+                "topics": [[INVESTMENT_CREATED, TOKENS_PURCHASED]],
+            }])
+        except chain_sync.ChainError:
+            if start == end:
+                raise
+            middle = (start + end) // 2
+            return await self._logs(start, middle) + await self._logs(middle + 1, end)
+
+    def _checkpoint(self):
+        with self.session_factory() as db:
+            return db.execute(
+                select(models.ChainCheckpoint.block_number, models.ChainCheckpoint.block_hash)
+                .where(models.ChainCheckpoint.address == self.address)
+            ).first()
+
+    def _newest_indexed(self, at_most: int):
+        """(block_number, block_hash) of the newest indexed log at or below a block, or None."""
+        with self.session_factory() as db:
+            rows = [db.execute(
+                select(model.block_number, model.block_hash).where(model.block_number <= at_most)
+                .order_by(model.block_number.desc()).limit(1)
+            ).first() for model in (models.ChainInvestment, models.ChainPurchase)]
+        rows = [row for row in rows if row]
+        return max(rows) if rows else None
+
+    def _set_checkpoint(self, db: Session, number: int, block_hash: str):
+        db.merge(models.ChainCheckpoint(address=self.address, block_number=number, block_hash=block_hash,
+                                        updated_at=datetime.now(timezone.utc)))
+
+    def _apply(self, logs: list, end: int, end_hash: str) -> int:
+        """Write the logs of one range and move the checkpoint to its last block, in one transaction."""
+        rows = {models.ChainInvestment: [], models.ChainPurchase: []}
+        for log in logs:
+            if log.get("removed") or log.get("address", self.address).lower() != self.address:
+                continue
+            decoded = decode_log(log)
+            if decoded:
+                rows[decoded[0]].append(decoded[1])
+        investments, purchases = rows[models.ChainInvestment], rows[models.ChainPurchase]
+        with self.session_factory() as db:
+            if investments:
+                # Upsert: a contract id appears once on chain, but may be left over from a rewound fork
+                ids = [row["contract_id"] for row in investments]
+                db.execute(delete(models.ChainInvestment).where(models.ChainInvestment.contract_id.in_(ids)))
+                db.execute(insert(models.ChainInvestment), investments)
+            if purchases:
+                db.execute(insert(models.ChainPurchase), purchases)
+            _recount(db, {row["contract_id"] for row in investments + purchases})
+            self._set_checkpoint(db, end, end_hash)
+            db.commit()
+        if investments or purchases:
+            http_cache.versions.bump("chain_investments")
+        return len(investments) + len(purchases)
+
+    def _truncate(self, fork: int, fork_hash):
+        """Drop everything indexed after block fork and move the checkpoint back to it."""
+        with self.session_factory() as db:
+            touched = db.execute(
+                select(models.ChainPurchase.contract_id).where(models.ChainPurchase.block_number > fork).distinct()
+            ).scalars().all()
+            db.execute(delete(models.ChainPurchase).where(models.ChainPurchase.block_number > fork))
+            db.execute(delete(models.ChainInvestment).where(models.ChainInvestment.block_number > fork))
+            _recount(db, touched)
+            if fork_hash is None:
+                db.execute(delete(models.ChainCheckpoint).where(models.ChainCheckpoint.address == self.address))
+            else:
+                self._set_checkpoint(db, fork, fork_hash)
+            db.commit()
+        http_cache.versions.bump("chain_investments")
+
+    async def _rewind(self, checkpoint: int):
+        fork = max(checkpoint - REORG_DEPTH, self.start_block - 1)
+        while fork >= self.start_block:
+            newest = await asyncio.to_thread(self._newest_indexed, fork)
+            if newest is None or await self._block_hash(newest[0]) == newest[1]:
+                break
+            fork = newest[0] - 1  # that log was on the dropped fork too
+        fork_hash = await self._block_hash(fork) if fork >= self.start_block else None
+        await asyncio.to_thread(self._truncate, fork, fork_hash)
+        self.reorgs += 1
+        self.rewound_blocks += checkpoint - fork
+        logger.warning("Chain reorg below block %d: rewound to block %d", checkpoint, fork)
+
+    async def run_once(self) -> int:
+        """Index the next block range (or handle a reorg). Returns the number of blocks advanced, 0 when idle."""
+        head = int(await self.chain.rpc("eth_blockNumber", []), 16) - self.confirmations
+        checkpoint = await asyncio.to_thread(self._checkpoint)
+        if checkpoint is not None:
+            number, block_hash = checkpoint
+            if await self._block_hash(number) != block_hash:
+                await self._rewind(number)
+                return 1
+        start = checkpoint[0] + 1 if checkpoint is not None else self.start_block
+        if start > head:
+            return 0
+        end = min(start + self.block_range - 1, head)
+        end_hash = await self._block_hash(end)
+        logs = await self._logs(start, end)
+        if await self._block_hash(end) != end_hash:
+            return 1  # the range changed under us; read it again next round
+        self.logs += await asyncio.to_thread(self._apply, logs, end, end_hash)
+        return end - start + 1
+
+    async def run(self, poll_interval: float = 2.0, stop: asyncio.Event = None, report=None):
+        """Index continuously; sleeps poll_interval once caught up."""
+        while stop is None or not stop.is_set():
+            advanced = await self.run_once()
+            if advanced and report:
+                report(self.stats())
+            if not advanced:
+                await asyncio.sleep(poll_interval)
+
+    def stats(self) -> dict:
+        return {"logs": self.logs, "reorgs": self.reorgs, "rewound_blocks": self.rewound_blocks}
+
+
+def index_status(db: Session) -> list:
+    """Checkpoint of every indexed contract address."""
+    return [
+        {"address": row.address, "block_number": row.block_number, "updated_at": row.updated_at}
+        for row in db.query(models.ChainCheckpoint).all()
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chain_indexer", description="Index contract logs.")
+    parser.add_argument("--once", action="store_true", help="index up to the current head, then exit")
+    parser.add_argument("--from-block", type=int, default=0, help="first block when there is no checkpoint")
+    parser.add_argument("--block-range", type=int, default=BLOCK_RANGE)
+    args = parser.parse_args(argv)
+
+    indexer = ChainIndexer(chain_sync.JsonRpcChain(), start_block=args.from_block, block_range=args.block_range)
+    report = lambda stats: print(json.dumps(stats), flush=True)
+
+    async def catch_up():
+        while await indexer.run_once():
+            report(indexer.stats())
+
+    asyncio.run(catch_up() if args.once else indexer.run(report=report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# Drains the outbox (outbox.py) to the CropChainTokenizedInvestment contract. Replaces
+# syncContractsToBlockchain.js, which re-sent every contract serially on each run.
+#
+# Each round claims a batch of due events with a conditional UPDATE (a lease, so several workers can run),
+# sends them with bounded concurrency, then records every outcome in one transaction: the event is marked
+# sent and its contract synced, or it is retried with exponential backoff until MAX_ATTEMPTS. The contract id
+# is the idempotency key on chain as well: createInvestment reverts with "Already exists" for a contract
+# that was already sent, which counts as synced.
+# Usage: python -m chain_sync [--once] [--batch-size N] [--concurrency N]
+#        (CROPCHAIN_CHAIN_RPC_URL, CROPCHAIN_CHAIN_CONTRACT, CROPCHAIN_CHAIN_SENDER)
+import abc
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+import database, http_cache, models, outbox
+
+RPC_URL = os.getenv("CROPCHAIN_CHAIN_RPC_URL", "http://127.0.0.1:8545")
+CONTRACT_ADDRESS = os.getenv("CROPCHAIN_CHAIN_CONTRACT", "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512")
+# Unlocked account on the node (Hardhat's first account by default)
+SENDER = os.getenv("CROPCHAIN_CHAIN_SENDER", "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266")
+# Farmers have no wallet column yet; same placeholder the JS script used
+FARMER_WALLET = "0x000000000000000000000000000000000000dEaD"
+
+BATCH_SIZE = 100
+CONCURRENCY = 8
+MAX_ATTEMPTS = 10
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 300.0
+# How long a claimed event stays with one worker before another may take it over
+LEASE_SECONDS = 120
+
+# keccak256("createInvestment(uint256,uint256,uint256,uint256,address,string,string,uint256,uint256,uint256,
+# uint256,uint256,uint8)")[:4]
+CREATE_INVESTMENT_SELECTOR = "7e4f1d83"
+
+
+class ChainError(Exception):
+    """Sending failed; worth retrying later."""
+
+
+class AlreadyOnChain(Exception):
+    """The chain already has this contract."""
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def _string(value: str) -> bytes:
+    data = value.encode()
+    return _word(len(data)) + data + b"\0" * (-len(data) % 32)
+
+
+def encode_create_investment(payload: dict) -> str:
+    """ABI-encoded call data for createInvestment(...) from an outbox.contract_payload."""
+    head = [
+        payload["contract_id"], payload["token_id"], payload["farmer_id"], payload["investor_id"] or 0,
+        int(FARMER_WALLET, 16), None, None, payload["price_per_token"] or 0, payload["token_count"] or 0,
+        payload["expected_roi"], payload["funding_deadline"], payload["expected_harvest_date"],
+        payload["delivery_type"],
+    ]
+    tail = b""
+    words = []
+    for i, value in enumerate(head):
+        if value is None:  # dynamic string: offset into the tail
+            words.append(_word(len(head) * 32 + len(tail)))
+            tail += _string(payload["crop_name"] if i == 5 else payload["crop_variety"])
+        else:
+            words.append(_word(value))
+    return "0x" + CREATE_INVESTMENT_SELECTOR + (b"".join(words) + tail).hex()
+
+
+class ChainClient(abc.ABC):
+    """Where createInvestment calls go. create_investment returns the transaction hash."""
+
+    @abc.abstractmethod
+    async def create_investment(self, payload: dict) -> str:
+        ...
+
+
+class JsonRpcChain(ChainClient):
+    """Sends createInvestment with eth_sendTransaction from an account unlocked on the node (e.g. Hardhat)."""
+
+    def __init__(self, url: str = RPC_URL, contract: str = CONTRACT_ADDRESS, sender: str = SENDER,
+                 client=None, receipt_timeout: float = 60.0):
+        import httpx
+
+        self.url = url
+        self.contract = contract
+        self.sender = sender
+        self.client = client or httpx.AsyncClient(timeout=30)
+        self.receipt_timeout = receipt_timeout
+        self._ids = iter(range(1, 1 << 62))
+
+    async def rpc(self, method: str, params: list):
+        try:
+            response = await self.client.post(self.url, json={
+                "jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params
+            })
+            body = response.json()
+        except Exception as e:
+            raise ChainError(f"{method}: {e!r}")
+        if "error" in body:
+            message = str(body["error"].get("message", body["error"]))
+            if "Already exists" in message:
+                raise AlreadyOnChain(message)
+            raise ChainError(f"{method}: {message}")
+        return body["result"]
+
+    async def create_investment(self, payload: dict) -> str:
+        tx_hash = await self.rpc("eth_sendTransaction", [{
+            "from": self.sender, "to": self.contract, "data": encode_create_investment(payload)
+        }])
+        deadline = time.monotonic() + self.receipt_timeout
+        delay = 0.05
+        while True:
+            receipt = await self.rpc("eth_getTransactionReceipt", [tx_hash])
+            if receipt is not None:
+                if int(receipt.get("status", "0x1"), 16) != 1:
+                    raise ChainError(f"transaction {tx_hash} reverted")
+                return tx_hash
+            if time.monotonic() > deadline:
+                raise ChainError(f"no receipt for {tx_hash} after {self.receipt_timeout}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def backoff(attempts: int) -> float:
+    """Seconds before retry number `attempts`: exponential with jitter, capped at MAX_BACKOFF_SECONDS."""
+    return min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.0)
+
+
+class SyncWorker:
+    def __init__(self, chain: ChainClient, session_factory=None, batch_size: int = BATCH_SIZE,
+                 concurrency: int = CONCURRENCY, max_attempts: int = MAX_ATTEMPTS):
+        self.chain = chain
+        self.session_factory = session_factory or database.SessionLocal
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.started = time.monotonic()
+        self.synced = 0
+        self.already_on_chain = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _claim(self) -> list:
+        """Lease up to batch_size due events to this worker. Returns [(event id, attempts, payload dict)]."""
+        now = _now()
+        due = (models.OutboxEvent.topic == outbox.CONTRACT_CREATED) \
+            & models.OutboxEvent.status.in_(("pending", "inflight")) \
+            & (models.OutboxEvent.next_attempt_at <= now)
+        with self.session_factory() as db:
+            ids = db.execute(
+                select(models.OutboxEvent.id).where(due).order_by(models.OutboxEvent.id).limit(self.batch_size)
+            ).scalars().all()
+            if not ids:
+                return []
+            claimed = db.execute(
+                update(models.OutboxEvent)
+                .where(models.OutboxEvent.id.in_(ids), due)
+                .values(status="inflight", attempts=models.OutboxEvent.attempts + 1,
+                        next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+                .returning(models.OutboxEvent.id, models.OutboxEvent.attempts, models.OutboxEvent.payload)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+        return [(event_id, attempts, json.loads(payload)) for event_id, attempts, payload in claimed]
+
+    async def _send(self, semaphore, event):
+        event_id, attempts, payload = event
+        async with semaphore:
+            try:
+                return event, await self.chain.create_investment(payload), None
+            except AlreadyOnChain:
+                return event, None, None
+            except Exception as e:
+                return event, None, str(e) or repr(e)
+
+    def _record(self, outcomes):
+        """Write every outcome of a round in one transaction."""
+        now = _now()
+        events, contracts = [], []
+        for (event_id, attempts, payload), tx_hash, error in outcomes:
+            contract_id = payload["contract_id"]
+            if error is None:
+                events.append({"id": event_id, "status": "sent", "sent_at": now,
+                               "result": tx_hash or "already-on-chain", "last_error": None})
+                contracts.append({"id": contract_id, "chain_status": "synced", "chain_tx_hash": tx_hash,
+                                  "chain_synced_at": now})
+                if tx_hash:
+                    self.synced += 1
+                else:
+                    self.already_on_chain += 1
+            elif attempts >= self.max_attempts:
+                events.append({"id": event_id, "status": "failed", "last_error": error[:500]})
+                contracts.append({"id": contract_id, "chain_status": "failed"})
+                self.failed += 1
+            else:
+                events.append({"id": event_id, "status": "pending", "last_error": error[:500],
+                               "next_attempt_at": now + timedelta(seconds=backoff(attempts))})
+                self.retried += 1
+        with self.session_factory() as db:
+            # Bulk UPDATE by primary key, grouped by the set of columns each row changes
+            for rows, model in ((events, models.OutboxEvent), (contracts, models.Contract)):
+                groups = {}
+                for row in rows:
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+                for group in groups.values():
+                    db.execute(update(model), group)
+            db.commit()
+        if contracts:
+            http_cache.versions.bump("contracts")
+
+    async def run_once(self) -> int:
+        """Claim, send and record one batch. Returns how many events it handled."""
+        events = await asyncio.to_thread(self._claim)
+        if not events:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcomes = await asyncio.gather(*(self._send(semaphore, event) for event in events))
+        await asyncio.to_thread(self._record, outcomes)
+        return len(events)
+
+    async def run(self, poll_interval: float = 1.0, stop: asyncio.Event = None, report=None):
+        """Drain continuously; sleeps poll_interval when nothing is due. report(stats) is called per batch."""
+        while stop is None or not stop.is_set():
+            handled = await self.run_once()
+            if handled and report:
+                report(self.stats())
+            if not handled:
+                await asyncio.sleep(poll_interval)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        done = self.synced + self.already_on_chain
+        return {
+            "synced": self.synced,
+            "already_on_chain": self.already_on_chain,
+            "retried": self.retried,
+            "failed": self.failed,
+            "throughput_per_s": round(done / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def sync_status(db: Session) -> dict:
+    """Outbox counts by status and the sync lag: age of the oldest contract not yet on chain."""
+    counts = dict(db.query(models.OutboxEvent.status, func.count()).group_by(models.OutboxEvent.status).all())
+    oldest = db.query(func.min(models.OutboxEvent.created_at)) \
+        .filter(models.OutboxEvent.status.in_(("pending", "inflight"))).scalar()
+    if oldest is not None and oldest.tzinfo is None:
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    return {
+        "events": {status: counts.get(status, 0) for status in ("pending", "inflight", "sent", "failed")},
+        "lag_seconds": round((_now() - oldest).total_seconds(), 1) if oldest else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chain_sync", description="Sync contracts to the chain.")
+    parser.add_argument("--once", action="store_true", help="drain what is due now, then exit")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    worker = SyncWorker(JsonRpcChain(), batch_size=args.batch_size, concurrency=args.concurrency)
+
+    def report(stats):
+        with database.SessionLocal() as db:
+            print(json.dumps({**stats, **sync_status(db)}), flush=True)
+
+    async def drain():
+        while await worker.run_once():
+            report(worker.stats())
+
+    asyncio.run(drain() if args.once else worker.run(report=report))
+
+
+if __name__ == "__main__":
+    main()
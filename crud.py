@@ -1,9 +1,38 @@
-from sqlalchemy.orm import Session, joinedload
-import models, schemas
-from datetime import date
+from sqlalchemy import Float, case, cast, func, insert, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, selectinload
+import models, schemas, search_index, pagination, response_cache, auth_cache, outbox, aggregates, http_cache, token_events
+import asyncio
+import random
+import time
+from datetime import date, datetime, timezone
 from typing import Optional
-from passlib.hash import bcrypt
-from passlib.context import CryptContext
+
+# Purchases retry this many times when the database reports lock contention
+PURCHASE_ATTEMPTS = 8
+PURCHASE_BACKOFF_SECONDS = 0.005
+
+# Largest batch accepted by create_contracts
+MAX_BATCH_CONTRACTS = 100
+
+def _tokens_changed(token_ids=(), membership: bool = False):
+    """Invalidate the in-process read caches after a committed write to tokens.
+
+    membership=True means the write can change which tokens match a listing filter
+    (a new token, or one flipping to funded), so every cached listing goes.
+    """
+    pagination.count_cache.invalidate("tokens")
+    if membership:
+        response_cache.marketplace.clear()
+        http_cache.versions.bump("tokens")
+    else:
+        response_cache.marketplace.invalidate_tokens(token_ids)
+        http_cache.versions.bump("tokens", keys=token_ids)
+
+def _purchases_changed(*tables):
+    """Invalidate the read caches of a committed purchase (its token writes go through _tokens_changed)."""
+    pagination.count_cache.invalidate(*tables)
+    http_cache.versions.bump(*tables, "funding_aggregates")
 
 def create_farmer(db: Session, farmer: schemas.FarmerCreate, account_id: int):
     db_farmer = models.Farmer(
@@ -19,6 +48,7 @@ def create_farmer(db: Session, farmer: schemas.FarmerCreate, account_id: int):
     db.add(db_farmer)
     db.commit()
     db.refresh(db_farmer)
+    http_cache.versions.bump("farmers")
     return db_farmer
 
 def update_farmer_status(db: Session, farmer_id: int, new_status: schemas.RegistrationStatusEnum):
@@ -29,6 +59,7 @@ def update_farmer_status(db: Session, farmer_id: int, new_status: schemas.Regist
     farmer.registration_status = new_status
     db.commit()
     db.refresh(farmer)
+    http_cache.versions.bump("farmers")
     return farmer
 
 def create_crop(db: Session, crop: schemas.CropCreate):
@@ -44,6 +75,7 @@ def create_crop(db: Session, crop: schemas.CropCreate):
     db.add(db_crop)
     db.commit()
     db.refresh(db_crop)
+    http_cache.versions.bump("crops")
     return db_crop
 
 def create_token(db: Session, token: schemas.TokenCreate):
@@ -64,25 +96,131 @@ def create_token(db: Session, token: schemas.TokenCreate):
         token_status=models.TokenStatusEnum.pending
     )
     db.add(db_token)
+    db.flush()
+    aggregates.tokens_offered(db, [(db_token.id, db_token.token_count)])
     db.commit()
     db.refresh(db_token)
+    http_cache.versions.bump("funding_aggregates")
+    _tokens_changed(membership=True)
+    _publish_tokens(db, [db_token.id])
     return db_token
 
+class _PurchaseError(ValueError):
+    """A purchase failed because of token_id."""
+    def __init__(self, token_id: int, message: str):
+        super().__init__(message)
+        self.token_id = token_id
+
+def _purchase_many(db: Session, quantities: dict, require_open: bool = False) -> dict:
+    """Atomically add quantities[token_id] to each token's tokens_sold if that many tokens are still left.
+
+    The availability checks and the increments are a single conditional UPDATE, so concurrent buyers can
+    neither oversell a token nor lose each other's increments; server databases hold the row locks until
+    commit. Either every token is updated or the transaction is rolled back and ValueError names the first
+    token that could not be filled. Returns {token_id: token columns as they are after the update}.
+    """
+    if any(quantity <= 0 for quantity in quantities.values()):
+        raise ValueError("Quantity must be positive")
+
+    requested = case(quantities, value=models.Token.id)
+    sold_after = models.Token.tokens_sold + requested
+    conditions = [models.Token.id.in_(quantities), models.Token.token_count - models.Token.tokens_sold >= requested]
+    if require_open:
+        conditions.append(models.Token.is_funded == False)
+    purchase = update(models.Token) \
+        .where(*conditions) \
+        .values(
+            tokens_sold=sold_after,
+            is_funded=case((sold_after == models.Token.token_count, True), else_=models.Token.is_funded),
+            status=case((sold_after == models.Token.token_count, "funded"), else_=models.Token.status)
+        ) \
+        .returning(
+            models.Token.id,
+            models.Token.farmer_id,
+            models.Token.crop_id,
+            models.Token.price_per_token,
+            models.Token.expected_roi,
+            models.Token.tokens_sold,
+            models.Token.token_count,
+            models.Token.funding_deadline
+        )
+    tokens = {token.id: token for token in db.execute(purchase)}
+    if len(tokens) == len(quantities):
+        return tokens
+
+    # Some token was not updated: undo the others, then work out why for the error message
+    db.rollback()
+    current = {
+        token.id: token for token in db.query(models.Token).filter(models.Token.id.in_(quantities)).all()
+    }
+    for token_id in sorted(quantities):
+        token = current.get(token_id)
+        if not token:
+            raise _PurchaseError(token_id, "Token not found")
+        if require_open and token.is_funded:
+            raise _PurchaseError(token_id, "Token is already fully funded")
+        if token.token_count - token.tokens_sold < quantities[token_id]:
+            raise _PurchaseError(token_id, f"Only {token.token_count - token.tokens_sold} tokens available")
+    raise _PurchaseError(min(quantities), "Token changed during purchase")
+
+def _purchase(db: Session, token_id: int, quantity: int, require_open: bool = False):
+    """_purchase_many for a single token; returns its columns after the update."""
+    return _purchase_many(db, {token_id: quantity}, require_open)[token_id]
+
+def _is_contention(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return any(s in message for s in ("database is locked", "deadlock", "could not serialize", "lock timeout"))
+
+class Contention(Exception):
+    """A write hit lock contention on an event loop thread, where sleeping would stall every other request.
+
+    The write has been rolled back: the async caller waits contention_delay() and calls again.
+    """
+    def __init__(self, error: OperationalError):
+        super().__init__(str(error))
+        self.error = error
+
+def contention_delay(attempt: int) -> float:
+    """Jittered exponential backoff before retry number attempt + 1."""
+    return random.uniform(0, PURCHASE_BACKOFF_SECONDS * 2 ** attempt)
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+def _retry_on_contention(db: Session, write, *args):
+    """Run write(db, *args), rolling back and retrying with jittered backoff when the database reports lock contention.
+
+    On an event loop thread (AsyncSession.run_sync) it raises Contention instead of sleeping; main.run_db retries.
+    """
+    for attempt in range(PURCHASE_ATTEMPTS):
+        try:
+            return write(db, *args)
+        except OperationalError as e:
+            db.rollback()
+            if attempt == PURCHASE_ATTEMPTS - 1 or not _is_contention(e):
+                raise
+            if _on_event_loop():
+                raise Contention(e) from e
+            time.sleep(contention_delay(attempt))
+
 def create_contract(db: Session, contract_data: schemas.ContractCreate, investor_id: int):
-    # Get the token and validate availability
-    token = db.query(models.Token).filter(models.Token.id == contract_data.token_id).first()
-    if not token:
-        raise ValueError("Token not found")
-    
-    # Check if enough tokens are available
-    available_tokens = token.token_count - token.tokens_sold
-    if contract_data.quantity > available_tokens:
-        raise ValueError(f"Only {available_tokens} tokens available")
-    
+    return _retry_on_contention(db, _create_contract, contract_data, investor_id)
+
+def _create_contract(db: Session, contract_data: schemas.ContractCreate, investor_id: int):
     # Validate delivery type
     if contract_data.delivery_type not in ["money", "product"]:
         raise ValueError("Delivery type must be 'money' or 'product'")
-    
+
+    # Reserve the tokens (fails if fewer than quantity are left)
+    token = _purchase(db, contract_data.token_id, contract_data.quantity)
+    crop = db.query(models.Crop.expected_harvest_month, models.Crop.crop_name, models.Crop.variety) \
+        .filter(models.Crop.id == token.crop_id).first()
+    expected_harvest_month = crop.expected_harvest_month if crop else None
+
     # Calculate total value
     total_value = contract_data.quantity * token.price_per_token
     
@@ -96,16 +234,10 @@ def create_contract(db: Session, contract_data: schemas.ContractCreate, investor
         total_value=total_value,
         delivery_type=contract_data.delivery_type,
         expected_roi=token.expected_roi,
-        expected_harvest_month=token.crop.expected_harvest_month,
+        expected_harvest_month=expected_harvest_month,
         payout_status=models.PayoutStatusEnum.pending
     )
     
-    # Update token sold count
-    token.tokens_sold += contract_data.quantity
-    if token.tokens_sold == token.token_count:
-        token.is_funded = True
-        token.status = "funded"
-    
     # Also create an investment record for backward compatibility
     investment = models.Investment(
         token_id=contract_data.token_id,
@@ -115,31 +247,138 @@ def create_contract(db: Session, contract_data: schemas.ContractCreate, investor
     
     db.add(db_contract)
     db.add(investment)
+    db.flush()
+    # Queue the on-chain sync in the same transaction
+    outbox.add_contract_events(db, [outbox.contract_payload(
+        db_contract, crop and crop.crop_name, crop and crop.variety, token.funding_deadline
+    )])
+    aggregates.purchased(db, [(contract_data.token_id, investor_id, contract_data.quantity)])
     db.commit()
     db.refresh(db_contract)
+    _purchases_changed("contracts", "investments")
+    _tokens_changed([contract_data.token_id], membership=token.tokens_sold == token.token_count)
+    _publish_tokens(db, [contract_data.token_id])
     return db_contract
 
-def get_open_tokens(db: Session):
-    tokens = db.query(models.Token).filter(models.Token.is_funded == False).all()
-    return tokens
+def create_contracts(db: Session, items: list[schemas.ContractCreate], investor_id: int):
+    return _retry_on_contention(db, _create_contracts, items, investor_id)
 
-def invest_in_token(db: Session, token_id: int, investor_id: str, quantity: int):
+def _create_contracts(db: Session, items: list[schemas.ContractCreate], investor_id: int):
+    """Buy into several tokens in one transaction: either every contract is created or none is.
+
+    Quantities for the same token are reserved together in one UPDATE covering every token.
+    Returns ContractOut results in the order of items.
+    """
+    if not items:
+        raise ValueError("No contracts given")
+    if len(items) > MAX_BATCH_CONTRACTS:
+        raise ValueError(f"At most {MAX_BATCH_CONTRACTS} contracts per batch")
+    for item in items:
+        if item.delivery_type not in ["money", "product"]:
+            raise ValueError("Delivery type must be 'money' or 'product'")
+        if item.quantity <= 0:
+            raise ValueError("Quantity must be positive")
+
+    quantities = {}
+    for item in items:
+        quantities[item.token_id] = quantities.get(item.token_id, 0) + item.quantity
+    try:
+        tokens = _purchase_many(db, quantities)
+    except _PurchaseError as e:
+        raise ValueError(f"Token {e.token_id}: {e}")
+
+    crop_ids = {token.crop_id for token in tokens.values()}
+    crops = {
+        crop.id: crop for crop in db.query(
+            models.Crop.id, models.Crop.expected_harvest_month, models.Crop.crop_name, models.Crop.variety
+        ).filter(models.Crop.id.in_(crop_ids))
+    }
+
+    # Naive UTC, as the column reads back (and /create_contract and /my_contracts return it)
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    contracts = []
+    for item in items:
+        token = tokens[item.token_id]
+        contracts.append(models.Contract(
+            token_id=item.token_id,
+            farmer_id=token.farmer_id,
+            investor_id=investor_id,
+            quantity=item.quantity,
+            price_per_token=token.price_per_token,
+            total_value=item.quantity * token.price_per_token,
+            delivery_type=item.delivery_type,
+            expected_roi=token.expected_roi,
+            expected_harvest_month=crops[token.crop_id].expected_harvest_month if token.crop_id in crops else None,
+            payout_status=models.PayoutStatusEnum.pending,
+            created_at=created_at
+        ))
+    db.add_all(contracts)
+    db.execute(insert(models.Investment), [
+        {"token_id": item.token_id, "investor_id": str(investor_id), "quantity": item.quantity} for item in items
+    ])
+    # Every column is set client-side, so the results can be built after the flush without reloading
+    db.flush()
+    results = [schemas.ContractOut.model_validate(contract) for contract in contracts]
+    # Queue the on-chain sync in the same transaction
+    outbox.add_contract_events(db, [
+        outbox.contract_payload(
+            contract,
+            getattr(crops.get(tokens[contract.token_id].crop_id), "crop_name", None),
+            getattr(crops.get(tokens[contract.token_id].crop_id), "variety", None),
+            tokens[contract.token_id].funding_deadline
+        ) for contract in contracts
+    ])
+    aggregates.purchased(db, [(item.token_id, investor_id, item.quantity) for item in items])
+    db.commit()
+
+    _purchases_changed("contracts", "investments")
+    _tokens_changed(tokens, membership=any(t.tokens_sold == t.token_count for t in tokens.values()))
+    _publish_tokens(db, list(tokens))
+    return results
+
+def update_token_status(db: Session, token_id: int, new_status: models.TokenStatusEnum):
     token = db.query(models.Token).filter(models.Token.id == token_id).first()
     if not token:
         raise ValueError("Token not found")
 
-    if token.is_funded:
-        raise ValueError("Token is already fully funded")
+    token.token_status = new_status
+    db.commit()
+    db.refresh(token)
+    _tokens_changed([token_id])
+    _publish_tokens(db, [token_id])
+    return token
+
+def get_investor_by_email(db: Session, email: str):
+    return db.query(models.InvestorAccount).filter(models.InvestorAccount.email == email).first()
+
+def _account_id_by_email(db: Session, kind: str, account_model, email: str) -> Optional[int]:
+    """Account id for email from the principal cache, querying (and caching) it on a miss. None if unknown."""
+    account_id = auth_cache.principals.get((kind, email))
+    if account_id is None:
+        account_id = db.query(account_model.id).filter(account_model.email == email).scalar()
+        if account_id is not None:
+            auth_cache.principals.put((kind, email), account_id)
+    return account_id
+
+def get_investor_id_by_email(db: Session, email: str) -> Optional[int]:
+    return _account_id_by_email(db, "investor", models.InvestorAccount, email)
 
-    available = token.token_count - token.tokens_sold
-    if quantity > available:
-        raise ValueError(f"Only {available} tokens available")
+def get_farmer_account_id_by_email(db: Session, email: str) -> Optional[int]:
+    return _account_id_by_email(db, "farmer", models.FarmerAccount, email)
 
-    # Update funding
-    token.tokens_sold += quantity
-    if token.tokens_sold == token.token_count:
-        token.is_funded = True
-        token.status = "funded"
+def get_crops_by_farmer(db: Session, farmer_id: int):
+    return db.query(models.Crop).filter(models.Crop.farmer_id == farmer_id).all()
+
+def get_open_tokens(db: Session):
+    tokens = db.query(models.Token).filter(models.Token.is_funded == False).all()
+    return tokens
+
+def invest_in_token(db: Session, token_id: int, investor_id: str, quantity: int):
+    return _retry_on_contention(db, _invest_in_token, token_id, investor_id, quantity)
+
+def _invest_in_token(db: Session, token_id: int, investor_id: str, quantity: int):
+    # Update funding (fails if the token is funded or fewer than quantity are left)
+    token = _purchase(db, token_id, quantity, require_open=True)
 
     # Log investment
     investment = models.Investment(
@@ -148,20 +387,201 @@ def invest_in_token(db: Session, token_id: int, investor_id: str, quantity: int)
         quantity=quantity
     )
     db.add(investment)
+    aggregates.purchased(db, [(token_id, investor_id, quantity)])
     db.commit()
     db.refresh(investment)
+    _purchases_changed("investments")
+    _tokens_changed([token_id], membership=token.tokens_sold == token.token_count)
+    _publish_tokens(db, [token_id])
     return investment
 
-def get_investments_by_investor(db: Session, investor_id: str):
-    return db.query(models.Investment).filter(models.Investment.investor_id == investor_id).all()
+def get_investments_by_investor(db: Session, investor_id: str, limit: int = None, after: tuple = None):
+    """The investor's investments as column rows that fit schemas.InvestmentOut."""
+    query = db.query(
+        models.Investment.id,
+        models.Investment.token_id,
+        models.Investment.investor_id,
+        models.Investment.quantity,
+        models.Investment.invested_at
+    ).filter(models.Investment.investor_id == investor_id)
+    return pagination.keyset(query, models.Investment.invested_at, models.Investment.id, limit, after).all()
+
+def count_investments_by_investor(db: Session, investor_id: str):
+    return db.query(models.Investment).filter(models.Investment.investor_id == investor_id).count()
+
+def get_contracts_by_investor(db: Session, investor_id: int, limit: int = None, after: tuple = None):
+    query = db.query(models.Contract).filter(models.Contract.investor_id == investor_id)
+    return pagination.keyset(query, models.Contract.created_at, models.Contract.id, limit, after).all()
+
+def get_contract_rows_by_investor(db: Session, investor_id: int, limit: int = None, after: tuple = None):
+    """Contracts with their crop name/variety and on-chain confirmation (the block chain_indexer saw it in)
+    in one joined, column-only query (rows fit schemas.ContractOut)."""
+    query = db.query(
+        models.Contract.id,
+        models.Contract.token_id,
+        models.Contract.farmer_id,
+        models.Contract.investor_id,
+        models.Contract.quantity,
+        models.Contract.price_per_token,
+        models.Contract.total_value,
+        models.Contract.delivery_type,
+        models.Contract.expected_roi,
+        models.Contract.expected_harvest_month,
+        models.Contract.payout_status,
+        models.Contract.created_at,
+        models.Crop.crop_name,
+        models.Crop.variety.label("crop_variety"),
+        models.Contract.chain_status,
+        models.ChainInvestment.block_number.label("chain_block")
+    ) \
+        .select_from(models.Contract) \
+        .outerjoin(models.Token, models.Token.id == models.Contract.token_id) \
+        .outerjoin(models.Crop, models.Crop.id == models.Token.crop_id) \
+        .outerjoin(models.ChainInvestment, models.ChainInvestment.contract_id == models.Contract.id) \
+        .filter(models.Contract.investor_id == investor_id)
+    return pagination.keyset(query, models.Contract.created_at, models.Contract.id, limit, after).all()
+
+def count_contracts_by_investor(db: Session, investor_id: int):
+    return db.query(models.Contract).filter(models.Contract.investor_id == investor_id).count()
+
+# Token read model: exactly the columns of schemas.TokenOut (keyed by its aliases), with the
+# funding stats computed in SQL. Listing rows are plain tuples and never hydrate ORM objects.
+TOKEN_OUT_COLUMNS = (
+    models.Token.id,
+    models.Token.crop_id,
+    models.Crop.crop_name,
+    models.Crop.variety.label("crop_variety"),
+    models.Farmer.country,
+    models.Farmer.region,
+    models.Crop.organic_certified,
+    models.Token.token_count,
+    models.Token.price_per_token,
+    models.Token.expected_yield_unit,
+    models.Token.expected_total_yield,
+    models.Token.expected_roi,
+    models.Token.tokens_sold,
+    models.Token.is_funded,
+    models.Token.funding_deadline,
+    models.Token.currency,
+    models.Token.status,
+    models.Token.created_at,
+    case(
+        (models.Token.token_count != 0,
+         func.round(cast(models.Token.tokens_sold, Float) / models.Token.token_count * 100, 2)),
+        else_=0.0
+    ).label("funding_percentage"),
+    (models.Token.token_count - models.Token.tokens_sold).label("tokens_left"),
+    models.Token.token_status,
+    models.Crop.planting_date,
+    models.Crop.expected_harvest_month
+)
+
+def _token_rows(query, limit: int = None, after: tuple = None):
+    query = query.with_entities(*TOKEN_OUT_COLUMNS)
+    return pagination.keyset(query, models.Token.created_at, models.Token.id, limit, after).all()
+
+def get_token_row(db: Session, token_id: int):
+    query = db.query(models.Token) \
+    .join(models.Crop, models.Token.crop) \
+    .join(models.Farmer, models.Token.farmer) \
+    .filter(models.Token.id == token_id)
+    rows = _token_rows(query, limit=1)
+    return rows[0] if rows else None
 
-def get_contracts_by_investor(db: Session, investor_id: int):
-    return db.query(models.Contract).filter(models.Contract.investor_id == investor_id).all()
+def _publish_tokens(db: Session, token_ids):
+    """Push the committed rows of token_ids to token_events subscribers (one query, only if anyone listens)."""
+    if not token_events.broker.active:
+        return
+    rows = db.query(models.Token) \
+    .join(models.Crop, models.Token.crop) \
+    .join(models.Farmer, models.Token.farmer) \
+    .filter(models.Token.id.in_(token_ids)) \
+    .with_entities(models.Token.farmer_id, *TOKEN_OUT_COLUMNS).all()
+    if rows:
+        fields = rows[0]._fields[1:]
+        token_events.broker.publish([(row[0], dict(zip(fields, row[1:]))) for row in rows])
 
 def get_tokens_by_crop(db: Session, crop_id: int):
-    return db.query(models.Token).filter(models.Token.crop_id == crop_id).all()
+    query = db.query(models.Token) \
+    .join(models.Crop, models.Token.crop) \
+    .join(models.Farmer, models.Token.farmer) \
+    .filter(models.Token.crop_id == crop_id)
+    return _token_rows(query)
+
+def _verified_tokens_by_farmer_query(db: Session, farmer_id: int):
+    return db.query(models.Token) \
+    .join(models.Crop, models.Token.crop) \
+    .join(models.Farmer, models.Token.farmer) \
+    .filter(
+        models.Token.farmer_id == farmer_id,
+        models.Token.token_status == models.TokenStatusEnum.verified
+    )
+
+def get_verified_tokens_by_farmer(db: Session, farmer_id: int, limit: int = None, after: tuple = None):
+    return _token_rows(_verified_tokens_by_farmer_query(db, farmer_id), limit, after)
+
+def count_verified_tokens_by_farmer(db: Session, farmer_id: int):
+    return _verified_tokens_by_farmer_query(db, farmer_id).count()
+
+def _dashboard_token(token: models.Token, crop: models.Crop, farmer: models.Farmer, contracts: dict) -> dict:
+    """schemas.DashboardToken fields: TOKEN_OUT_COLUMNS computed from loaded objects, plus its contract totals."""
+    count, sold = token.token_count or 0, token.tokens_sold or 0
+    return {
+        "id": token.id, "crop_id": token.crop_id, "crop_name": crop.crop_name, "crop_variety": crop.variety,
+        "country": farmer.country, "region": farmer.region, "organic_certified": crop.organic_certified,
+        "token_count": token.token_count, "price_per_token": token.price_per_token,
+        "expected_yield_unit": token.expected_yield_unit, "expected_total_yield": token.expected_total_yield,
+        "expected_roi": token.expected_roi, "tokens_sold": token.tokens_sold, "is_funded": token.is_funded,
+        "funding_deadline": token.funding_deadline, "currency": token.currency, "status": token.status,
+        "created_at": token.created_at, "funding_percentage": round(sold / count * 100, 2) if count else 0.0,
+        "tokens_left": count - sold, "token_status": token.token_status, "planting_date": crop.planting_date,
+        "expected_harvest_month": crop.expected_harvest_month,
+        **contracts.get(token.id, {"contracts": 0, "contract_value": 0}),
+    }
+
+def get_farmer_dashboard(db: Session, account_id: int) -> Optional[dict]:
+    """Profile, crops, verified tokens, funding and contract totals of a farmer in five queries, however many
+    crops and tokens it has. None without a farmer profile.
+    """
+    # A token's farmer is its crop's farmer: its crop is among the farmer's crops, no need to load token.crop
+    farmer = db.query(models.Farmer).options(
+        selectinload(models.Farmer.crops),
+        selectinload(models.Farmer.tokens.and_(models.Token.token_status == models.TokenStatusEnum.verified)),
+    ).filter(models.Farmer.account_id == account_id).first()
+    if farmer is None:
+        return None
+
+    totals = dict.fromkeys(("contracts", "tokens", "total_value", *models.PayoutStatusEnum.__members__), 0)
+    by_token = {}
+    rows = db.query(
+        models.Contract.token_id, models.Contract.payout_status, func.count(),
+        func.sum(models.Contract.quantity), func.sum(models.Contract.total_value)
+    ).filter(models.Contract.farmer_id == farmer.id) \
+    .group_by(models.Contract.token_id, models.Contract.payout_status).all()
+    for token_id, payout_status, count, quantity, value in rows:
+        totals["contracts"] += count
+        totals["tokens"] += quantity or 0
+        totals["total_value"] += value or 0
+        if payout_status is not None:
+            totals[payout_status.name] += count
+        token = by_token.setdefault(token_id, {"contracts": 0, "contract_value": 0})
+        token["contracts"] += count
+        token["contract_value"] += value or 0
+
+    crops = {crop.id: crop for crop in farmer.crops}
+    tokens = sorted(farmer.tokens, key=lambda token: (token.created_at, token.id))
+    return {
+        "farmer_id": farmer.id, "name": farmer.name, "country": farmer.country, "region": farmer.region,
+        "address": farmer.address, "farm_size_ha": farmer.farm_size_ha, "contact": farmer.contact,
+        "identity_document": farmer.identity_document, "registration_status": farmer.registration_status,
+        "registered_at": farmer.registered_at,
+        "crops": sorted(crops.values(), key=lambda crop: crop.id),
+        "tokens": [_dashboard_token(token, crops[token.crop_id], farmer, by_token) for token in tokens],
+        "funding": aggregates.stats(db, "farmer", str(farmer.id)),
+        "contracts": totals,
+    }
 
-def get_filtered_tokens(
+def _filtered_tokens_query(
     db: Session,
     country: str = None,
     region: str = None,
@@ -176,9 +596,8 @@ def get_filtered_tokens(
     organic_only: bool = False
 ):
     query = db.query(models.Token) \
-    .options(joinedload(models.Token.crop), joinedload(models.Token.farmer)) \
-    .join(models.Crop) \
-    .join(models.Farmer)
+    .join(models.Crop, models.Token.crop) \
+    .join(models.Farmer, models.Token.farmer)
     if funded_only is not None:
         query = query.filter(models.Token.is_funded == funded_only)
     else:
@@ -186,13 +605,13 @@ def get_filtered_tokens(
     if status:
         query = query.filter(models.Token.status.ilike(status))
     if country:
-        query = query.filter(models.Farmer.country.ilike(f"%{country}%"))
+        query = query.filter(search_index.substring_filter(db, "country", country))
     if region:
-        query = query.filter(models.Farmer.region.ilike(f"%{region}%"))
+        query = query.filter(search_index.substring_filter(db, "region", region))
     if crop_name:
-        query = query.filter(models.Crop.crop_name.ilike(f"%{crop_name}%"))
+        query = query.filter(search_index.substring_filter(db, "crop_name", crop_name))
     if crop_variety:
-        query = query.filter(models.Crop.variety.ilike(f"%{crop_variety}%"))
+        query = query.filter(search_index.substring_filter(db, "crop_variety", crop_variety))
     if farmer_id:
         query = query.filter(models.Farmer.id == farmer_id)
     if min_roi:
@@ -203,17 +622,24 @@ def get_filtered_tokens(
         query = query.filter(models.Token.created_at >= created_after)
     if organic_only:
         query = query.filter(models.Crop.organic_certified == True)
-    return query.all()
+    return query
 
-def get_all_tokens(
+def get_filtered_tokens(db: Session, limit: int = None, after: tuple = None, **filters):
+    return _token_rows(_filtered_tokens_query(db, **filters), limit, after)
+
+def count_filtered_tokens(db: Session, **filters):
+    return _filtered_tokens_query(db, **filters).count()
+
+def _all_tokens_query(
     db: Session,
     status: Optional[str] = None,
     funded_only: Optional[bool] = None,
     min_roi: Optional[float] = None,
     created_after: Optional[date] = None
 ):
-    query = db.query(models.Token)\
-        .options(joinedload(models.Token.crop), joinedload(models.Token.farmer))
+    query = db.query(models.Token) \
+        .join(models.Crop, models.Token.crop) \
+        .join(models.Farmer, models.Token.farmer)
 
     if status:
         query = query.filter(models.Token.status.ilike(status))
@@ -227,35 +653,32 @@ def get_all_tokens(
     if created_after:
         query = query.filter(models.Token.created_at >= created_after)
 
-    return query.all()
+    return query
+
+def get_all_tokens(db: Session, limit: int = None, after: tuple = None, **filters):
+    return _token_rows(_all_tokens_query(db, **filters), limit, after)
+
+def count_all_tokens(db: Session, **filters):
+    return _all_tokens_query(db, **filters).count()
 
 
-def create_farmer_account(db: Session, data: schemas.FarmerRegisterRequest):
-    hashed_pw = bcrypt.hash(data.password)
-    account = models.FarmerAccount(email=data.email, hashed_password=hashed_pw)
+def get_farmer_account_by_email(db: Session, email: str):
+    return db.query(models.FarmerAccount).filter(models.FarmerAccount.email == email).first()
+
+# Passwords are hashed and verified by the caller through password_hashing.hasher (a bounded process pool),
+# never here in a request thread
+def create_farmer_account(db: Session, data: schemas.FarmerRegisterRequest, hashed_password: str):
+    account = models.FarmerAccount(email=data.email, hashed_password=hashed_password)
     db.add(account)
     db.commit()
     db.refresh(account)
+    auth_cache.principals.invalidate(("farmer", data.email))
     return account
 
-def authenticate_farmer(db: Session, data: schemas.FarmerLoginRequest):
-    account = db.query(models.FarmerAccount).filter(models.FarmerAccount.email == data.email).first()
-    if account and bcrypt.verify(data.password, account.hashed_password):
-        return account
-    return None
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def create_investor_account(db: Session, data: schemas.InvestorRegisterRequest):
-    hashed = pwd_context.hash(data.password)
-    investor = models.InvestorAccount(email=data.email, hashed_password=hashed)
+def create_investor_account(db: Session, data: schemas.InvestorRegisterRequest, hashed_password: str):
+    investor = models.InvestorAccount(email=data.email, hashed_password=hashed_password)
     db.add(investor)
     db.commit()
     db.refresh(investor)
-    return investor
-
-def verify_investor_credentials(db: Session, data: schemas.InvestorLoginRequest):
-    investor = db.query(models.InvestorAccount).filter(models.InvestorAccount.email == data.email).first()
-    if investor and pwd_context.verify(data.password, investor.hashed_password):
-        return investor
-    return None
\ No newline at end of file
+    auth_cache.principals.invalidate(("investor", data.email))
+    return investor
\ No newline at end of file
@@ -1,11 +1,110 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./cropchain.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+SQLALCHEMY_DATABASE_URL = os.getenv("CROPCHAIN_DATABASE_URL", "sqlite:///./cropchain.db")
+
+# Pool settings (server databases and file-backed SQLite)
+POOL_SIZE = _env_int("CROPCHAIN_DB_POOL_SIZE", 10)
+MAX_OVERFLOW = _env_int("CROPCHAIN_DB_MAX_OVERFLOW", 20)
+POOL_TIMEOUT = _env_int("CROPCHAIN_DB_POOL_TIMEOUT", 30)
+POOL_RECYCLE = _env_int("CROPCHAIN_DB_POOL_RECYCLE", 1800)
+POOL_PRE_PING = _env_bool("CROPCHAIN_DB_PRE_PING", True)
+
+# Applied to every new SQLite connection. WAL lets readers proceed while a contract is being written;
+# synchronous=NORMAL is durable across application crashes in WAL mode and skips an fsync per commit.
+# Set CROPCHAIN_SQLITE_TUNING=0 to keep SQLite's defaults.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("CROPCHAIN_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("CROPCHAIN_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": _env_int("CROPCHAIN_SQLITE_BUSY_TIMEOUT_MS", 5000),
+    "cache_size": _env_int("CROPCHAIN_SQLITE_CACHE_SIZE", -64000),  # negative = KiB, so ~64 MB
+    "mmap_size": _env_int("CROPCHAIN_SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    "temp_store": "MEMORY",
+} if _env_bool("CROPCHAIN_SQLITE_TUNING", True) else {}
+
+
+def engine_options(url: str) -> dict:
+    """create_engine keyword arguments for url: connect args for SQLite, a sized pool for server databases."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if url.database and url.database != ":memory:":
+            options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+        return options
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+
+
+def apply_sqlite_pragmas(sync_engine, pragmas: dict):
+    """Run PRAGMA name=value for each entry on every new connection of a SQLite engine."""
+    if sync_engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, sqlite_pragmas: dict = None):
+    """Sync engine configured from the environment (sqlite_pragmas overrides SQLITE_PRAGMAS)."""
+    engine = create_engine(url, **engine_options(url))
+    apply_sqlite_pragmas(engine, SQLITE_PRAGMAS if sqlite_pragmas is None else sqlite_pragmas)
+    return engine
+
+
+def optimize(bind):
+    """Refresh SQLite planner statistics where they are missing or stale; a no-op elsewhere."""
+    if bind.dialect.name == "sqlite":
+        with bind.begin() as conn:
+            conn.execute(text("PRAGMA optimize"))
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Opt-in async mode (CROPCHAIN_ASYNC_DB=1): endpoints run their crud calls on the event loop through
+# an AsyncSession instead of in the threadpool. Needs aiosqlite (SQLite) or asyncpg (PostgreSQL).
+ASYNC_DB = _env_bool("CROPCHAIN_ASYNC_DB", False)
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver, e.g. sqlite:// -> sqlite+aiosqlite://."""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(async_url(SQLALCHEMY_DATABASE_URL), **engine_options(SQLALCHEMY_DATABASE_URL))
+    apply_sqlite_pragmas(async_engine.sync_engine, SQLITE_PRAGMAS)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
@@ -0,0 +1,233 @@
+# Identity-document storage. Uploads are streamed to the backend in fixed-size chunks and hashed on the fly;
+# documents are stored under their SHA-256 digest, so the same scan uploaded twice is kept once and names
+# never collide. The backend is pluggable (DocumentBackend); LocalDiskBackend keeps files under DOCUMENT_ROOT.
+# The framework spools a whole multipart body before the endpoint runs, so UploadLimitMiddleware refuses
+# oversized upload requests while they are still being received.
+import abc
+import hashlib
+import os
+import re
+import tempfile
+from typing import AsyncIterator, NamedTuple, Optional
+from anyio import to_thread
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+DOCUMENT_ROOT = os.getenv("CROPCHAIN_DOCUMENT_ROOT", "identity_docs")
+MAX_DOCUMENT_BYTES = int(os.getenv("CROPCHAIN_MAX_DOCUMENT_MB", 20)) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Room for the other form fields and the multipart framing around an uploaded document
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Stored in Farmer.identity_document; also the path the document is served from
+URL_PREFIX = "/documents/"
+
+
+class DocumentTooLarge(ValueError):
+    pass
+
+
+class StoredDocument(NamedTuple):
+    digest: str  # hex SHA-256 of the content
+    size: int
+
+    @property
+    def url(self) -> str:
+        return URL_PREFIX + self.digest
+
+
+class PendingDocument(abc.ABC):
+    """A document being written; becomes visible only on commit."""
+
+    @abc.abstractmethod
+    async def write(self, chunk: bytes):
+        ...
+
+    @abc.abstractmethod
+    async def commit(self, digest: str):
+        ...
+
+    @abc.abstractmethod
+    async def discard(self):
+        ...
+
+
+class DocumentBackend(abc.ABC):
+    """Where document bytes live, addressed by hex SHA-256 digest."""
+
+    @abc.abstractmethod
+    async def begin(self) -> PendingDocument:
+        ...
+
+    @abc.abstractmethod
+    async def size(self, digest: str) -> Optional[int]:
+        """Size in bytes, or None if no such document."""
+
+    @abc.abstractmethod
+    def read(self, digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield the bytes start..end (inclusive) in chunks of at most chunk_size."""
+
+
+class _LocalPendingDocument(PendingDocument):
+    def __init__(self, backend: "LocalDiskBackend", file):
+        self.backend = backend
+        self.file = file
+
+    async def write(self, chunk: bytes):
+        await to_thread.run_sync(self.file.write, chunk)
+
+    async def commit(self, digest: str):
+        await to_thread.run_sync(self._commit, digest)
+
+    def _commit(self, digest: str):
+        self.file.close()
+        path = self.backend.path(digest)
+        if os.path.exists(path):
+            os.remove(self.file.name)  # already stored: deduplicated
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.file.name, path)
+
+    async def discard(self):
+        await to_thread.run_sync(self._discard)
+
+    def _discard(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+class LocalDiskBackend(DocumentBackend):
+    """Files at root/ab/cd/<digest>; uploads are staged in root/tmp and renamed into place atomically."""
+
+    def __init__(self, root: str = DOCUMENT_ROOT):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            raise ValueError("Invalid document digest")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    async def begin(self) -> PendingDocument:
+        def open_temp():
+            staging = os.path.join(self.root, "tmp")
+            os.makedirs(staging, exist_ok=True)
+            return tempfile.NamedTemporaryFile(dir=staging, delete=False)
+        return _LocalPendingDocument(self, await to_thread.run_sync(open_temp))
+
+    async def size(self, digest: str) -> Optional[int]:
+        path = self.path(digest)
+        try:
+            return (await to_thread.run_sync(os.stat, path)).st_size
+        except FileNotFoundError:
+            return None
+
+    async def read(self, digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        f = await to_thread.run_sync(open, self.path(digest), "rb")
+        try:
+            await to_thread.run_sync(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await to_thread.run_sync(f.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await to_thread.run_sync(f.close)
+
+
+storage: DocumentBackend = LocalDiskBackend()
+
+
+async def store(upload, backend: DocumentBackend = None, max_bytes: int = None) -> StoredDocument:
+    """Copy an UploadFile (anything with an async read(n)) into the backend chunk by chunk.
+
+    Raises DocumentTooLarge as soon as more than max_bytes (default MAX_DOCUMENT_BYTES) have been read;
+    nothing is stored then.
+    """
+    backend = backend or storage
+    max_bytes = MAX_DOCUMENT_BYTES if max_bytes is None else max_bytes
+    pending = await backend.begin()
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise DocumentTooLarge(f"Document exceeds {max_bytes // (1024 * 1024)} MB")
+            sha256.update(chunk)
+            await pending.write(chunk)
+    except BaseException:
+        await pending.discard()
+        raise
+    document = StoredDocument(sha256.hexdigest(), size)
+    await pending.commit(document.digest)
+    return document
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware: request bodies on the upload paths may not exceed max_bytes (by default
+    MAX_DOCUMENT_BYTES plus FORM_OVERHEAD_BYTES).
+
+    A Content-Length over the limit is answered 413 before anything is read, one that is not a number 400.
+    Bodies without one are counted as they arrive and cut off with 413 once past the limit.
+    """
+
+    def __init__(self, app, paths, max_bytes: int = None):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        limit = MAX_DOCUMENT_BYTES + FORM_OVERHEAD_BYTES if self.max_bytes is None else self.max_bytes
+        too_large = f"Request exceeds {limit // (1024 * 1024)} MB"
+        length = Headers(scope=scope).get("content-length")
+        if length is not None and not length.isdigit():
+            await JSONResponse({"detail": "Invalid Content-Length"}, status_code=400)(scope, receive, send)
+            return
+        if length is not None and int(length) > limit:
+            await JSONResponse({"detail": too_large}, status_code=413)(scope, receive, send)
+            return
+        received = 0
+
+        async def counted_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the form parser, which passes HTTPException through to the app's handler
+                    raise HTTPException(status_code=413, detail=too_large)
+            return message
+
+        await self.app(scope, counted_receive, send)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single-range "bytes=..." header, None for no header.
+
+    Raises ValueError for ranges that cannot be satisfied (answer 416).
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not match or match.group(1) == match.group(2) == "":
+        raise ValueError("Unsupported range")
+    first, last = match.groups()
+    if first == "":
+        # suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
@@ -0,0 +1,143 @@
+# Full-table exports of tokens, contracts and investments as NDJSON, CSV or columnar JSON chunks.
+# Rows are streamed from the database in batches (yield_per; a server-side cursor where the driver has one)
+# and encoded batch by batch, so memory stays flat however large the table is.
+# Usage: python -m export {tokens,contracts,investments} [--format ndjson|csv|columnar] [--output FILE]
+#        [--batch-size N] [--filter name=value ...]
+import argparse
+import csv
+import io
+import sys
+from datetime import date
+import pydantic_core
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import crud, database, fast_json, models
+
+BATCH_SIZE = 5000
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    # one JSON object per line and batch: {"column": [values...], ...}
+    "columnar": "application/x-ndjson",
+}
+
+TOKEN_FILTERS = {
+    "country": str, "region": str, "crop_name": str, "crop_variety": str, "farmer_id": int, "min_roi": float,
+    "deadline": date.fromisoformat, "created_after": date.fromisoformat, "status": str,
+    "funded_only": lambda v: v.lower() in ("1", "true", "yes"), "organic_only": lambda v: v.lower() in ("1", "true", "yes"),
+}
+ACCOUNT_FILTERS = {"investor_id": int, "token_id": int, "created_after": date.fromisoformat}
+FILTERS = {"tokens": TOKEN_FILTERS, "contracts": ACCOUNT_FILTERS, "investments": ACCOUNT_FILTERS}
+
+
+def export_statement(db: Session, table: str, **filters):
+    """Select for one export, ordered by id. Unknown tables or filters raise ValueError.
+
+    Tokens use the listing read model (crud.TOKEN_OUT_COLUMNS): every token without filters, the
+    /tokens_available semantics (open tokens unless funded_only is given) with any.
+    """
+    if table not in FILTERS:
+        raise ValueError(f"Unknown export {table!r}")
+    filters = {k: v for k, v in filters.items() if v is not None}
+    unknown = set(filters) - set(FILTERS[table])
+    if unknown:
+        raise ValueError(f"Unsupported filter(s) for {table}: {', '.join(sorted(unknown))}")
+
+    if table == "tokens":
+        query = crud._filtered_tokens_query(db, **filters) if filters else crud._all_tokens_query(db)
+        return query.with_entities(*crud.TOKEN_OUT_COLUMNS).order_by(models.Token.id).statement
+
+    model, created = (models.Contract, models.Contract.created_at) if table == "contracts" \
+        else (models.Investment, models.Investment.invested_at)
+    stmt = select(*model.__table__.columns).order_by(model.id)
+    if "investor_id" in filters:
+        # investments.investor_id is a string column, contracts.investor_id an integer
+        investor_id = str(filters["investor_id"]) if table == "investments" else filters["investor_id"]
+        stmt = stmt.where(model.investor_id == investor_id)
+    if "token_id" in filters:
+        stmt = stmt.where(model.token_id == filters["token_id"])
+    if "created_after" in filters:
+        stmt = stmt.where(created >= filters["created_after"])
+    return stmt
+
+
+def _ndjson(columns, rows):
+    return b"".join(fast_json.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _columnar(columns, rows):
+    return fast_json.dumps({column: [row[i] for row in rows] for i, column in enumerate(columns)}) + b"\n"
+
+
+def _csv(columns, rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerows(pydantic_core.to_jsonable_python([tuple(row) for row in rows]))
+    return out.getvalue().encode()
+
+
+def encode(db: Session, stmt, fmt: str = "ndjson", batch_size: int = BATCH_SIZE):
+    """Execute stmt and yield it encoded as fmt, one chunk of bytes per batch of rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}")
+    result = db.execute(stmt, execution_options={"yield_per": batch_size, "stream_results": True})
+    columns = list(result.keys())
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow(columns)
+        yield out.getvalue().encode()
+    encoder = {"ndjson": _ndjson, "csv": _csv, "columnar": _columnar}[fmt]
+    for rows in result.partitions():
+        yield encoder(columns, rows)
+
+
+def stream(table: str, fmt: str = "ndjson", batch_size: int = BATCH_SIZE, **filters):
+    """Validate an export, then return a generator of its bytes that owns its own database session.
+
+    The generator outlives the request's session dependency, hence the separate session.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}")
+    db = database.SessionLocal()
+    try:
+        stmt = export_statement(db, table, **filters)
+    except BaseException:
+        db.close()
+        raise
+
+    def chunks():
+        try:
+            yield from encode(db, stmt, fmt, batch_size)
+        finally:
+            db.close()
+    return chunks()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m export", description="Stream a table export to a file or stdout.")
+    parser.add_argument("table", choices=sorted(FILTERS))
+    parser.add_argument("--format", default="ndjson", choices=sorted(FORMATS))
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--filter", action="append", default=[], metavar="NAME=VALUE")
+    args = parser.parse_args(argv)
+
+    filters = {}
+    for item in args.filter:
+        name, _, value = item.partition("=")
+        if name not in FILTERS[args.table]:
+            parser.error(f"unsupported filter for {args.table}: {name}")
+        filters[name] = FILTERS[args.table][name](value)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream(args.table, args.format, args.batch_size, **filters):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
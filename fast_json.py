@@ -0,0 +1,30 @@
+# JSON encoding for responses and exports built straight from database rows. Read-model rows are already
+# shaped like their response schema (columns labelled with its JSON field names), so list endpoints encode
+# them in one call instead of building a Pydantic model per row and having FastAPI validate and serialize it
+# again for response_model. orjson is used when it is installed (about 3x faster than pydantic_core on a
+# token list); without it, pydantic_core gives the same bytes.
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """Compact JSON for content, written as a response model would be (UTC as Z, NaN and infinities as null).
+
+    Types orjson does not know (Decimal...) are encoded as pydantic would.
+    """
+    if orjson is None:
+        return pydantic_core.to_json(content, inf_nan_mode="null")
+    return orjson.dumps(content, default=pydantic_core.to_jsonable_python, option=orjson.OPT_UTC_Z)
+
+
+def rows(result_rows: list) -> bytes:
+    """A JSON array of the rows of one query, each an object keyed by column label."""
+    if not result_rows:
+        return b"[]"
+    # Rows of one query share their labels: zipping them is several times cheaper than Row._asdict()
+    fields = result_rows[0]._fields
+    return dumps([dict(zip(fields, row)) for row in result_rows])
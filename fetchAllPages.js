@@ -0,0 +1,15 @@
+import axios from 'axios';
+
+// The listing endpoints (/tokens_available, /tokens_all, /my_contracts, ...) answer one page at a time and
+// send an X-Next-Cursor header while more rows follow: keep asking with that cursor until the last page.
+export async function fetchAllPages(url, config = {}, limit = 500) {
+  const rows = [];
+  let cursor = null;
+  do {
+    const params = { ...config.params, limit, ...(cursor ? { cursor } : {}) };
+    const res = await axios.get(url, { ...config, params });
+    rows.push(...res.data);
+    cursor = res.headers['x-next-cursor'];
+  } while (cursor);
+  return rows;
+}
@@ -0,0 +1,216 @@
+# Conditional GET for the read endpoints the React pages poll. The crud write functions bump in-process data
+# versions (a counter per table, and per token for writes that name their tokens); HTTPCacheMiddleware derives
+# a weak ETag for each polled route from the versions of the tables it reads, and answers a matching
+# If-None-Match with 304 before the request reaches the endpoint, so no database work is done.
+# Writes made by another process (a second worker, chain_sync, the import CLI) do not bump these counters, so
+# every ETag also carries the current CROPCHAIN_ETAG_WINDOW-second epoch: no response is revalidated as
+# unchanged for longer than that (the response cache's TTL). 0 trusts the counters alone (a single process).
+# With several workers that window is the freshness of every 304, per-key ones included: a purchase handled by
+# one worker reaches /stats/tokens/{id} on the others only once the epoch turns, up to that many seconds later.
+# The middleware also sets Cache-Control (public for the marketplace listings, private for per-user pages) and
+# compresses JSON and text bodies of at least COMPRESS_MIN_BYTES with brotli (when installed) or gzip.
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from typing import NamedTuple, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import compile_path
+from jwt_auth import decode_access_token
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ETAG_WINDOW_SECONDS = int(os.getenv("CROPCHAIN_ETAG_WINDOW", "30"))
+# max-age of the public listings: 0 (the default) makes browsers revalidate every poll, which costs a 304
+PUBLIC_MAX_AGE = int(os.getenv("CROPCHAIN_PUBLIC_MAX_AGE", "0"))
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+class DataVersions:
+    """Write counters per table and per (table, key), bumped after each committed write."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Every write to the table, keyed or not
+        self._writes = Counter()
+        # Writes that did not say which rows they touched: these change every key of the table
+        self._wide = Counter()
+        self._keys = Counter()
+
+    def bump(self, *tables: str, keys=None):
+        """Record a committed write to tables; keys (row ids) narrows it to those rows for per-key ETags."""
+        with self._lock:
+            for table in tables:
+                self._writes[table] += 1
+                if keys is None:
+                    self._wide[table] += 1
+                else:
+                    for key in keys:
+                        self._keys[(table, str(key))] += 1
+
+    def snapshot(self, tables, key: Optional[tuple] = None) -> tuple:
+        """Versions of tables; with key=(table, id), that row's version stands in for its table's."""
+        with self._lock:
+            return tuple(
+                (self._wide[table], self._keys[(table, key[1])]) if key and key[0] == table else self._writes[table]
+                for table in tables
+            )
+
+
+versions = DataVersions()
+
+
+class Policy(NamedTuple):
+    tables: tuple
+    # "public" listings are the same for everyone; "private" pages depend on the bearer token's subject
+    visibility: str
+    # (table, path parameter) when the response depends on one row of table only
+    key: Optional[tuple] = None
+
+
+_TOKEN_LISTINGS = ("tokens", "crops", "farmers")
+_STATS = ("funding_aggregates",)
+_INVESTOR = ("contracts", "investments", "chain_investments", "funding_aggregates", "tokens", "crops", "farmers")
+
+# Checked in order: the fixed paths come before the templates that would also match them
+POLICIES = [
+    ("/tokens_available", Policy(_TOKEN_LISTINGS, "public")),
+    ("/tokens_all", Policy(_TOKEN_LISTINGS, "public")),
+    ("/tokens_by_crop/{crop_id}", Policy(_TOKEN_LISTINGS, "public")),
+    ("/tokens_by_farmer", Policy(_TOKEN_LISTINGS, "public")),
+    ("/crops_by_farmer", Policy(("crops",), "public")),
+    ("/stats/totals", Policy(_STATS, "public")),
+    ("/stats/my_exposure", Policy(_STATS, "private")),
+    ("/stats/tokens/{token_id}", Policy(("tokens",), "public", key=("tokens", "token_id"))),
+    ("/stats/{group}", Policy(_STATS, "public")),
+    ("/stats/{group}/{key}", Policy(_STATS, "public")),
+    ("/farmer_dashboard", Policy(("farmers", "crops", "tokens", "contracts", "funding_aggregates"), "private")),
+    ("/my_contracts", Policy(_INVESTOR, "private")),
+    ("/investments", Policy(_INVESTOR, "private")),
+    ("/portfolio_summary", Policy(_INVESTOR, "private")),
+]
+_COMPILED = [(compile_path(template)[0], policy) for template, policy in POLICIES]
+
+
+def policy_for(path: str):
+    """(policy, path parameters) of the first policy matching path, or (None, None)."""
+    for regex, policy in _COMPILED:
+        match = regex.match(path)
+        if match:
+            return policy, match.groupdict()
+    return None, None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+def _subject(headers: Headers) -> Optional[str]:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = decode_access_token(token)
+    return payload and payload.get("sub")
+
+
+def make_etag(scope, policy: Policy, params: dict, subject: Optional[str]) -> str:
+    key = policy.key and (policy.key[0], params[policy.key[1]])
+    epoch = int(time.time() // ETAG_WINDOW_SECONDS) if ETAG_WINDOW_SECONDS > 0 else 0
+    parts = (scope["path"], scope["query_string"].decode("latin-1"), subject or "",
+             versions.snapshot(policy.tables, key), epoch)
+    return f'W/"{hashlib.sha1(repr(parts).encode()).hexdigest()[:32]}"'
+
+
+def _encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class HTTPCacheMiddleware:
+    """ASGI middleware: version ETags, 304s and Cache-Control for POLICIES routes; compression of large bodies."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        policy, params = policy_for(scope["path"])
+        etag = cache_control = None
+        if policy is not None:
+            subject = _subject(request_headers) if policy.visibility == "private" else None
+            # An invalid or missing token goes through to the endpoint, which answers 401
+            if policy.visibility == "public" or subject is not None:
+                # Taken before the endpoint reads: a write racing this request changes the next ETag
+                etag = make_etag(scope, policy, params, subject)
+                if policy.visibility == "public":
+                    cache_control = f"public, max-age={PUBLIC_MAX_AGE}" if PUBLIC_MAX_AGE else "public, no-cache"
+                else:
+                    cache_control = "private, no-cache"
+                if etag_matches(request_headers.get("if-none-match"), etag):
+                    await send({"type": "http.response.start", "status": 304, "headers": [
+                        (b"etag", etag.encode()), (b"cache-control", cache_control.encode()),
+                        (b"vary", b"Accept-Encoding"),
+                    ]})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+        coding = _encoding(request_headers.get("accept-encoding", ""))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held until the first body message says whether the response is whole and worth compressing
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(scope=start)
+            if start["status"] == 200 and etag is not None and "etag" not in headers:
+                headers["ETag"] = etag
+                headers["Cache-Control"] = cache_control
+            body = message.get("body", b"")
+            if (coding and start["status"] == 200 and not message.get("more_body", False)
+                    and len(body) >= COMPRESS_MIN_BYTES and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                body = compress(body, coding)
+                headers["Content-Encoding"] = coding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,436 @@
+# Request instrumentation: latency histograms per route (MetricsMiddleware); SQL statements, rows and database
+# time per request, recorded in the sqlite3 cursor (cursor events for other drivers); N+1 detection (one SELECT
+# repeated many times in a request); a Prometheus text exposition for /metrics and one structured (JSON) log
+# line per request.
+# The sampling profiler is opt-in (CROPCHAIN_PROFILE=1): it samples the stacks of the threads running a
+# request's run_db work and keeps the slowest requests as folded stacks, the input of flamegraph.pl/speedscope.
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+from sqlalchemy import event
+
+logger = logging.getLogger("cropchain.requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# A request that runs the same SELECT this many times is reported as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.getenv("CROPCHAIN_N_PLUS_ONE_THRESHOLD", 10))
+# Requests at least this slow are logged at WARNING (the others at INFO)
+SLOW_REQUEST_SECONDS = float(os.getenv("CROPCHAIN_SLOW_REQUEST_MS", 500)) / 1000
+
+PROFILE = os.getenv("CROPCHAIN_PROFILE", "0").lower() in ("1", "true", "yes")
+PROFILE_RATE = float(os.getenv("CROPCHAIN_PROFILE_RATE", 1.0))  # fraction of requests sampled
+PROFILE_INTERVAL = float(os.getenv("CROPCHAIN_PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_KEEP = int(os.getenv("CROPCHAIN_PROFILE_KEEP", 20))  # slowest profiles kept
+PROFILE_DIR = os.getenv("CROPCHAIN_PROFILE_DIR")  # also write each kept profile there as <id>.folded
+
+UNMATCHED = "<unmatched>"
+
+
+class RequestStats:
+    """What one request did to the database. The middleware puts it in a context variable, which run_db's
+    threadpool calls and AsyncSession.run_sync inherit."""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.started = 0.0  # of the statement in progress
+        self.errors = 0
+        self.selects = Counter()  # SELECT text -> executions
+        self.threads = set()  # profiled requests: threads currently running its run_db work
+        self.samples = None  # profiled requests: Counter of folded stacks
+
+    def n_plus_one(self) -> list:
+        return [
+            {"statement": " ".join(statement.split())[:300], "count": count}
+            for statement, count in self.selects.most_common() if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("cropchain_request", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# SQL hooks
+
+def _record(stats: RequestStats, statement: str, seconds: float, rows: int):
+    stats.statements += 1
+    stats.db_seconds += seconds
+    stats.rows += rows
+    if statement.startswith("SELECT"):
+        stats.selects[statement] += 1
+
+
+class _InstrumentedCursor(sqlite3.Cursor):
+    """Records statements, time and rows for the current request in the driver itself: a few microseconds per
+    statement where SQLAlchemy cursor events cost several times that, and sqlite3 has no rowcount for SELECT."""
+
+    def execute(self, sql, parameters=()):
+        stats = _current.get()
+        if stats is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error:
+            stats.errors += 1
+            raise
+        finally:
+            _record(stats, sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = _current.get()
+        if stats is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            stats.errors += 1
+            raise
+        finally:
+            _record(stats, sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+    def fetchone(self):
+        row = super().fetchone()
+        stats = _current.get()
+        if stats is not None and row is not None:
+            stats.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany() if size is None else super().fetchmany(size)
+        stats = _current.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        stats = _current.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
+
+
+class _InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=_InstrumentedCursor):
+        return super().cursor(factory)
+
+
+def _instrumented_connection(dialect, connection_record, cargs, cparams):
+    cparams.setdefault("factory", _InstrumentedConnection)
+
+
+# Other drivers: SQLAlchemy cursor events
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.started = time.perf_counter()  # a request runs one statement at a time
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        # Rows written, and for most drivers rows selected
+        _record(stats, statement, time.perf_counter() - stats.started, max(cursor.rowcount, 0))
+
+
+def _handle_error(context):
+    stats = _current.get()
+    if stats is not None:
+        stats.errors += 1
+
+
+def instrument_engine(engine):
+    """Count statements, rows and time per request on engine (sync or async).
+
+    With sqlite3 this applies to connections opened after the call, so call it before the engine's first use.
+    Other drivers report the rows their cursor rowcount gives: rows written, and rows selected on PostgreSQL
+    but not with aiosqlite.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine.dialect.driver == "pysqlite":
+        if not event.contains(sync_engine, "do_connect", _instrumented_connection):
+            event.listen(sync_engine, "do_connect", _instrumented_connection)
+    elif not event.contains(sync_engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# Metrics registry
+
+def _labels(**labels) -> str:
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """Per-route request counts, latency histograms and database totals, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = Counter()  # (method, route, status) -> requests
+        self.latency = {}  # (method, route) -> [count per bucket..., +Inf count, sum of seconds]
+        self.db = defaultdict(lambda: [0, 0, 0.0, 0])  # route -> [statements, rows, seconds, errors]
+        self.n_plus_one = Counter()  # route -> requests flagged
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats, flagged: bool):
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            histogram = self.latency.get((method, route))
+            if histogram is None:
+                histogram = self.latency[(method, route)] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(self.buckets)] += 1
+            histogram[-1] += seconds
+            db = self.db[route]
+            db[0] += stats.statements
+            db[1] += stats.rows
+            db[2] += stats.db_seconds
+            db[3] += stats.errors
+            if flagged:
+                self.n_plus_one[route] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            requests = sorted(self.requests.items())
+            latency = sorted((key, list(values)) for key, values in self.latency.items())
+            db = sorted((route, list(values)) for route, values in self.db.items())
+            n_plus_one = sorted(self.n_plus_one.items())
+
+        lines = [
+            "# HELP cropchain_http_requests_total HTTP requests by route and status.",
+            "# TYPE cropchain_http_requests_total counter",
+        ]
+        lines += [f"cropchain_http_requests_total{_labels(method=m, route=r, status=s)} {n}" for (m, r, s), n in requests]
+        lines += [
+            "# HELP cropchain_http_request_duration_seconds Request latency by route.",
+            "# TYPE cropchain_http_request_duration_seconds histogram",
+        ]
+        for (method, route), values in latency:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"cropchain_http_request_duration_seconds_bucket"
+                             f"{_labels(method=method, route=route, le=bound)} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            lines.append(f"cropchain_http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {cumulative}")
+            lines.append(f"cropchain_http_request_duration_seconds_sum{_labels(method=method, route=route)} {values[-1]:.6f}")
+            lines.append(f"cropchain_http_request_duration_seconds_count{_labels(method=method, route=route)} {cumulative}")
+        for index, name, help_text in (
+            (0, "cropchain_db_statements_total", "SQL statements executed by requests, by route."),
+            (1, "cropchain_db_rows_total", "Rows fetched or written by requests, by route."),
+            (2, "cropchain_db_seconds_total", "Time spent executing SQL statements, by route."),
+            (3, "cropchain_db_errors_total", "SQL statements that failed, by route."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_labels(route=route)} {values[index]:.6f}" if index == 2 else
+                      f"{name}{_labels(route=route)} {values[index]}" for route, values in db]
+        lines += [
+            "# HELP cropchain_n_plus_one_requests_total Requests that repeated one SELECT at least "
+            f"{N_PLUS_ONE_THRESHOLD} times.",
+            "# TYPE cropchain_n_plus_one_requests_total counter",
+        ]
+        lines += [f"cropchain_n_plus_one_requests_total{_labels(route=route)} {n}" for route, n in n_plus_one]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Sampling profiler
+
+def _folded(frame) -> str:
+    """A stack as "module:function;module:function..." from the outermost frame, as flamegraph.pl reads it."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples, every interval, the stacks of the threads that run profiled requests' database work (see traced).
+
+    Only the PROFILE_KEEP slowest profiled requests are kept.
+    """
+
+    def __init__(self, enabled: bool = PROFILE, rate: float = PROFILE_RATE, interval: float = PROFILE_INTERVAL,
+                 keep: int = PROFILE_KEEP, directory: str = PROFILE_DIR):
+        self.enabled = enabled
+        self.rate = rate
+        self.interval = interval
+        self.keep = keep
+        self.directory = directory
+        self._active = set()
+        self._wake = threading.Condition()
+        self._thread = None
+        self._slowest = []  # min-heap of (seconds, id, profile)
+        self._ids = itertools.count(1)
+
+    def begin(self, stats: RequestStats) -> bool:
+        if not self.enabled or random.random() >= self.rate:
+            return False
+        stats.samples = Counter()
+        with self._wake:
+            self._active.add(stats)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return True
+
+    def end(self, stats: RequestStats, method: str, route: str, seconds: float):
+        with self._wake:
+            self._active.discard(stats)
+            if not stats.samples:
+                return
+            if len(self._slowest) >= self.keep and seconds <= self._slowest[0][0]:
+                return
+            profile_id = next(self._ids)
+            profile = {
+                "id": profile_id, "method": method, "route": route, "duration_ms": round(seconds * 1000, 2),
+                "samples": sum(stats.samples.values()), "at": time.time(), "stacks": dict(stats.samples),
+            }
+            heapq.heappush(self._slowest, (seconds, profile_id, profile))
+            if len(self._slowest) > self.keep:
+                heapq.heappop(self._slowest)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile_id}.folded"), "w") as f:
+                f.write(self.folded_text(profile))
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._active:
+                    self._wake.wait()
+                active = list(self._active)
+            frames = sys._current_frames()
+            for stats in active:
+                for ident in list(stats.threads):
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stats.samples[_folded(frame)] += 1
+            time.sleep(self.interval)
+
+    @staticmethod
+    def folded_text(profile: dict) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(profile["stacks"].items()))
+
+    def profiles(self) -> list:
+        """The kept profiles, slowest first, without their stacks."""
+        with self._wake:
+            kept = sorted(self._slowest, reverse=True)
+        return [{k: v for k, v in profile.items() if k != "stacks"} for _, _, profile in kept]
+
+    def get(self, profile_id: int) -> Optional[dict]:
+        with self._wake:
+            return next((profile for _, i, profile in self._slowest if i == profile_id), None)
+
+
+profiler = SamplingProfiler()
+
+
+def traced(fn):
+    """fn, registering the calling thread with the current profiled request while it runs (for run_db)."""
+    if not profiler.enabled:
+        return fn
+
+    @wraps(fn)
+    def call(*args, **kwargs):
+        stats = _current.get()
+        if stats is None or stats.samples is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        stats.threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats.threads.discard(ident)
+    return call
+
+
+# Middleware
+
+class MetricsMiddleware:
+    """ASGI middleware: times each HTTP request, collects its database work and records both by route template."""
+
+    def __init__(self, app, registry: Metrics = None):
+        self.app = app
+        self.metrics = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiled = profiler.begin(stats)
+        status = 500
+        streaming = False
+
+        async def send_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Event streams stay open as long as their client listens: never "slow"
+                streaming = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                for name, value in message.get("headers", ()))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _current.reset(token)
+            route = scope.get("route")
+            route = getattr(route, "path", None) or UNMATCHED
+            method = scope["method"]
+            n_plus_one = stats.n_plus_one()
+            self.metrics.observe(method, route, status, seconds, stats, bool(n_plus_one))
+            if profiled:
+                profiler.end(stats, method, route, seconds)
+            _log(method, route, scope.get("path"), status, seconds, stats, n_plus_one, streaming)
+
+
+def _log(method, route, path, status, seconds, stats, n_plus_one, streaming=False):
+    slow = seconds >= SLOW_REQUEST_SECONDS and not streaming
+    level = logging.WARNING if slow or n_plus_one or status >= 500 or stats.errors else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    record = {
+        "method": method, "route": route, "path": path, "status": status,
+        "duration_ms": round(seconds * 1000, 2), "statements": stats.statements, "rows": stats.rows,
+        "db_ms": round(stats.db_seconds * 1000, 2), "db_errors": stats.errors,
+    }
+    if slow:
+        record["slow"] = True
+    if n_plus_one:
+        record["n_plus_one"] = n_plus_one
+    logger.log(level, json.dumps(record))
@@ -2,9 +2,9 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+import auth_cache, password_hashing
 
 # Secret key for JWT encoding/decoding (change in production!)
 SECRET_KEY = "your_secret_key_here"
@@ -13,8 +13,9 @@ ALGORITHM = "HS256"
 # Token expiration time in minutes
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing configuration (cost factor: CROPCHAIN_BCRYPT_ROUNDS). Endpoints should prefer the
+# non-blocking password_hashing.hasher; these run bcrypt in the calling thread.
+pwd_context = password_hashing.pwd_context
 
 def hash_password(password: str) -> str:
     """Hash a plain password for storage."""
@@ -34,17 +35,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 # JWT decoding
 def decode_access_token(token: str):
-    """Decode a JWT access token and return the payload, or None if invalid."""
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        return None
+    """Decode a JWT access token and return the payload, or None if invalid.
+
+    Verified payloads are cached by token string until their exp, so repeat requests skip the HMAC check.
+    """
+    payload = auth_cache.tokens.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        auth_cache.tokens.put(token, payload, expires_at=payload.get("exp"))
+    return dict(payload)
 
 # OAuth2 scheme for extracting token from requests
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="farmer_login") 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Dependency to extract and validate the current user from the JWT token."""
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Dependency to extract and validate the current user from the JWT token.
+
+    Declared async (it never awaits) so FastAPI calls it on the event loop instead of the threadpool.
+    """
     payload = decode_access_token(token)
     if payload is None:
         raise HTTPException(
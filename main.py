@@ -1,31 +1,80 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, status, Form, File, UploadFile, Body
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Form, File, UploadFile, Body, Response, Request, Header, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
+import database
 from database import engine, SessionLocal
-import models, crud, schemas
+import models, crud, schemas, migrations, pagination, fast_json, response_cache, password_hashing, auth_cache, document_store, export, bulk_import, chain_sync, chain_indexer, aggregates, portfolio, instrumentation, http_cache, token_events
+import asyncio
+import hmac
+import io
+import os
 import logging
 from schemas import TokenOut, TokenStatusEnum
 from typing import Optional
 from datetime import date
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from jwt_auth import (
     create_access_token,
     decode_access_token,
-    hash_password,
-    verify_password,
     get_current_user
 )
 
-models.Base.metadata.create_all(bind=engine)
+# Before the first connection, so every connection counts its rows
+instrumentation.instrument_engine(engine)
+if database.async_engine is not None:
+    instrumentation.instrument_engine(database.async_engine)
+
+logger = logging.getLogger("cropchain")
 
 app = FastAPI()
 
+# Innermost: refuse oversized identity-document uploads before their body is spooled
+app.add_middleware(document_store.UploadLimitMiddleware, paths=["/register_farmer"])
+# 304s for unchanged polled reads (CORS headers still added), Cache-Control, compression
+app.add_middleware(http_cache.HTTPCacheMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5175"],  
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=pagination.EXPOSED_HEADERS,
 )
+# Outermost: times the whole request, CORS included
+app.add_middleware(instrumentation.MetricsMiddleware)
+
+
+@app.exception_handler(password_hashing.HasherBusy)
+async def hasher_busy(request, exc):
+    # The password-hashing queue is full: shed the signup/login instead of queueing it
+    return JSONResponse(status_code=503, content={"detail": "Too many logins, try again shortly"},
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(token_events.TooManySubscribers)
+async def too_many_subscribers(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Too many open update streams, try again shortly"},
+                        headers={"Retry-After": "5"})
+
+
+@app.on_event("startup")
+def prepare_database():
+    # On startup, not on import: importing the app (tests, benchmarks) never migrates ./cropchain.db
+    migrations.upgrade(engine)
+    database.optimize(engine)
+
+
+@app.on_event("shutdown")
+def shutdown_hasher():
+    password_hashing.hasher.shutdown()
+
+
+@app.on_event("shutdown")
+def close_token_streams():
+    # Open event streams would otherwise hold the server's shutdown until their clients leave
+    token_events.broker.close_all()
 
 # Dependency to get DB session
 def get_db():
@@ -36,8 +85,108 @@ def get_db():
         db.close()
 
 
+# Session for endpoints that go through run_db: an AsyncSession in async mode, else the sync session
+if database.ASYNC_DB:
+    async def get_session():
+        async with database.AsyncSessionLocal() as db:
+            yield db
+else:
+    get_session = get_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Call fn(session, *args, **kwargs), a sync crud function.
+
+    In async mode it runs on the event loop through AsyncSession.run_sync; otherwise in the threadpool.
+    """
+    fn = instrumentation.traced(fn)
+    if not database.ASYNC_DB:
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    # Purchases back off from lock contention here, without blocking the loop (see crud.Contention)
+    for attempt in range(crud.PURCHASE_ATTEMPTS):
+        try:
+            return await db.run_sync(fn, *args, **kwargs)
+        except crud.Contention as e:
+            if attempt == crud.PURCHASE_ATTEMPTS - 1:
+                raise e.error
+            await asyncio.sleep(crud.contention_delay(attempt))
+
+
+# Keyset pagination parameters shared by the listing endpoints
+class PageParams:
+    def __init__(self, limit: int, after: Optional[tuple], include_total: bool):
+        self.limit = limit
+        self.after = after
+        self.include_total = include_total
+
+
+async def page_params(
+    limit: int = Query(pagination.DEFAULT_LIMIT, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    include_total: bool = Query(False, description="Send X-Total-Count (cached count)")
+) -> PageParams:
+    try:
+        after = pagination.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return PageParams(limit, after, include_total)
+
+
+def load_page(db: Session, fetch, count, count_key: tuple, page: PageParams, **kwargs):
+    """Fetch one page with fetch(db, limit, after, **kwargs) and, if asked, its cached total from count(db, **kwargs)."""
+    rows = fetch(db, limit=page.limit, after=page.after, **kwargs)
+    total = None
+    if page.include_total:
+        table, view = count_key
+        total = pagination.count_cache.get_or_compute(table, {**view, **kwargs}, lambda: count(db, **kwargs))
+    return rows, total
+
+
+def rows_response(rows, limit: int = None, total: Optional[int] = None, created_attr: str = "created_at") -> Response:
+    """Serialize read-model rows (columns labelled like the response schema's JSON fields) straight to JSON.
+
+    No model is built or validated per row: the endpoint's response_model only documents the shape. With a
+    limit, the response also gets the next-page cursor (and total) headers.
+    """
+    response = Response(content=fast_json.rows(rows), media_type="application/json")
+    if limit is not None:
+        pagination.set_page_headers(response, pagination.next_cursor(rows, limit, created_attr), total)
+    return response
+
+
+def token_list_response(rows, limit: int, total: Optional[int] = None, cache_key=None, generation: int = None) -> Response:
+    """A page of token read-model rows (crud.TOKEN_OUT_COLUMNS), skipping per-row TokenOut validation.
+
+    With a cache_key the serialized body is also stored in the marketplace response cache.
+    """
+    response = rows_response(rows, limit, total)
+    if cache_key is not None:
+        headers = {k: response.headers[k] for k in pagination.EXPOSED_HEADERS if k in response.headers}
+        response_cache.marketplace.put(cache_key, response.body, headers, (row.id for row in rows), generation)
+    return response
+
+
+def cached_token_list(route: str, filters: dict, page: PageParams):
+    """Look up a marketplace listing in the response cache. Returns (response or None, key, generation)."""
+    generation = response_cache.marketplace.generation
+    key = response_cache.ResponseCache.make_key(route, {
+        **filters, "limit": page.limit, "after": page.after, "include_total": page.include_total or None
+    })
+    entry = response_cache.marketplace.get(key)
+    if entry is None:
+        return None, key, generation
+    return Response(content=entry.body, media_type="application/json", headers=entry.headers), key, generation
+
+
+def _register_farmer(db: Session, email: str, farmer_data: schemas.FarmerCreate):
+    account_id = crud.get_farmer_account_id_by_email(db=db, email=email)
+    if account_id is None:
+        raise HTTPException(status_code=404, detail="Farmer account not found")
+    return crud.create_farmer(db=db, farmer=farmer_data, account_id=account_id)
+
+
 @app.post("/register_farmer", response_model=schemas.FarmerOut)
-def register_farmer(
+async def register_farmer(
     name: str = Form(...),
     country: str = Form(...),
     region: str = Form(...),
@@ -45,18 +194,14 @@ def register_farmer(
     farm_size_ha: float = Form(...),
     contact: str = Form(None),
     identity_document: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
     user_data=Depends(get_current_user)
 ):
-    email = user_data.get("sub")
-    account = db.query(models.FarmerAccount).filter_by(email=email).first()
-    if not account:
-        raise HTTPException(status_code=404, detail="Farmer account not found")
-
-    # Save the uploaded file
-    file_location = f"identity_docs/{identity_document.filename}"
-    with open(file_location, "wb") as f:
-        f.write(identity_document.file.read())
+    # Stream the upload into content-addressed storage (UploadLimitMiddleware already refused oversized requests)
+    try:
+        document = await document_store.store(identity_document)
+    except document_store.DocumentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     farmer_data = schemas.FarmerCreate(
         name=name,
@@ -65,54 +210,84 @@ def register_farmer(
         address=address,
         farm_size_ha=farm_size_ha,
         contact=contact,
-        identity_document=file_location
+        identity_document=document.url
+    )
+    return await run_db(db, _register_farmer, email=user_data.get("sub"), farmer_data=farmer_data)
+
+
+def _farmer_document(db: Session, email: str, url: str):
+    account_id = crud.get_farmer_account_id_by_email(db=db, email=email)
+    return account_id is not None and db.query(models.Farmer.id) \
+        .filter(models.Farmer.account_id == account_id, models.Farmer.identity_document == url).first() is not None
+
+
+@app.get("/documents/{digest}")
+async def get_document(
+    digest: str,
+    request: Request,
+    db: Session = Depends(get_session),
+    user_data=Depends(get_current_user)
+):
+    # Only the farmer whose profile references the document may read it
+    url = document_store.URL_PREFIX + digest
+    if not await run_db(db, _farmer_document, email=user_data.get("sub"), url=url):
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        size = await document_store.storage.size(digest)
+    except ValueError:
+        size = None
+    if size is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{digest}"', "Cache-Control": "private, max-age=31536000, immutable"}
+    try:
+        byte_range = document_store.parse_range(request.headers.get("range"), size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        document_store.storage.read(digest, start, end),
+        status_code=206 if byte_range else 200,
+        media_type="application/octet-stream",
+        headers=headers
     )
-    return crud.create_farmer(db=db, farmer=farmer_data, account_id=account.id)
 
 
 @app.post("/update_farmer_status", response_model=schemas.FarmerOut)
-def update_farmer_status(
+async def update_farmer_status(
     update: schemas.FarmerStatusUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_session)
 ):
     try:
-        return crud.update_farmer_status(db=db, farmer_id=update.farmer_id, new_status=update.new_status)
+        return await run_db(db, crud.update_farmer_status, farmer_id=update.farmer_id, new_status=update.new_status)
     except ValueError:
         raise HTTPException(status_code=404, detail="Farmer not found")
 
 
 @app.post("/add_crop", response_model=schemas.CropOut)
-def add_crop(crop: schemas.CropCreate, db: Session = Depends(get_db)):
-    return crud.create_crop(db=db, crop=crop)
+async def add_crop(crop: schemas.CropCreate, db: Session = Depends(get_session)):
+    return await run_db(db, crud.create_crop, crop=crop)
+
+
+def _tokenize_crop(db: Session, token: schemas.TokenCreate):
+    db_token = crud.create_token(db=db, token=token)
+    return crud.get_token_row(db=db, token_id=db_token.id)
 
 
 @app.post("/tokenize_crop", response_model=schemas.TokenOut)
-def tokenize_crop(token: schemas.TokenCreate, db: Session = Depends(get_db)):
+async def tokenize_crop(token: schemas.TokenCreate, db: Session = Depends(get_session)):
     try:
-        db_token = crud.create_token(db=db, token=token)
-
-        crop = db_token.crop
-        farmer = db_token.farmer
-
-        funding_percentage = round((db_token.tokens_sold / db_token.token_count) * 100, 2) if db_token.token_count else 0.0
-        tokens_left = db_token.token_count - db_token.tokens_sold
-
-        return schemas.TokenOut(
-            **db_token.__dict__,
-            crop_name=crop.crop_name,
-            crop_variety=crop.variety,
-            country=farmer.country,
-            region=farmer.region,
-            organic_certified=crop.organic_certified,
-            funding_percentage=funding_percentage,
-            tokens_left=tokens_left
-        )
-    except Exception as e:
-        print(f"Error in tokenize_crop: {e}")
+        row = await run_db(db, _tokenize_crop, token=token)
+        return schemas.TokenOut(**row._asdict())
+    except Exception:
+        logger.exception("tokenize_crop failed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/tokens_available", response_model=list[schemas.TokenOut])
-def tokens_available(
+async def tokens_available(
     country: Optional[str] = Query(None),
     region: Optional[str] = Query(None),
     crop_name: Optional[str] = Query(None),
@@ -124,73 +299,38 @@ def tokens_available(
     status: Optional[str] = Query(None),
     funded_only: Optional[bool] = Query(None, description="Filter for funded tokens"),
     organic_only: Optional[bool] = Query(None, description="Filter for organic crops"),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_session)
 ):
-    try:
-        tokens = crud.get_filtered_tokens(
-            db=db,
-            country=country,
-            region=region,
-            crop_name=crop_name,
-            crop_variety=crop_variety,
-            farmer_id=farmer_id,
-            min_roi=min_roi,
-            deadline=deadline,
-            created_after=created_after,
-            status=status,
-            funded_only=funded_only,
-            organic_only=organic_only
-        )
-
-        response = []
-        for token in tokens:
-            if not token.crop or not token.farmer:
-                print(f"Skipping token {token.id} due to missing crop or farmer relation.")
-                continue
-
-            funding_percentage = round((token.tokens_sold / token.token_count) * 100, 2) if token.token_count else 0.0
-            tokens_left = token.token_count - token.tokens_sold
-
-            response.append(
-                schemas.TokenOut(
-                    id=token.id,
-                    crop_id=token.crop_id,
-                    crop_name=token.crop.crop_name,
-                    crop_variety=token.crop.variety,
-                    country=token.farmer.country,
-                    region=token.farmer.region,
-                    organic_certified=token.crop.organic_certified,
-                    token_count=token.token_count,
-                    price_per_token=token.price_per_token,
-                    expected_yield_unit=token.expected_yield_unit,
-                    expected_total_yield=token.expected_total_yield,
-                    expected_roi=token.expected_roi,
-                    tokens_sold=token.tokens_sold,
-                    is_funded=token.is_funded,
-                    funding_deadline=token.funding_deadline,
-                    currency=token.currency,
-                    status=token.status,
-                    created_at=token.created_at,
-                    funding_percentage=funding_percentage,
-                    tokens_left=tokens_left,
-                    token_status=token.token_status,
-                    planting_date=token.crop.planting_date,
-                    expected_harvest_month=token.crop.expected_harvest_month
-                )
-            )
-
-        return response
-
-    except Exception as e:
-        print(f"Error in tokens_available: {e}")
-        return []
+    filters = dict(
+        country=country,
+        region=region,
+        crop_name=crop_name,
+        crop_variety=crop_variety,
+        farmer_id=farmer_id,
+        min_roi=min_roi,
+        deadline=deadline,
+        created_after=created_after,
+        status=status,
+        funded_only=funded_only,
+        organic_only=organic_only
+    )
+    cached, cache_key, generation = cached_token_list("tokens_available", filters, page)
+    if cached is not None:
+        return cached
+    rows, total = await run_db(
+        db, load_page, crud.get_filtered_tokens, crud.count_filtered_tokens,
+        ("tokens", {"view": "available"}), page, **filters
+    )
+    return token_list_response(rows, page.limit, total, cache_key, generation)
 
 
 @app.post("/invest_token", response_model=schemas.InvestmentOut)
-def invest_token(investment: schemas.TokenInvestmentRequest, db: Session = Depends(get_db)):
+async def invest_token(investment: schemas.TokenInvestmentRequest, db: Session = Depends(get_session)):
     try:
-        return crud.invest_in_token(
-            db=db,
+        return await run_db(
+            db,
+            crud.invest_in_token,
             token_id=investment.token_id,
             investor_id=investment.investor_id,
             quantity=investment.quantity
@@ -199,153 +339,188 @@ def invest_token(investment: schemas.TokenInvestmentRequest, db: Session = Depen
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _create_contract(db: Session, contract_data: schemas.ContractCreate, email: str):
+    # Get investor ID from authenticated user
+    investor_id = crud.get_investor_id_by_email(db=db, email=email)
+    if investor_id is None:
+        raise HTTPException(status_code=404, detail="Investor not found")
+
+    return crud.create_contract(
+        db=db,
+        contract_data=contract_data,
+        investor_id=investor_id
+    )
+
+
 @app.post("/create_contract", response_model=schemas.ContractOut)
-def create_contract(
+async def create_contract(
     contract_data: schemas.ContractCreate, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
     user_data=Depends(get_current_user)
 ):
     try:
-        # Get investor ID from authenticated user
-        email = user_data.get("sub")
-        investor = db.query(models.InvestorAccount).filter_by(email=email).first()
-        if not investor:
-            raise HTTPException(status_code=404, detail="Investor not found")
-        
-        return crud.create_contract(
-            db=db,
-            contract_data=contract_data,
-            investor_id=investor.id
-        )
+        return await run_db(db, _create_contract, contract_data=contract_data, email=user_data.get("sub"))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        logger.exception("create_contract failed")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _create_contracts_batch(db: Session, contracts: list[schemas.ContractCreate], email: str):
+    investor_id = crud.get_investor_id_by_email(db=db, email=email)
+    if investor_id is None:
+        raise HTTPException(status_code=404, detail="Investor not found")
+
+    return crud.create_contracts(db=db, items=contracts, investor_id=investor_id)
+
+
+@app.post("/create_contracts_batch", response_model=list[schemas.ContractOut])
+async def create_contracts_batch(
+    contracts: list[schemas.ContractCreate],
+    db: Session = Depends(get_session),
+    user_data=Depends(get_current_user)
+):
+    # All-or-nothing: if any item fails, no contract in the batch is created
+    try:
+        return await run_db(db, _create_contracts_batch, contracts=contracts, email=user_data.get("sub"))
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        print(f"Error in create_contract: {e}")
+    except Exception:
+        logger.exception("create_contracts_batch failed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @app.get("/tokens_by_crop/{crop_id}", response_model=list[schemas.TokenOut])
-def tokens_by_crop(crop_id: int, db: Session = Depends(get_db)):
-    tokens = crud.get_tokens_by_crop(db=db, crop_id=crop_id)
-    response = []
-    for token in tokens:
-        percentage = round((token.tokens_sold / token.token_count) * 100, 2) if token.token_count else 0.0
-        response.append(schemas.TokenOut(**token.__dict__, funding_percentage=percentage))
-    return response
+async def tokens_by_crop(crop_id: int, db: Session = Depends(get_session)):
+    # Read-model rows: TokenOut's crop and farmer fields come from the joins
+    rows = await run_db(db, crud.get_tokens_by_crop, crop_id=crop_id)
+    return rows_response(rows)
 
 
 @app.get("/tokens_all", response_model=list[schemas.TokenOut])
-def tokens_all(
+async def tokens_all(
     status: Optional[str] = Query(None),
     funded_only: Optional[bool] = Query(None),
     min_roi: Optional[float] = Query(None),
     created_after: Optional[date] = Query(None),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_session)
 ):
-    try:
-        tokens = crud.get_all_tokens(
-            db=db,
-            status=status,
-            funded_only=funded_only,
-            min_roi=min_roi,
-            created_after=created_after
-        )
+    filters = dict(
+        status=status,
+        funded_only=funded_only,
+        min_roi=min_roi,
+        created_after=created_after
+    )
+    cached, cache_key, generation = cached_token_list("tokens_all", filters, page)
+    if cached is not None:
+        return cached
+    rows, total = await run_db(
+        db, load_page, crud.get_all_tokens, crud.count_all_tokens, ("tokens", {"view": "all"}), page, **filters
+    )
+    return token_list_response(rows, page.limit, total, cache_key, generation)
 
-        response = []
-        for token in tokens:
-            if not token.crop or not token.farmer:
-                print(f"Skipping token {token.id} due to missing crop or farmer relation.")
-                continue
-
-            funding_percentage = round((token.tokens_sold / token.token_count) * 100, 2) if token.token_count else 0.0
-            tokens_left = token.token_count - token.tokens_sold
-
-            response.append(
-                schemas.TokenOut(
-                    id=token.id,
-                    crop_id=token.crop_id,
-                    crop_name=token.crop.crop_name,
-                    crop_variety=token.crop.variety,
-                    country=token.farmer.country,
-                    region=token.farmer.region,
-                    organic_certified=token.crop.organic_certified,
-                    token_count=token.token_count,
-                    price_per_token=token.price_per_token,
-                    expected_yield_unit=token.expected_yield_unit,
-                    expected_total_yield=token.expected_total_yield,
-                    expected_roi=token.expected_roi,
-                    tokens_sold=token.tokens_sold,
-                    is_funded=token.is_funded,
-                    funding_deadline=token.funding_deadline,
-                    currency=token.currency,
-                    status=token.status,
-                    created_at=token.created_at,
-                    funding_percentage=funding_percentage,
-                    tokens_left=tokens_left,
-                    token_status=token.token_status
-                )
-            )
-        return response
-
-    except Exception as e:
-        print(f"Error in /tokens_all: {e}")
-        return []
-    
 
 @app.get("/crops_by_farmer", response_model=list[schemas.CropOut])
-def crops_by_farmer(farmer_id: int, db: Session = Depends(get_db)):
-    crops = db.query(models.Crop).filter(models.Crop.farmer_id == farmer_id).all()
-    return crops
+async def crops_by_farmer(farmer_id: int, db: Session = Depends(get_session)):
+    return await run_db(db, crud.get_crops_by_farmer, farmer_id=farmer_id)
 
 
 @app.get("/tokens_by_farmer", response_model=list[schemas.TokenOut])
-def tokens_by_farmer(farmer_id: int, db: Session = Depends(get_db)):
-    tokens = db.query(models.Token).filter(models.Token.farmer_id == farmer_id, models.Token.token_status == models.TokenStatusEnum.verified).all()
-
-    response = []
-    for token in tokens:
-        if not token.crop or not token.farmer:
-            continue
-
-        funding_percentage = round((token.tokens_sold / token.token_count) * 100, 2) if token.token_count else 0.0
-        tokens_left = token.token_count - token.tokens_sold
-
-        response.append(schemas.TokenOut(
-            id=token.id,
-            crop_id=token.crop_id,
-            crop_name=token.crop.crop_name,
-            crop_variety=token.crop.variety,
-            country=token.farmer.country,
-            region=token.farmer.region,
-            organic_certified=token.crop.organic_certified,
-            token_count=token.token_count,
-            price_per_token=token.price_per_token,
-            expected_yield_unit=token.expected_yield_unit,
-            expected_total_yield=token.expected_total_yield,
-            expected_roi=token.expected_roi,
-            tokens_sold=token.tokens_sold,
-            is_funded=token.is_funded,
-            funding_deadline=token.funding_deadline,
-            currency=token.currency,
-            status=token.status,
-            created_at=token.created_at,
-            funding_percentage=funding_percentage,
-            tokens_left=tokens_left,
-            token_status=token.token_status,
-            planting_date=token.crop.planting_date,
-            expected_harvest_month=token.crop.expected_harvest_month
-        ))
-    return response
+async def tokens_by_farmer(
+    farmer_id: int,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_session)
+):
+    rows, total = await run_db(
+        db, load_page, crud.get_verified_tokens_by_farmer, crud.count_verified_tokens_by_farmer,
+        ("tokens", {"view": "by_farmer"}), page, farmer_id=farmer_id
+    )
+    return token_list_response(rows, page.limit, total)
+
+
+async def token_update_params(
+    token_id: Optional[list[int]] = Query(None, description="Tokens to follow (repeatable)"),
+    farmer_id: Optional[int] = Query(None, description="Follow every token of this farmer"),
+    country: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    crop_name: Optional[str] = Query(None),
+    crop_variety: Optional[str] = Query(None),
+    min_roi: Optional[float] = Query(None),
+    deadline: Optional[date] = Query(None),
+    organic_only: Optional[bool] = Query(None),
+    rate: float = Query(token_events.MAX_RATE, gt=0, le=token_events.MAX_RATE, description="Messages per second")
+) -> dict:
+    """Subscription of a token update stream: token ids, else a farmer, else the /tokens_available filters."""
+    filters = dict(country=country, region=region, crop_name=crop_name, crop_variety=crop_variety,
+                   min_roi=min_roi, deadline=deadline, organic_only=organic_only)
+    return dict(token_ids=token_id or (), farmer_id=farmer_id, filters=filters, rate=rate)
+
+
+async def _token_event_stream(subscriber):
+    try:
+        yield b"retry: 3000\n\n"
+        async for message in subscriber.stream():
+            if message is None:
+                yield b": keep-alive\n\n"
+            else:
+                yield b"event: tokens\ndata: " + message + b"\n\n"
+    finally:
+        token_events.broker.unsubscribe(subscriber)
+
+
+@app.get("/token_updates")
+async def token_updates(params: dict = Depends(token_update_params)):
+    # Server-Sent Events: each "tokens" event is a JSON array of the TokenOut rows changed since the last one.
+    # The background task also unsubscribes a client that left before the stream started.
+    subscriber = token_events.broker.subscribe(**params)
+    return StreamingResponse(
+        _token_event_stream(subscriber), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(token_events.broker.unsubscribe, subscriber)
+    )
+
+
+@app.websocket("/ws/token_updates")
+async def token_updates_ws(websocket: WebSocket, params: dict = Depends(token_update_params)):
+    # Same messages as /token_updates, one text frame each; messages from the client are ignored
+    try:
+        subscriber = token_events.broker.subscribe(**params)
+    except token_events.TooManySubscribers:
+        await websocket.close(code=1013)  # try again later
+        return
+    await websocket.accept()
+
+    async def close_on_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        subscriber.close()
+
+    receiver = asyncio.create_task(close_on_disconnect())
+    try:
+        async for message in subscriber.stream(heartbeat=None):
+            await websocket.send_text(message.decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        token_events.broker.unsubscribe(subscriber)
 
 
 @app.post("/farmer_signup", response_model=schemas.AuthWithFarmer)
-def farmer_signup(data: schemas.FarmerRegisterRequest, db: Session = Depends(get_db)):
-    existing = db.query(models.FarmerAccount).filter(models.FarmerAccount.email == data.email).first()
+async def farmer_signup(data: schemas.FarmerRegisterRequest, db: Session = Depends(get_session)):
+    existing = await run_db(db, crud.get_farmer_account_by_email, email=data.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Create new farmer
-    farmer = crud.create_farmer_account(db, data)
+    hashed_password = await password_hashing.hasher.hash(data.password)
+    farmer = await run_db(db, crud.create_farmer_account, data=data, hashed_password=hashed_password)
 
     # Generate access token using email
     access_token = create_access_token({"sub": farmer.email})
@@ -358,9 +533,9 @@ def farmer_signup(data: schemas.FarmerRegisterRequest, db: Session = Depends(get
 
 
 @app.post("/farmer_login", response_model=schemas.AuthWithFarmer)
-def farmer_login(data: schemas.FarmerLoginRequest, db: Session = Depends(get_db)):
-    farmer = db.query(models.FarmerAccount).filter(models.FarmerAccount.email == data.email).first()
-    if not farmer or not verify_password(data.password, farmer.hashed_password):
+async def farmer_login(data: schemas.FarmerLoginRequest, db: Session = Depends(get_session)):
+    farmer = await run_db(db, crud.get_farmer_account_by_email, email=data.email)
+    if not farmer or not await password_hashing.hasher.verify(data.password, farmer.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token = create_access_token({"sub": farmer.email})
@@ -372,12 +547,13 @@ def farmer_login(data: schemas.FarmerLoginRequest, db: Session = Depends(get_db)
 
 
 @app.post("/investor_signup", response_model=schemas.AuthWithInvestor)
-def investor_signup(data: schemas.InvestorRegisterRequest, db: Session = Depends(get_db)):
-    existing = db.query(models.InvestorAccount).filter(models.InvestorAccount.email == data.email).first()
+async def investor_signup(data: schemas.InvestorRegisterRequest, db: Session = Depends(get_session)):
+    existing = await run_db(db, crud.get_investor_by_email, email=data.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    investor = crud.create_investor_account(db, data)
+    hashed_password = await password_hashing.hasher.hash(data.password)
+    investor = await run_db(db, crud.create_investor_account, data=data, hashed_password=hashed_password)
     access_token = create_access_token({"sub": investor.email})
     return {
         "access_token": access_token,
@@ -387,9 +563,9 @@ def investor_signup(data: schemas.InvestorRegisterRequest, db: Session = Depends
 
 
 @app.post("/investor_login", response_model=schemas.AuthWithInvestor)
-def investor_login(data: schemas.InvestorLoginRequest, db: Session = Depends(get_db)):
-    investor = db.query(models.InvestorAccount).filter(models.InvestorAccount.email == data.email).first()
-    if not investor or not verify_password(data.password, investor.hashed_password):
+async def investor_login(data: schemas.InvestorLoginRequest, db: Session = Depends(get_session)):
+    investor = await run_db(db, crud.get_investor_by_email, email=data.email)
+    if not investor or not await password_hashing.hasher.verify(data.password, investor.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token = create_access_token({"sub": investor.email})
@@ -400,87 +576,237 @@ def investor_login(data: schemas.InvestorLoginRequest, db: Session = Depends(get
     }
 
 
-@app.get("/investments", response_model=list[schemas.InvestmentOut])
-def get_my_investments(user_data=Depends(get_current_user), db: Session = Depends(get_db)):
-    email = user_data.get("sub")
-    investor = db.query(models.InvestorAccount).filter_by(email=email).first()
-    if not investor:
+def _investor_page(db: Session, email: str, fetch, count, table: str, page: PageParams):
+    investor_id = crud.get_investor_id_by_email(db=db, email=email)
+    if investor_id is None:
         raise HTTPException(status_code=404, detail="Investor not found")
-    return db.query(models.Investment).filter_by(investor_id=investor.id).all()
+    # investments.investor_id is a string column, contracts.investor_id an integer
+    if table == "investments":
+        investor_id = str(investor_id)
+    return load_page(db, fetch, count, (table, {}), page, investor_id=investor_id)
+
 
-@app.get("/farmer_dashboard")
-def get_my_farmer_data(user_data=Depends(get_current_user), db: Session = Depends(get_db)):
-    email = user_data.get("sub")
-    account = db.query(models.FarmerAccount).filter_by(email=email).first()
-    if not account:
+@app.get("/investments", response_model=list[schemas.InvestmentOut])
+async def get_my_investments(
+    page: PageParams = Depends(page_params),
+    user_data=Depends(get_current_user),
+    db: Session = Depends(get_session)
+):
+    investments, total = await run_db(
+        db, _investor_page, user_data.get("sub"), crud.get_investments_by_investor,
+        crud.count_investments_by_investor, "investments", page
+    )
+    return rows_response(investments, page.limit, total, "invested_at")
+
+def _farmer_dashboard(db: Session, email: str) -> bytes:
+    account_id = crud.get_farmer_account_id_by_email(db=db, email=email)
+    if account_id is None:
         raise HTTPException(status_code=404, detail="FarmerAccount not found")
-    farmer = db.query(models.Farmer).filter_by(account_id=account.id).first()
-    if not farmer:
+    dashboard = crud.get_farmer_dashboard(db, account_id)
+    if dashboard is None:
         raise HTTPException(status_code=404, detail="Farmer profile not found")
-    # Only include tokens that are verified
-    farmer.tokens = [token for token in farmer.tokens if token.token_status == models.TokenStatusEnum.verified]
-    # Manual mapping to ensure farmer_id is present
-    return {
-        "farmer_id": farmer.id,
-        "name": farmer.name,
-        "country": farmer.country,
-        "region": farmer.region,
-        "address": farmer.address,
-        "farm_size_ha": farmer.farm_size_ha,
-        "contact": farmer.contact,
-        "identity_document": farmer.identity_document,
-        "registration_status": farmer.registration_status,
-        "registered_at": farmer.registered_at,
-        # Add any other fields you want to include
-    }
+    # Serialized here, while the session that loaded the crops and tokens is still open
+    return schemas.FarmerDashboard.model_validate(dashboard, from_attributes=True).model_dump_json(by_alias=True).encode()
+
+
+@app.get("/farmer_dashboard", response_model=schemas.FarmerDashboard)
+async def get_my_farmer_data(user_data=Depends(get_current_user), db: Session = Depends(get_session)):
+    # Profile, crops, verified tokens, funding and contract totals in one response. Revalidations of an
+    # unchanged dashboard are answered 304 by http_cache.HTTPCacheMiddleware.
+    body = await run_db(db, _farmer_dashboard, email=user_data.get("sub"))
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/update_token_status")
-def update_token_status(
+async def update_token_status(
     token_id: int = Body(...),
     new_status: TokenStatusEnum = Body(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_session)
 ):
-    token = db.query(models.Token).filter(models.Token.id == token_id).first()
-    if not token:
+    try:
+        await run_db(db, crud.update_token_status, token_id=token_id, new_status=new_status)
+    except ValueError:
         raise HTTPException(status_code=404, detail="Token not found")
-    token.token_status = new_status
-    db.commit()
-    db.refresh(token)
     return {"message": "Token status updated", "token_id": token_id, "new_status": new_status}
 
 
 @app.get("/my_contracts", response_model=list[schemas.ContractOut])
-def my_contracts(user_data=Depends(get_current_user), db: Session = Depends(get_db)):
-    email = user_data.get("sub")
-    investor = db.query(models.InvestorAccount).filter_by(email=email).first()
-    if not investor:
+async def my_contracts(
+    page: PageParams = Depends(page_params),
+    user_data=Depends(get_current_user),
+    db: Session = Depends(get_session)
+):
+    contracts, total = await run_db(
+        db, _investor_page, user_data.get("sub"), crud.get_contract_rows_by_investor,
+        crud.count_contracts_by_investor, "contracts", page
+    )
+    return rows_response(contracts, page.limit, total)
+
+
+def _portfolio_summary(db: Session, email: str):
+    investor_id = crud.get_investor_id_by_email(db=db, email=email)
+    if investor_id is None:
+        raise HTTPException(status_code=404, detail="Investor not found")
+    return portfolio.portfolio_summary(db, investor_id)
+
+
+@app.get("/portfolio_summary", response_model=schemas.PortfolioSummary)
+async def portfolio_summary(user_data=Depends(get_current_user), db: Session = Depends(get_session)):
+    return await run_db(db, _portfolio_summary, email=user_data.get("sub"))
+
+
+# Operator endpoints (/bulk_import, /export) require CROPCHAIN_ADMIN_KEY in the X-Admin-Key header; without it they are off
+ADMIN_KEY = os.getenv("CROPCHAIN_ADMIN_KEY")
+
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    if not ADMIN_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_key is None or not hmac.compare_digest(x_admin_key.encode(), ADMIN_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+@app.post("/bulk_import")
+def bulk_import_sheets(
+    farmers: Optional[UploadFile] = File(None),
+    crops: Optional[UploadFile] = File(None),
+    tokens: Optional[UploadFile] = File(None),
+    db: Session = Depends(get_db),
+    _admin=Depends(require_admin_key)
+):
+    # Each sheet is a .csv or .ndjson/.jsonl upload; bad rows are reported, the rest imported
+    sheets = {}
+    for sheet, upload in (("farmers", farmers), ("crops", crops), ("tokens", tokens)):
+        if upload is not None:
+            text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            sheets[sheet] = bulk_import.sheet_rows(text, bulk_import.format_of(upload.filename or ""))
+    if not sheets:
+        raise HTTPException(status_code=400, detail="No sheets given")
+    try:
+        return bulk_import.import_sheets(db, **sheets).as_dict()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Sheets must be UTF-8")
+
+
+@app.get("/export/{table}")
+def export_table(
+    table: str,
+    format: str = Query("ndjson", description="ndjson, csv or columnar"),
+    batch_size: int = Query(export.BATCH_SIZE, ge=1, le=100_000),
+    country: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    crop_name: Optional[str] = Query(None),
+    crop_variety: Optional[str] = Query(None),
+    farmer_id: Optional[int] = Query(None),
+    min_roi: Optional[float] = Query(None),
+    deadline: Optional[date] = Query(None),
+    created_after: Optional[date] = Query(None),
+    status: Optional[str] = Query(None),
+    funded_only: Optional[bool] = Query(None),
+    organic_only: Optional[bool] = Query(None),
+    investor_id: Optional[int] = Query(None),
+    token_id: Optional[int] = Query(None),
+    _admin=Depends(require_admin_key)
+):
+    try:
+        chunks = export.stream(
+            table, format, batch_size,
+            country=country, region=region, crop_name=crop_name, crop_variety=crop_variety,
+            farmer_id=farmer_id, min_roi=min_roi, deadline=deadline, created_after=created_after,
+            status=status, funded_only=funded_only, organic_only=organic_only,
+            investor_id=investor_id, token_id=token_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    extension = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(chunks, media_type=export.FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="{table}.{extension}"'
+    })
+
+
+# Path segment -> aggregates scope of the groups that can be looked up publicly (investors see only their own)
+STATS_SCOPES = {"farmers": "farmer", "crops": "crop", "countries": "country"}
+
+
+@app.get("/stats/totals", response_model=schemas.FundingStats)
+async def stats_totals(db: Session = Depends(get_session)):
+    return await run_db(db, aggregates.stats, "total")
+
+
+def _my_exposure(db: Session, email: str):
+    investor_id = crud.get_investor_id_by_email(db=db, email=email)
+    if investor_id is None:
         raise HTTPException(status_code=404, detail="Investor not found")
-    contracts = db.query(models.Contract).filter_by(investor_id=investor.id).all()
-    result = []
-    for contract in contracts:
-        token = db.query(models.Token).filter_by(id=contract.token_id).first()
-        crop_name = None
-        crop_variety = None
-        if token and token.crop_id:
-            crop = db.query(models.Crop).filter_by(id=token.crop_id).first()
-            if crop:
-                crop_name = crop.crop_name
-                crop_variety = crop.variety
-        result.append(schemas.ContractOut(
-            id=contract.id,
-            token_id=contract.token_id,
-            farmer_id=contract.farmer_id,
-            investor_id=contract.investor_id,
-            quantity=contract.quantity,
-            price_per_token=contract.price_per_token,
-            total_value=contract.total_value,
-            delivery_type=contract.delivery_type,
-            expected_roi=contract.expected_roi,
-            expected_harvest_month=contract.expected_harvest_month,
-            payout_status=contract.payout_status,
-            created_at=contract.created_at,
-            crop_name=crop_name,
-            crop_variety=crop_variety
-        ))
-    return result
\ No newline at end of file
+    return aggregates.stats(db, "investor", str(investor_id))
+
+
+@app.get("/stats/my_exposure", response_model=schemas.FundingStats)
+async def stats_my_exposure(user_data=Depends(get_current_user), db: Session = Depends(get_session)):
+    return await run_db(db, _my_exposure, email=user_data.get("sub"))
+
+
+def _token_stats(db: Session, token_id: int):
+    stats = aggregates.token_stats(db, token_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Token not found")
+    return stats
+
+
+@app.get("/stats/tokens/{token_id}", response_model=schemas.FundingStats)
+async def stats_token(token_id: int, db: Session = Depends(get_session)):
+    return await run_db(db, _token_stats, token_id=token_id)
+
+
+@app.get("/stats/{group}", response_model=list[schemas.FundingStats])
+async def stats_top(group: str, limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_session)):
+    if group not in STATS_SCOPES:
+        raise HTTPException(status_code=404, detail=f"Unknown stats group {group!r}")
+    return await run_db(db, aggregates.top, STATS_SCOPES[group], limit)
+
+
+@app.get("/stats/{group}/{key}", response_model=schemas.FundingStats)
+async def stats_group(group: str, key: str, db: Session = Depends(get_session)):
+    if group not in STATS_SCOPES:
+        raise HTTPException(status_code=404, detail=f"Unknown stats group {group!r}")
+    return await run_db(db, aggregates.stats, STATS_SCOPES[group], key)
+
+
+def _chain_sync_status(db: Session):
+    return {**chain_sync.sync_status(db), "indexed": chain_indexer.index_status(db)}
+
+
+@app.get("/chain_sync_status")
+async def chain_sync_status(db=Depends(get_session)):
+    return await run_db(db, _chain_sync_status)
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return {
+        "marketplace": response_cache.marketplace.stats(),
+        "password_hashing": password_hashing.hasher.stats(),
+        "auth_tokens": auth_cache.tokens.stats(),
+        "principals": auth_cache.principals.stats(),
+        "token_updates": token_events.broker.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(instrumentation.metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/profiles")
+async def metrics_profiles():
+    """Slowest requests sampled by the profiler (CROPCHAIN_PROFILE=1), slowest first."""
+    return {"enabled": instrumentation.profiler.enabled, "profiles": instrumentation.profiler.profiles()}
+
+
+@app.get("/metrics/profiles/{profile_id}", response_class=PlainTextResponse)
+async def metrics_profile(profile_id: int):
+    # Folded stacks: flamegraph.pl profile.folded > profile.svg, or open in speedscope
+    profile = instrumentation.profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(instrumentation.profiler.folded_text(profile))
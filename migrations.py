@@ -0,0 +1,336 @@
+# Versioned schema migrations. Replaces the bare Base.metadata.create_all call in main.py.
+# Each migration runs once, in order, inside its own transaction and is recorded in schema_version.
+# Migrations never take table definitions or logic from models/outbox/aggregates, which keep changing: what a
+# version does is frozen here, so upgrading an old database ends with the same schema as a fresh install.
+import json
+from datetime import date, datetime, time, timezone
+from sqlalchemy import (Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, MetaData, String,
+                        Table, Text, inspect, insert, select, text)
+from database import engine as default_engine
+import models
+
+# Where the indexes that versions 2, 3, 4 and 8 create by name are declared
+INDEXED_TABLES = [
+    models.FarmerAccount.__table__,
+    models.InvestorAccount.__table__,
+    models.Farmer.__table__,
+    models.Crop.__table__,
+    models.Token.__table__,
+    models.Investment.__table__,
+    models.Contract.__table__,
+]
+
+
+def _add_column_if_missing(conn, table: str, column: str, ddl: str):
+    """Add a column to an existing table unless it is already there."""
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_indexes(conn, tables, names):
+    for table in tables:
+        for index in table.indexes:
+            if index.name in names:
+                index.create(bind=conn, checkfirst=True)
+
+
+# The schema as it was before migrations existed (Base.metadata.create_all of the original models)
+_MONTHS = ("january", "february", "march", "april", "may", "june",
+           "july", "august", "september", "october", "november", "december")
+BASELINE = MetaData()
+Table("farmer_accounts", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("email", String, unique=True, index=True, nullable=False),
+      Column("hashed_password", String, nullable=False),
+      Column("created_at", DateTime))
+Table("investor_accounts", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("email", String, unique=True, index=True, nullable=False),
+      Column("hashed_password", String, nullable=False),
+      Column("created_at", DateTime))
+Table("farmers", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("name", String, index=True),
+      Column("country", String),
+      Column("region", String),
+      Column("farm_size_ha", Float, nullable=True),
+      Column("contact", String, nullable=True),
+      Column("identity_document", String, nullable=True),
+      Column("registration_status", Enum("pending", "verified", "rejected", name="registration_status_enum")),
+      Column("registered_at", DateTime),
+      Column("account_id", Integer, ForeignKey("farmer_accounts.id")),
+      Column("address", String, nullable=False))
+Table("crops", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("crop_name", String, index=True),
+      Column("variety", String, nullable=True),
+      Column("planting_date", Date),
+      Column("expected_harvest_month", Enum(*_MONTHS, name="monthenum")),
+      Column("farmer_id", Integer, ForeignKey("farmers.id")),
+      Column("farm_location", String, nullable=True),
+      Column("organic_certified", Boolean))
+Table("tokens", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("crop_id", Integer, ForeignKey("crops.id")),
+      Column("farmer_id", Integer, ForeignKey("farmers.id")),
+      Column("token_count", Integer),
+      Column("price_per_token", Integer),
+      Column("expected_yield_unit", String),
+      Column("expected_total_yield", Integer),
+      Column("expected_roi", Float),
+      Column("tokens_sold", Integer),
+      Column("is_funded", Boolean),
+      Column("funding_deadline", Date),
+      Column("currency", String),
+      Column("status", String),
+      Column("created_at", DateTime),
+      Column("token_status", Enum("pending", "verified", "rejected", name="token_status_enum")))
+Table("investments", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("token_id", Integer, ForeignKey("tokens.id")),
+      Column("investor_id", String),
+      Column("quantity", Integer),
+      Column("invested_at", DateTime))
+Table("contracts", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("token_id", Integer, ForeignKey("tokens.id")),
+      Column("farmer_id", Integer, ForeignKey("farmers.id")),
+      Column("investor_id", Integer, ForeignKey("investor_accounts.id")),
+      Column("quantity", Integer),
+      Column("price_per_token", Integer),
+      Column("total_value", Integer),
+      Column("delivery_type", String),
+      Column("expected_roi", Float),
+      Column("expected_harvest_month", Enum(*_MONTHS, name="monthenum")),
+      Column("payout_status", Enum("pending", "delivered", "defaulted", name="payout_status_enum")),
+      Column("created_at", DateTime))
+
+
+def _baseline(conn):
+    """Original schema, including the columns older databases got by hand."""
+    BASELINE.create_all(bind=conn, checkfirst=True)
+    _add_column_if_missing(conn, "farmers", "address", "VARCHAR NOT NULL DEFAULT ''")
+    _add_column_if_missing(conn, "tokens", "token_status", "VARCHAR(8) DEFAULT 'pending'")
+
+
+# Declared in models.__table_args__
+MARKETPLACE_INDEXES = {
+    "ix_farmers_country_region", "ix_farmers_account_id", "ix_crops_farmer_id",
+    "ix_tokens_status_roi", "ix_tokens_funded_roi", "ix_tokens_created_at_id",
+    "ix_tokens_funding_deadline", "ix_tokens_crop_id", "ix_tokens_farmer_status",
+    "ix_investments_investor_id", "ix_investments_token_id",
+    "ix_contracts_investor_created", "ix_contracts_token_id",
+}
+
+
+def _marketplace_indexes(conn):
+    """Composite indexes for the marketplace filters and the foreign keys."""
+    _create_indexes(conn, INDEXED_TABLES, MARKETPLACE_INDEXES)
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("ANALYZE"))
+
+
+# Lookup indexes for the IN (...) lists produced by search_index.substring_filter.
+SEARCH_INDEXES = {"ix_farmers_region", "ix_crops_variety"}
+
+
+def _search_indexes(conn):
+    _create_indexes(conn, INDEXED_TABLES, SEARCH_INDEXES)
+
+
+# Let a LIMITed keyset page walk the index in order instead of sorting every matching token.
+PAGE_ORDER_INDEXES = {"ix_tokens_status_created", "ix_tokens_funded_created"}
+
+
+def _page_order_indexes(conn):
+    _create_indexes(conn, INDEXED_TABLES, PAGE_ORDER_INDEXES)
+
+
+# Version 5: the outbox table, and the contract.created event chain_sync expects for a contract
+_CONTRACT_CREATED = "contract.created"
+_OUTBOX = Table("outbox", MetaData(),
+                Column("id", Integer, primary_key=True),
+                Column("topic", String, nullable=False),
+                Column("aggregate_id", Integer, nullable=False),
+                Column("idempotency_key", String, nullable=False, unique=True),
+                Column("payload", Text, nullable=False),
+                Column("status", String, nullable=False),
+                Column("attempts", Integer, nullable=False),
+                Column("next_attempt_at", DateTime, nullable=False),
+                Column("created_at", DateTime, nullable=False),
+                Column("sent_at", DateTime, nullable=True),
+                Column("result", String, nullable=True),
+                Column("last_error", String, nullable=True),
+                Index("ix_outbox_status_next", "status", "next_attempt_at"))
+
+
+def _epoch(day: date) -> int:
+    return int(datetime.combine(day, time(), tzinfo=timezone.utc).timestamp())
+
+
+def _contract_payload(row) -> dict:
+    """createInvestment arguments of a contract; the harvest is the first of its month on or after the deadline."""
+    harvest = None
+    if row.expected_harvest_month and row.funding_deadline:
+        number = _MONTHS.index(row.expected_harvest_month) + 1
+        year = row.funding_deadline.year + (number < row.funding_deadline.month)
+        harvest = date(year, number, 1)
+    return {
+        "contract_id": row.id,
+        "token_id": row.token_id,
+        "farmer_id": row.farmer_id,
+        "investor_id": row.investor_id,
+        "crop_name": row.crop_name or "",
+        "crop_variety": row.variety or "",
+        "price_per_token": row.price_per_token,
+        "token_count": row.quantity,
+        "expected_roi": round((row.expected_roi or 0) * 100),
+        "funding_deadline": _epoch(row.funding_deadline) if row.funding_deadline else 0,
+        "expected_harvest_date": _epoch(harvest) if harvest else 0,
+        "delivery_type": 0 if row.delivery_type == "money" else 1,
+    }
+
+
+def _chain_outbox(conn):
+    """Outbox table and per-contract chain sync state. Every existing contract is queued once: the chain
+    rejects contracts it already has, and chain_sync counts that as synced."""
+    _OUTBOX.create(bind=conn, checkfirst=True)
+    _add_column_if_missing(conn, "contracts", "chain_status", "VARCHAR DEFAULT 'pending'")
+    _add_column_if_missing(conn, "contracts", "chain_tx_hash", "VARCHAR")
+    _add_column_if_missing(conn, "contracts", "chain_synced_at", "DATETIME")
+
+    contracts, tokens, crops = (BASELINE.tables[name] for name in ("contracts", "tokens", "crops"))
+    queued = select(_OUTBOX.c.aggregate_id).where(_OUTBOX.c.topic == _CONTRACT_CREATED)
+    rows = conn.execute(
+        select(contracts, crops.c.crop_name, crops.c.variety, tokens.c.funding_deadline)
+        .select_from(contracts.outerjoin(tokens, contracts.c.token_id == tokens.c.id)
+                     .outerjoin(crops, tokens.c.crop_id == crops.c.id))
+        .where(contracts.c.id.not_in(queued))
+        .order_by(contracts.c.id)
+    ).all()
+    now = datetime.now(timezone.utc)
+    events = [{
+        "topic": _CONTRACT_CREATED, "aggregate_id": row.id, "idempotency_key": f"{_CONTRACT_CREATED}:{row.id}",
+        "payload": json.dumps(_contract_payload(row)), "status": "pending", "attempts": 0,
+        "next_attempt_at": now, "created_at": now,
+    } for row in rows]
+    for start in range(0, len(events), 1000):
+        conn.execute(insert(_OUTBOX), events[start:start + 1000])
+
+
+def _chain_read_model(conn):
+    """Tables chain_indexer fills from contract logs."""
+    for model in (models.ChainInvestment, models.ChainPurchase, models.ChainCheckpoint):
+        model.__table__.create(bind=conn, checkfirst=True)
+
+
+# The aggregates as they were defined at version 7 (including the stored total that version 9 drops), in SQL
+# of their own so later changes to aggregates.py never change what this migration does.
+_GROUP_KEYS = {
+    "total": "''",
+    "farmer": "COALESCE(CAST(t.farmer_id AS VARCHAR), 'None')",
+    "crop": "COALESCE(c.crop_name, '')",
+    "country": "COALESCE(f.country, '')",
+}
+_TOKEN_JOINS = "LEFT OUTER JOIN crops c ON c.id = t.crop_id LEFT OUTER JOIN farmers f ON f.id = t.farmer_id"
+
+
+def _funding_aggregates(conn):
+    """Aggregates table, filled from the existing tokens and investments."""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS funding_aggregates ("
+        "scope VARCHAR NOT NULL, "
+        "key VARCHAR NOT NULL, "
+        "tokens_offered INTEGER NOT NULL, "
+        "tokens_sold INTEGER NOT NULL, "
+        "amount_raised INTEGER NOT NULL, "
+        "purchases INTEGER NOT NULL, "
+        "PRIMARY KEY (scope, key))"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_funding_aggregates_scope_raised ON funding_aggregates (scope, amount_raised)"))
+    # Supply-side counters from the tokens themselves, purchases from the investments ledger
+    for scope, key in _GROUP_KEYS.items():
+        conn.execute(text(
+            "INSERT INTO funding_aggregates (scope, key, tokens_offered, tokens_sold, amount_raised, purchases) "
+            "SELECT :scope, g.key, COALESCE(SUM(g.offered), 0), COALESCE(SUM(g.sold), 0), "
+            "COALESCE(SUM(g.raised), 0), COALESCE(SUM(g.purchases), 0) FROM ("
+            f"SELECT {key} AS key, t.token_count AS offered, t.tokens_sold AS sold, "
+            f"t.tokens_sold * t.price_per_token AS raised, 0 AS purchases FROM tokens t {_TOKEN_JOINS} "
+            f"UNION ALL SELECT {key}, 0, 0, 0, 1 FROM investments i JOIN tokens t ON t.id = i.token_id {_TOKEN_JOINS}"
+            ") g GROUP BY g.key"
+        ), {"scope": scope})
+    conn.execute(text(
+        "INSERT INTO funding_aggregates (scope, key, tokens_offered, tokens_sold, amount_raised, purchases) "
+        "SELECT 'investor', CAST(i.investor_id AS VARCHAR), 0, COALESCE(SUM(i.quantity), 0), "
+        "COALESCE(SUM(i.quantity * t.price_per_token), 0), COUNT(*) "
+        "FROM investments i JOIN tokens t ON t.id = i.token_id GROUP BY i.investor_id"
+    ))
+
+
+# Contract totals per token for the farmer dashboard (crud.get_farmer_dashboard)
+def _farmer_contract_index(conn):
+    _create_indexes(conn, INDEXED_TABLES, {"ix_contracts_farmer_token"})
+
+
+def _unstored_funding_total(conn):
+    """The total is summed from the farmer rows when read (aggregates.get) instead of updated per purchase."""
+    conn.execute(text("DELETE FROM funding_aggregates WHERE scope = 'total'"))
+
+
+# (version, description, callable). Append only; never renumber an applied migration.
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "marketplace filter and foreign key indexes", _marketplace_indexes),
+    (3, "region and variety lookup indexes for substring search", _search_indexes),
+    (4, "keyset page order indexes on tokens", _page_order_indexes),
+    (5, "transactional outbox and contract chain sync state", _chain_outbox),
+    (6, "indexed on-chain investments, purchases and checkpoints", _chain_read_model),
+    (7, "precomputed funding aggregates", _funding_aggregates),
+    (8, "contracts by farmer index", _farmer_contract_index),
+    (9, "funding total summed from the farmer aggregates", _unstored_funding_total),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(bind=None) -> int:
+    """Return the highest applied migration version, or 0 for an unmanaged database."""
+    bind = bind or default_engine
+    with bind.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade(bind=None, target: int = None) -> list[int]:
+    """Apply every pending migration up to target (default: latest). Returns the versions applied."""
+    bind = bind or default_engine
+    applied = []
+    start = current_version(bind)
+    for version, description, migrate in MIGRATIONS:
+        if version <= start or (target is not None and version > target):
+            continue
+        with bind.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.now(timezone.utc)},
+            )
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    done = upgrade(target=target)
+    print(f"Applied migrations: {done or 'none'}; schema at version {current_version()}")
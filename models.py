@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Enum, Boolean, Float, DateTime
+from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, Enum, Boolean, Float, DateTime, Index
 from database import Base
 from schemas import MonthEnum, RegistrationStatusEnum
 from datetime import datetime, timezone
@@ -23,6 +23,13 @@ class Farmer(Base):
     
     account = relationship("FarmerAccount", backref="profile")
     tokens = relationship("Token", back_populates="farmer")
+    crops = relationship("Crop", viewonly=True)
+
+    __table_args__ = (
+        Index("ix_farmers_country_region", "country", "region"),
+        Index("ix_farmers_account_id", "account_id"),
+        Index("ix_farmers_region", "region"),
+    )
 
 
 class Crop(Base):
@@ -38,6 +45,11 @@ class Crop(Base):
     
     tokens = relationship("Token", back_populates="crop")
 
+    __table_args__ = (
+        Index("ix_crops_farmer_id", "farmer_id"),
+        Index("ix_crops_variety", "variety"),
+    )
+
 
 class TokenStatusEnum(str, Enum):
     pending = "pending"
@@ -66,6 +78,20 @@ class Token(Base):
     crop = relationship("Crop", back_populates="tokens")
     farmer = relationship("Farmer", back_populates="tokens")
 
+    # Marketplace filter path: /tokens_available defaults to status == "open",
+    # /tokens_all and funded_only filter on is_funded, both usually with min_roi.
+    __table_args__ = (
+        Index("ix_tokens_status_roi", "status", "expected_roi"),
+        Index("ix_tokens_funded_roi", "is_funded", "expected_roi"),
+        Index("ix_tokens_created_at_id", "created_at", "id"),
+        # Keyset pages (ORDER BY created_at, id LIMIT n) under the default status/funded filters
+        Index("ix_tokens_status_created", "status", "created_at", "id"),
+        Index("ix_tokens_funded_created", "is_funded", "created_at", "id"),
+        Index("ix_tokens_funding_deadline", "funding_deadline"),
+        Index("ix_tokens_crop_id", "crop_id"),
+        Index("ix_tokens_farmer_status", "farmer_id", "token_status"),
+    )
+
 
 class Investment(Base):
     __tablename__ = "investments"
@@ -75,6 +101,11 @@ class Investment(Base):
     quantity = Column(Integer)
     invested_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        Index("ix_investments_investor_id", "investor_id"),
+        Index("ix_investments_token_id", "token_id"),
+    )
+
 
 class PayoutStatusEnum(str, Enum):
     pending = "pending"
@@ -96,6 +127,107 @@ class Contract(Base):
     expected_harvest_month = Column(SqlEnum(MonthEnum))
     payout_status = Column(SqlEnum(PayoutStatusEnum, name="payout_status_enum"), default=PayoutStatusEnum.pending)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # On-chain sync state, maintained by chain_sync: "pending", "synced" or "failed"
+    chain_status = Column(String, default="pending")
+    chain_tx_hash = Column(String, nullable=True)
+    chain_synced_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_contracts_investor_created", "investor_id", "created_at", "id"),
+        Index("ix_contracts_token_id", "token_id"),
+        Index("ix_contracts_farmer_token", "farmer_id", "token_id"),
+    )
+
+
+class OutboxEvent(Base):
+    """An event to publish, written in the same transaction as the change it describes (see outbox.py)."""
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True)
+    topic = Column(String, nullable=False)
+    aggregate_id = Column(Integer, nullable=False)
+    idempotency_key = Column(String, nullable=False, unique=True)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, nullable=False, default="pending")  # pending, inflight, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime, nullable=True)
+    result = Column(String, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+
+class FundingAggregate(Base):
+    """Running funding totals for one group of tokens, maintained by aggregates.py as purchases commit.
+
+    scope is "farmer" (farmer id), "crop" (crop name), "country" or "investor" (investor id); for investors the
+    counters cover their own purchases only and tokens_offered stays 0. The overall total is not stored: it is
+    the sum of the farmer rows (aggregates.get).
+    """
+    __tablename__ = "funding_aggregates"
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    tokens_offered = Column(Integer, nullable=False, default=0)
+    tokens_sold = Column(Integer, nullable=False, default=0)
+    amount_raised = Column(Integer, nullable=False, default=0)  # sum of quantity * price_per_token
+    purchases = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_funding_aggregates_scope_raised", "scope", "amount_raised"),
+    )
+
+
+# Read model of the chain, maintained by chain_indexer from contract logs. Every row records the block it came
+# from, so a reorg can drop whatever was indexed past the fork.
+class ChainInvestment(Base):
+    """An InvestmentCreated log. contract_id is the on-chain contractId, i.e. contracts.id."""
+    __tablename__ = "chain_investments"
+    contract_id = Column(Integer, primary_key=True)
+    token_id = Column(Integer)
+    farmer_id = Column(Integer)
+    investor_id = Column(Integer)
+    farmer_address = Column(String)
+    crop_name = Column(String)
+    crop_variety = Column(String)
+    tokens_sold = Column(Integer, nullable=False, default=0)  # sum of its chain_purchases
+    block_number = Column(Integer, nullable=False)
+    block_hash = Column(String, nullable=False)
+    tx_hash = Column(String, nullable=False)
+    log_index = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_chain_investments_block", "block_number"),
+    )
+
+
+class ChainPurchase(Base):
+    """A TokensPurchased log."""
+    __tablename__ = "chain_purchases"
+    id = Column(Integer, primary_key=True)
+    contract_id = Column(Integer, nullable=False)
+    investor_address = Column(String)
+    quantity = Column(Integer, nullable=False)
+    block_number = Column(Integer, nullable=False)
+    block_hash = Column(String, nullable=False)
+    tx_hash = Column(String, nullable=False)
+    log_index = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_chain_purchases_contract", "contract_id"),
+        Index("ux_chain_purchases_log", "block_number", "log_index", unique=True),
+    )
+
+
+class ChainCheckpoint(Base):
+    """Last block indexed for a contract address, with its hash to detect reorgs."""
+    __tablename__ = "chain_checkpoints"
+    address = Column(String, primary_key=True)  # lower-case contract address
+    block_number = Column(Integer, nullable=False)
+    block_hash = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
 
 
 class FarmerAccount(Base):
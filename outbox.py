@@ -0,0 +1,65 @@
+# Transactional outbox. Writes that must reach the chain add an OutboxEvent in their own transaction, so an
+# event exists exactly when its change was committed; chain_sync drains the table afterwards.
+import json
+from datetime import date, datetime, time, timezone
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import models
+from schemas import MonthEnum
+
+CONTRACT_CREATED = "contract.created"
+
+MONTHS = list(MonthEnum)
+
+
+def _epoch(day: date) -> int:
+    return int(datetime.combine(day, time(), tzinfo=timezone.utc).timestamp())
+
+
+def harvest_date(month, after: date) -> date:
+    """First day of the harvest month on or after `after`."""
+    number = MONTHS.index(MonthEnum(month)) + 1
+    year = after.year if number >= after.month else after.year + 1
+    return date(year, number, 1)
+
+
+def contract_payload(contract, crop_name: str, crop_variety: str, funding_deadline: date) -> dict:
+    """Arguments of CropChainTokenizedInvestment.createInvestment for a contract, as JSON-friendly values."""
+    harvest = harvest_date(contract.expected_harvest_month, funding_deadline) \
+        if contract.expected_harvest_month and funding_deadline else None
+    return {
+        "contract_id": contract.id,
+        "token_id": contract.token_id,
+        "farmer_id": contract.farmer_id,
+        "investor_id": contract.investor_id,
+        "crop_name": crop_name or "",
+        "crop_variety": crop_variety or "",
+        "price_per_token": contract.price_per_token,
+        "token_count": contract.quantity,
+        "expected_roi": round((contract.expected_roi or 0) * 100),  # 9.5% -> 950
+        "funding_deadline": _epoch(funding_deadline) if funding_deadline else 0,
+        "expected_harvest_date": _epoch(harvest) if harvest else 0,
+        "delivery_type": 0 if contract.delivery_type == "money" else 1,
+    }
+
+
+def contract_events(payloads) -> list:
+    """OutboxEvent rows (as insert parameters) for contract_payload results."""
+    now = datetime.now(timezone.utc)
+    return [{
+        "topic": CONTRACT_CREATED,
+        "aggregate_id": payload["contract_id"],
+        "idempotency_key": f"{CONTRACT_CREATED}:{payload['contract_id']}",
+        "payload": json.dumps(payload),
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    } for payload in payloads]
+
+
+def add_contract_events(db: Session, payloads):
+    """Queue contract.created events in the current transaction; the caller commits."""
+    events = contract_events(payloads)
+    if events:
+        db.execute(insert(models.OutboxEvent), events)
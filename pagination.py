@@ -0,0 +1,89 @@
+# Keyset (cursor) pagination for the listing endpoints, ordered by (created_at, id).
+# Pagination metadata travels in response headers so the JSON body stays a plain list.
+import base64
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+EXPOSED_HEADERS = [NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER]
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError for anything that is not a cursor we issued."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset(query, created_column, id_column, limit: int = None, after: tuple = None):
+    """Order query by (created_column, id_column) and return the page that follows after."""
+    query = query.order_by(created_column, id_column)
+    if after is not None:
+        query = query.filter(tuple_(created_column, id_column) > tuple_(*after))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def next_cursor(rows, limit: int, created_attr: str = "created_at"):
+    """Cursor for the page after rows, or None once a short page shows the end was reached."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, created_attr), last.id)
+
+
+def set_page_headers(response, cursor: str = None, total: int = None):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+
+
+class CountCache:
+    """Small TTL/LRU cache of row counts keyed by (table, normalized filters)."""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (table, filters) -> (count, expires_at)
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, table: str, filters: dict, compute):
+        key = (table, tuple(sorted((k, v) for k, v in filters.items() if v is not None)))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+        count = compute()
+        with self._lock:
+            self._entries[key] = (count, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return count
+
+    def invalidate(self, *tables: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in tables]:
+                del self._entries[key]
+
+
+count_cache = CountCache()
@@ -0,0 +1,94 @@
+# Password hashing for the signup/login endpoints. bcrypt costs ~100-300 ms of CPU per call, so it runs in a
+# small process pool instead of the request workers; a login burst then queues there rather than stalling
+# every other endpoint. The queue is bounded: once MAX_PENDING calls are waiting, new ones fail with
+# HasherBusy (503) instead of piling up. Workers are spawned, so scripts that start the app in-process
+# need the usual `if __name__ == "__main__":` guard.
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+# bcrypt cost factor for new hashes (each +1 doubles the work); existing hashes verify at their own cost
+BCRYPT_ROUNDS = int(os.getenv("CROPCHAIN_BCRYPT_ROUNDS", 12))
+# Worker processes; 0 hashes in the calling thread's default executor instead (no extra processes)
+WORKERS = int(os.getenv("CROPCHAIN_HASH_WORKERS", os.cpu_count() or 1))
+# Calls queued or running before new ones are refused
+MAX_PENDING = int(os.getenv("CROPCHAIN_HASH_MAX_PENDING", max(WORKERS, 1) * 16))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+class PasswordHasher:
+    """Bounded async front end to a process pool running hash_password/verify_password."""
+
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy()
+            self.pending += 1
+            if self._executor is None and self.workers > 0:
+                # spawn: the app is multi-threaded by now, and forking a threaded process is unsafe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            if future is not None:
+                self.completed += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+hasher = PasswordHasher()
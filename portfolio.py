@@ -0,0 +1,123 @@
+# Investor portfolio analytics. An investor's contracts are loaded once as columns (one query, no ORM
+# objects) into NumPy arrays; expected payouts, exposure by crop / country / harvest month and the cash-flow
+# calendar are then array operations: a payout vector and one bincount per group, whatever the contract count.
+from datetime import date
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.orm import Session
+import models, outbox
+from schemas import MonthEnum
+
+MONTHS = list(MonthEnum)
+# Enum columns come back as member names ("january"); position in the year for each
+_MONTH_INDEX = {month.name: i for i, month in enumerate(MONTHS)}
+UNKNOWN = "Unknown"
+
+_CONTRACT_COLUMNS = select(
+    models.Contract.total_value,
+    models.Contract.expected_roi,
+    type_coerce(models.Contract.expected_harvest_month, String),
+    type_coerce(models.Contract.payout_status, String),
+    models.Contract.delivery_type,
+    models.Crop.crop_name,
+    models.Farmer.country,
+) \
+    .select_from(models.Contract) \
+    .outerjoin(models.Token, models.Token.id == models.Contract.token_id) \
+    .outerjoin(models.Crop, models.Crop.id == models.Token.crop_id) \
+    .outerjoin(models.Farmer, models.Farmer.id == models.Contract.farmer_id)
+
+
+def _labels(column) -> np.ndarray:
+    array = np.array(column, dtype=object)
+    array[array == None] = UNKNOWN  # elementwise
+    return array.astype(str)
+
+
+def _month_index(names: np.ndarray) -> np.ndarray:
+    """0-11 for each month name, -1 where unknown."""
+    distinct, index = np.unique(names, return_inverse=True)
+    return np.array([_MONTH_INDEX.get(name, -1) for name in distinct], dtype=np.int64)[index]
+
+
+def load(db: Session, investor_id: int) -> dict:
+    """The investor's contracts as columns: {name: ndarray}."""
+    # Core execution: plain rows without the ORM result machinery
+    rows = db.connection().execute(_CONTRACT_COLUMNS.where(models.Contract.investor_id == investor_id)).all()
+    value, roi, month, status, delivery, crop, country = zip(*rows) if rows else ([],) * 7
+    return {
+        "total_value": np.nan_to_num(np.array(value, dtype=np.float64)),
+        "expected_roi": np.nan_to_num(np.array(roi, dtype=np.float64)),
+        "month": _month_index(_labels(month)),
+        "pending": np.array(status, dtype=object) == models.PayoutStatusEnum.pending.name,
+        "cash": np.array(delivery, dtype=object) == "money",
+        "crop": _labels(crop),
+        "country": _labels(country),
+    }
+
+
+def _groups(keys: np.ndarray, invested: np.ndarray, payout: np.ndarray) -> list:
+    """Per distinct key: contracts, invested and expected payout, largest exposure first."""
+    if not len(keys):
+        return []
+    names, index = np.unique(keys, return_inverse=True)
+    counts = np.bincount(index, minlength=len(names))
+    invested_by = np.bincount(index, weights=invested, minlength=len(names))
+    payout_by = np.bincount(index, weights=payout, minlength=len(names))
+    total = invested.sum()
+    order = np.argsort(-invested_by, kind="stable")
+    return [{
+        "key": str(names[i]),
+        "contracts": int(counts[i]),
+        "invested": round(float(invested_by[i]), 2),
+        "expected_payout": round(float(payout_by[i]), 2),
+        "share": round(float(invested_by[i] / total * 100), 2) if total else 0.0,
+    } for i in order]
+
+
+def summarize(columns: dict, today: date = None) -> dict:
+    """Portfolio totals, exposure of the outstanding (pending payout) contracts and their cash-flow calendar."""
+    today = today or date.today()
+    value, roi = columns["total_value"], columns["expected_roi"]
+    payout = value * (1 + roi / 100)
+    pending = columns["pending"]
+    open_value, open_payout = value[pending], payout[pending]
+    invested = value.sum()
+
+    months = columns["month"][pending]
+    known = months >= 0
+    calendar_months = months[known]
+    cash = columns["cash"][pending][known]
+    contracts_by_month = np.bincount(calendar_months, minlength=12)
+    cash_by_month = np.bincount(calendar_months, weights=open_payout[known] * cash, minlength=12)
+    in_kind_by_month = np.bincount(calendar_months, weights=open_payout[known] * ~cash, minlength=12)
+    # This month's harvests are due now: their month started before today, but the payout is not in the past
+    calendar = sorted((
+        {
+            "month": MONTHS[i].value,
+            "expected_date": max(outbox.harvest_date(MONTHS[i], today), today),
+            "contracts": int(contracts_by_month[i]),
+            "cash_payout": round(float(cash_by_month[i]), 2),
+            "in_kind_value": round(float(in_kind_by_month[i]), 2),
+        } for i in range(12) if contracts_by_month[i]
+    ), key=lambda entry: entry["expected_date"])
+
+    month_names = np.array([month.value for month in MONTHS] + [UNKNOWN])[months]
+    return {
+        "contracts": int(len(value)),
+        "invested": round(float(invested), 2),
+        "expected_payout": round(float(payout.sum()), 2),
+        "expected_profit": round(float(payout.sum() - invested), 2),
+        "weighted_roi": round(float((roi * value).sum() / invested), 2) if invested else 0.0,
+        "outstanding_contracts": int(pending.sum()),
+        "outstanding_invested": round(float(open_value.sum()), 2),
+        "outstanding_payout": round(float(open_payout.sum()), 2),
+        "by_crop": _groups(columns["crop"][pending], open_value, open_payout),
+        "by_country": _groups(columns["country"][pending], open_value, open_payout),
+        "by_harvest_month": _groups(month_names, open_value, open_payout),
+        "calendar": calendar,
+    }
+
+
+def portfolio_summary(db: Session, investor_id: int, today: date = None) -> dict:
+    return summarize(load(db, investor_id), today)
@@ -0,0 +1,106 @@
+# In-process cache of ready-to-send JSON bodies for the marketplace listings (/tokens_available, /tokens_all).
+# Entries remember which tokens they contain so a write to one token only drops the pages showing it;
+# writes that can change which tokens match a filter (new token, funded flip) clear everything.
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import NamedTuple
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict
+    token_ids: frozenset
+    expires_at: float
+
+
+class ResponseCache:
+    """LRU + TTL cache of serialized responses keyed by normalized request parameters."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_token = defaultdict(set)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a response computed before a write is never stored after it.
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(route: str, params: dict) -> tuple:
+        return (route,) + tuple(sorted((k, str(v)) for k, v in params.items() if v is not None))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body: bytes, headers: dict, token_ids, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            entry = CachedResponse(body, headers, frozenset(token_ids), time.monotonic() + self.ttl)
+            self._entries[key] = entry
+            for token_id in entry.token_ids:
+                self._keys_by_token[token_id].add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tokens(self, token_ids):
+        """Drop every cached response that contains one of token_ids."""
+        with self._lock:
+            self.generation += 1
+            for token_id in token_ids:
+                for key in list(self._keys_by_token.get(token_id, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_token.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        for token_id in entry.token_ids:
+            keys = self._keys_by_token.get(token_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_token[token_id]
+
+
+marketplace = ResponseCache()
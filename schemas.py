@@ -176,6 +176,8 @@ class ContractOut(BaseModel):
     created_at: datetime
     crop_name: Optional[str] = None
     crop_variety: Optional[str] = None
+    chain_status: Optional[str] = None  # outbox sync: pending, synced or failed
+    chain_block: Optional[int] = None  # block of its InvestmentCreated log, once indexed
 
     model_config = {
         "from_attributes": True,
@@ -227,4 +229,77 @@ class InvestorAccountOut(BaseModel):
 class AuthWithInvestor(BaseModel):
     access_token: str
     token_type: str
-    investor: InvestorAccountOut
\ No newline at end of file
+    investor: InvestorAccountOut
+
+
+class FundingStats(BaseModel):
+    scope: str
+    key: str
+    tokens_offered: int
+    tokens_sold: int
+    amount_raised: int
+    purchases: Optional[int] = None
+    tokens_left: Optional[int] = None
+    funding_percentage: Optional[float] = None
+
+
+class PortfolioGroup(BaseModel):
+    key: str
+    contracts: int
+    invested: float
+    expected_payout: float
+    share: float  # percent of the outstanding invested amount
+
+
+class CashFlowMonth(BaseModel):
+    month: str
+    expected_date: date
+    contracts: int
+    cash_payout: float  # money delivery
+    in_kind_value: float  # product delivery
+
+
+class PortfolioSummary(BaseModel):
+    contracts: int
+    invested: float
+    expected_payout: float
+    expected_profit: float
+    weighted_roi: float
+    outstanding_contracts: int
+    outstanding_invested: float
+    outstanding_payout: float
+    by_crop: list[PortfolioGroup]
+    by_country: list[PortfolioGroup]
+    by_harvest_month: list[PortfolioGroup]
+    calendar: list[CashFlowMonth]
+
+
+class DashboardToken(TokenOut):
+    contracts: int = 0
+    contract_value: int = 0  # sum of its contracts' total_value
+
+
+class ContractTotals(BaseModel):
+    contracts: int
+    tokens: int  # quantity bought through contracts
+    total_value: int
+    pending: int  # contracts by payout status
+    delivered: int
+    defaulted: int
+
+
+class FarmerDashboard(BaseModel):
+    farmer_id: int
+    name: str
+    country: str
+    region: str
+    address: str
+    farm_size_ha: Optional[float]
+    contact: Optional[str]
+    identity_document: Optional[str]
+    registration_status: RegistrationStatusEnum
+    registered_at: datetime
+    crops: list[CropOut]
+    tokens: list[DashboardToken]  # verified only
+    funding: FundingStats
+    contracts: ContractTotals
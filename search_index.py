@@ -0,0 +1,133 @@
+# In-process trigram index for the marketplace substring filters (country, region, crop name, variety).
+# Leading-wildcard ILIKE cannot use a B-tree index, so get_filtered_tokens asks this module which distinct
+# column values contain the search text and filters with an indexed IN (...) instead.
+# A table's indexes are rebuilt from its distinct values when the crud/bulk import writes to that table have
+# bumped its http_cache data version, and at least every CROPCHAIN_SEARCH_REFRESH seconds for writes made by
+# other processes (0 trusts the versions alone). A search matching more than MAX_IN_VALUES distinct values is
+# sent to the database as the plain ILIKE.
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from sqlalchemy import select
+import http_cache, models
+
+REFRESH_SECONDS = float(os.getenv("CROPCHAIN_SEARCH_REFRESH", "30"))
+MAX_IN_VALUES = 500
+
+# filter name -> (table, indexed column)
+SEARCH_FIELDS = {
+    "country": (models.Farmer.__table__, models.Farmer.country),
+    "region": (models.Farmer.__table__, models.Farmer.region),
+    "crop_name": (models.Crop.__table__, models.Crop.crop_name),
+    "crop_variety": (models.Crop.__table__, models.Crop.variety),
+}
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _ascii_fold(value: str) -> str:
+    # SQLite's lower() and LIKE only fold ASCII; match it so results stay identical to ILIKE.
+    return value.translate(_ASCII_LOWER)
+
+
+def _trigrams(value: str) -> set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TrigramIndex:
+    """Case-insensitive substring lookup over a growing set of distinct strings."""
+
+    def __init__(self, fold=str.lower):
+        self.fold = fold
+        self._values = {}  # folded value -> original spellings
+        self._postings = defaultdict(set)  # trigram -> folded values containing it
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, value: str):
+        if not value:
+            return
+        key = self.fold(value)
+        spellings = self._values.get(key)
+        if spellings is None:
+            self._values[key] = {value}
+            for gram in _trigrams(key):
+                self._postings[gram].add(key)
+        else:
+            spellings.add(value)
+
+    def search(self, needle: str) -> list[str]:
+        """Return every indexed value that contains needle, ignoring case."""
+        needle = self.fold(needle)
+        grams = _trigrams(needle)
+        if grams:
+            postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        else:
+            candidates = self._values
+        return [spelling for key in candidates if needle in key for spelling in self._values[key]]
+
+
+class CatalogSearch:
+    """Trigram indexes for one database, rebuilt per table when its data version changes or they get old."""
+
+    def __init__(self, fold=str.lower):
+        self.fold = fold
+        self.indexes = {field: TrigramIndex(fold) for field in SEARCH_FIELDS}
+        self._built = {}  # table name -> (data version, monotonic time) of the last rebuild
+        self._lock = threading.RLock()
+
+    def refresh(self, db, field: str):
+        # Rows can commit out of primary key order and values can change, so a stale table is rebuilt
+        # whole; one query per field over the lookup indexes of its distinct values.
+        table, _ = SEARCH_FIELDS[field]
+        with self._lock:
+            version = http_cache.versions.snapshot((table.name,))
+            built = self._built.get(table.name)
+            if built is not None and built[0] == version and (
+                    REFRESH_SECONDS <= 0 or time.monotonic() - built[1] < REFRESH_SECONDS):
+                return
+            for f, (t, column) in SEARCH_FIELDS.items():
+                if t is not table:
+                    continue
+                index = TrigramIndex(self.fold)
+                for (value,) in db.execute(select(column).distinct()):
+                    index.add(value)
+                self.indexes[f] = index
+            # The version read before the queries: a write committing meanwhile triggers another rebuild
+            self._built[table.name] = (version, time.monotonic())
+
+    def search(self, db, field: str, needle: str) -> list[str]:
+        with self._lock:
+            self.refresh(db, field)
+            return self.indexes[field].search(needle)
+
+
+_catalogs = weakref.WeakKeyDictionary()
+_catalogs_lock = threading.Lock()
+
+
+def catalog_for(bind) -> CatalogSearch:
+    """Return the search catalog for an engine, building an empty one on first use."""
+    with _catalogs_lock:
+        catalog = _catalogs.get(bind)
+        if catalog is None:
+            fold = _ascii_fold if bind.dialect.name == "sqlite" else str.lower
+            catalog = _catalogs[bind] = CatalogSearch(fold)
+        return catalog
+
+
+def substring_filter(db, field: str, needle: str):
+    """SQL criterion equivalent to column ILIKE '%needle%', resolved through the trigram index."""
+    _, column = SEARCH_FIELDS[field]
+    if "%" in needle or "_" in needle:
+        # LIKE wildcards in user input keep their legacy meaning.
+        return column.ilike(f"%{needle}%")
+    values = catalog_for(db.get_bind()).search(db, field, needle)
+    if len(values) > MAX_IN_VALUES:
+        # A short needle matching most values: a huge IN list costs more to bind and plan than the scan
+        return column.ilike(f"%{needle}%")
+    return column.in_(values)
@@ -0,0 +1,74 @@
+# Shared fixtures: each test gets its own migrated SQLite database in the temp directory, and the app's
+# sessions and in-process caches are pointed at (or emptied for) that database.
+import os
+import tempfile
+
+# Before the app modules are imported, so their engine never opens ./cropchain.db
+os.environ["CROPCHAIN_DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='cropchain-test-')}/app.db"
+os.environ.setdefault("CROPCHAIN_BCRYPT_ROUNDS", "4")
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+import auth_cache, http_cache, migrations, models, pagination, response_cache
+from jwt_auth import create_access_token
+from benchmarks import dataset
+from benchmarks.common import app_client, populate, temp_engine
+
+
+@pytest.fixture(autouse=True)
+def _empty_caches(monkeypatch):
+    # Account ids and counts cached by an earlier test belong to another database
+    auth_cache.tokens.clear()
+    auth_cache.principals.clear()
+    response_cache.marketplace.clear()
+    monkeypatch.setattr(pagination, "count_cache", pagination.CountCache())
+    # One process: ETags follow the write counters alone, so a 304 check cannot straddle an epoch boundary
+    monkeypatch.setattr(http_cache, "ETAG_WINDOW_SECONDS", 0)
+
+
+@pytest.fixture
+def engine():
+    engine, _ = temp_engine("test")
+    migrations.upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def SessionLocal(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(SessionLocal):
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def catalog(engine):
+    """A small synthetic marketplace (benchmarks.common.populate) plus investor@example.com (id 1)."""
+    populate(engine, tokens=1000)
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [{"email": "investor@example.com", "hashed_password": "x"}])
+    return engine
+
+
+@pytest.fixture
+def marketplace(engine):
+    """The load-test marketplace (benchmarks.dataset) at 20k rows: farmerN@/investorN@example.com accounts."""
+    dataset.generate(engine, 20_000)
+    return engine
+
+
+@pytest.fixture
+def client(SessionLocal):
+    with app_client(SessionLocal) as client:
+        yield client
+
+
+@pytest.fixture
+def bearer():
+    """Authorization headers for an account email."""
+    return lambda email: {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
@@ -0,0 +1,29 @@
+# Signup and login: every password hash and check goes through password_hashing.hasher, whose bounded queue
+# answers 503 when full.
+import pytest
+import password_hashing
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    hasher = password_hashing.PasswordHasher(workers=0)  # the default executor: no processes to spawn here
+    monkeypatch.setattr(password_hashing, "hasher", hasher)
+    return hasher
+
+
+@pytest.mark.parametrize("role", ["farmer", "investor"])
+def test_passwords_are_hashed_and_checked_by_the_hasher(client, engine, hasher, role):
+    account = {"email": f"new-{role}@example.com", "password": "correct horse"}
+    assert client.post(f"/{role}_signup", json=account).status_code == 200
+    assert client.post(f"/{role}_login", json=account).status_code == 200
+    assert client.post(f"/{role}_login", json={**account, "password": "wrong"}).status_code == 401
+    assert hasher.completed == 3
+    with engine.connect() as conn:
+        stored = conn.exec_driver_sql(f"SELECT hashed_password FROM {role}_accounts").scalar()
+    assert password_hashing.verify_password("correct horse", stored)
+
+
+def test_a_full_queue_sheds_logins(client, hasher):
+    hasher.max_pending = 0
+    response = client.post("/investor_signup", json={"email": "new@example.com", "password": "x"})
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
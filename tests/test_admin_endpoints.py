@@ -0,0 +1,41 @@
+# /export and /bulk_import are operator endpoints: off without CROPCHAIN_ADMIN_KEY, and refused without the key.
+import pytest
+import main
+
+FARMERS_CSV = "ref,name,country,region,address\n" + "".join(
+    f"F{i},Member {i},Kenya,Central,{i} Coop Lane\n" for i in range(10))
+
+
+@pytest.fixture
+def admin_key(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_KEY", "test-admin-key")
+    return "test-admin-key"
+
+
+def _upload():
+    return {"farmers": ("farmers.csv", FARMERS_CSV.encode(), "text/csv")}
+
+
+def test_export_is_off_without_a_configured_key(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_KEY", None)
+    assert client.get("/export/contracts").status_code == 404
+    assert client.get("/export/contracts", headers={"X-Admin-Key": ""}).status_code == 404
+
+
+def test_export_requires_the_key(client, catalog, admin_key):
+    assert client.get("/export/contracts").status_code == 403
+    assert client.get("/export/contracts", headers={"X-Admin-Key": "wrong"}).status_code == 403
+    response = client.get("/export/contracts?format=csv", headers={"X-Admin-Key": admin_key})
+    assert response.status_code == 200 and response.text.startswith("id,"), response.text[:200]
+
+
+def test_bulk_import_is_off_without_a_configured_key(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_KEY", None)
+    assert client.post("/bulk_import", files=_upload()).status_code == 404
+
+
+def test_bulk_import_requires_the_key(client, admin_key):
+    assert client.post("/bulk_import", files=_upload()).status_code == 403
+    assert client.post("/bulk_import", files=_upload(), headers={"X-Admin-Key": "wrong"}).status_code == 403
+    response = client.post("/bulk_import", files=_upload(), headers={"X-Admin-Key": admin_key})
+    assert response.status_code == 200 and response.json()["inserted"]["farmers"] == 10, response.text
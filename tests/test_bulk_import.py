@@ -0,0 +1,59 @@
+# Bulk onboarding: references between sheets resolve, and bad rows are reported by line without failing the rest.
+import io
+import json
+import bulk_import, models
+
+
+def _ndjson(*rows):
+    return bulk_import.sheet_rows(io.StringIO("".join(json.dumps(row) + "\n" for row in rows)), "ndjson")
+
+
+FARMER = {"name": "Member", "country": "Kenya", "region": "Central", "address": "1 Coop Lane"}
+CROP = {"crop_name": "Coffee", "variety": "Arabica", "planting_date": "2025-03-01",
+        "expected_harvest_month": "September"}
+TOKEN = {"token_count": 1000, "price_per_token": 10, "expected_yield_unit": "kg", "expected_total_yield": 10_000,
+         "expected_roi": 9.5, "funding_deadline": "2026-03-01"}
+
+
+def test_refs_resolve_across_sheets(db):
+    report = bulk_import.import_sheets(
+        db,
+        farmers=_ndjson({**FARMER, "ref": "F1"}, {**FARMER, "ref": "F2"}),
+        crops=_ndjson({**CROP, "ref": "C1", "farmer_ref": "F2"}),
+        tokens=_ndjson({**TOKEN, "crop_ref": "C1"}, {**TOKEN, "crop_ref": "C1"}),
+    )
+    assert report.error_count == 0, report.errors
+    assert report.inserted == {"farmers": 2, "crops": 1, "tokens": 2}
+    crop = db.query(models.Crop).one()
+    tokens = db.query(models.Token).all()
+    assert {token.crop_id for token in tokens} == {crop.id}
+    assert {token.farmer_id for token in tokens} == {crop.farmer_id}
+    assert all(token.token_status == models.TokenStatusEnum.pending for token in tokens)
+
+
+def test_bad_rows_are_reported_and_skipped(db):
+    report = bulk_import.import_sheets(
+        db,
+        farmers=_ndjson({**FARMER, "ref": "F1"}, {**FARMER, "ref": "F1"}, {"ref": "F3"}),
+        crops=_ndjson({**CROP, "farmer_ref": "F1"}, {**CROP, "farmer_ref": "nope"}),
+        tokens=_ndjson({**TOKEN, "crop_ref": "nope"}, {**TOKEN, "crop_id": 999}),
+    )
+    assert report.inserted == {"farmers": 1, "crops": 1, "tokens": 0}
+    assert [(error.sheet, error.line) for error in report.errors] == [
+        ("farmers", 2), ("farmers", 3), ("crops", 2), ("tokens", 1), ("tokens", 2)]
+    assert report.errors[0].message == "Duplicate ref"
+
+
+def test_direct_ids_are_checked_after_coercion(db):
+    bulk_import.import_sheets(db, farmers=_ndjson(FARMER), crops=_ndjson({**CROP, "farmer_id": 1}))
+    report = bulk_import.import_sheets(
+        db,
+        crops=_ndjson({**CROP, "farmer_id": 1.0}, {**CROP, "farmer_id": 5.0}, {**CROP, "farmer_id": -1}),
+        tokens=_ndjson({**TOKEN, "crop_id": "1"}, {**TOKEN, "crop_id": 1.0}, {**TOKEN, "crop_id": 7.0},
+                       {**TOKEN, "crop_id": -1}),
+    )
+    assert report.inserted == {"farmers": 0, "crops": 1, "tokens": 2}
+    assert [(error.sheet, error.line, error.message) for error in report.errors] == [
+        ("crops", 2, "Farmer 5 not found"), ("crops", 3, "Farmer -1 not found"),
+        ("tokens", 3, "Crop 7 not found"), ("tokens", 4, "Crop -1 not found")]
+    assert {token.farmer_id for token in db.query(models.Token)} == {1}
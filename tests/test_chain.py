@@ -0,0 +1,101 @@
+# On-chain sync against the fake chain: every contract lands exactly once despite transient errors and a
+# crashed worker, and the indexer's tables match the chain again after a reorg deeper than REORG_DEPTH.
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import func, update
+import chain_indexer, chain_sync, crud, models, schemas
+from benchmarks.bench_chain_sync import drain, sync_worker
+from benchmarks.fake_chain import FakeChain
+
+CONTRACTS = 200
+
+
+@pytest.fixture
+def contracts(catalog, SessionLocal):
+    with catalog.begin() as conn:
+        conn.execute(models.Token.__table__.update().values(token_count=100_000, tokens_sold=0, is_funded=False))
+    with SessionLocal() as db:
+        for first in range(0, CONTRACTS, crud.MAX_BATCH_CONTRACTS):
+            crud.create_contracts(db=db, investor_id=1, items=[
+                schemas.ContractCreate(token_id=1 + i % 100, quantity=1, delivery_type="money")
+                for i in range(first, min(first + crud.MAX_BATCH_CONTRACTS, CONTRACTS))])
+    return CONTRACTS
+
+
+def _all_synced(SessionLocal, chain):
+    with SessionLocal() as db:
+        statuses = dict(db.query(models.Contract.chain_status, func.count()).group_by(models.Contract.chain_status).all())
+        status = chain_sync.sync_status(db)
+    assert statuses == {"synced": CONTRACTS}, statuses
+    assert status["events"] == {"pending": 0, "inflight": 0, "sent": CONTRACTS, "failed": 0}, status
+    assert sorted(chain.investments) == list(range(1, CONTRACTS + 1))
+
+
+def test_sync_lands_every_contract_once(SessionLocal, contracts, monkeypatch):
+    monkeypatch.setattr(chain_sync, "BACKOFF_SECONDS", 0.001)
+    chain = FakeChain(failure_rate=0.2, seed=1)
+    chain.investments[7] = "0xbefore"  # sent by an earlier run whose result was never recorded
+
+    # A worker that claimed a batch and died: its lease expires and the events are taken over
+    assert len(sync_worker(SessionLocal, chain, batch_size=50)._claim()) == 50
+    with SessionLocal() as db:
+        db.execute(update(models.OutboxEvent).where(models.OutboxEvent.status == "inflight")
+                   .values(next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+        db.commit()
+
+    worker = sync_worker(SessionLocal, chain, batch_size=100, concurrency=16)
+
+    async def drain_with_retries():
+        while True:
+            await drain(worker)
+            with SessionLocal() as db:
+                if not db.query(models.OutboxEvent).filter(models.OutboxEvent.status != "sent").count():
+                    return
+            await asyncio.sleep(0.01)
+    asyncio.run(drain_with_retries())
+    _all_synced(SessionLocal, chain)
+    assert worker.stats()["retried"] > 0 and worker.stats()["already_on_chain"] == 1
+
+    sends = chain.sends
+    asyncio.run(drain(sync_worker(SessionLocal, chain)))
+    assert chain.sends == sends, "a second run re-sent synced contracts"
+
+
+def _matches_chain(SessionLocal, chain):
+    logs = chain.get_logs({"address": chain.address, "fromBlock": "0x0", "toBlock": hex(len(chain.blocks))})
+    created = {int(log["data"][2:66], 16) for log in logs if log["topics"][0] == chain_indexer.INVESTMENT_CREATED}
+    sold = Counter()
+    for log in logs:
+        if log["topics"][0] == chain_indexer.TOKENS_PURCHASED:
+            sold[int(log["data"][2:66], 16)] += int(log["data"][130:194], 16)
+    with SessionLocal() as db:
+        indexed = dict(db.query(models.ChainInvestment.contract_id, models.ChainInvestment.tokens_sold).all())
+        purchases = db.query(models.ChainPurchase).count()
+    assert indexed == {contract_id: sold[contract_id] for contract_id in created}
+    assert purchases == sum(len(block["logs"]) for block in chain.blocks) - len(created)
+
+
+def test_indexer_follows_the_chain_through_a_reorg(SessionLocal, contracts):
+    rng = random.Random(7)
+    chain = FakeChain()
+    asyncio.run(drain(sync_worker(SessionLocal, chain, batch_size=100, concurrency=8)))
+    purchase = lambda n: [chain.purchase(rng.randint(1, CONTRACTS), f"0x{rng.getrandbits(160):040x}", rng.randint(1, 5))
+                          for _ in range(n)]
+    purchase(200)
+    indexer = chain_indexer.ChainIndexer(sync_worker(SessionLocal, chain).chain, session_factory=SessionLocal,
+                                         block_range=50)
+    asyncio.run(drain(indexer))
+    _matches_chain(SessionLocal, chain)
+    with SessionLocal() as db:
+        rows = crud.get_contract_rows_by_investor(db, investor_id=1)
+    assert len(rows) == CONTRACTS and all(row.chain_block is not None for row in rows)
+
+    chain.reorg(chain_indexer.REORG_DEPTH + 8, keep=lambda log: rng.random() < 0.5)
+    purchase(30)
+    asyncio.run(drain(indexer))
+    _matches_chain(SessionLocal, chain)
+    assert indexer.reorgs == 1
+    assert asyncio.run(indexer.run_once()) == 0
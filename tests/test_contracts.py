@@ -0,0 +1,181 @@
+# Purchases: nothing oversold under concurrent buyers, batches all-or-nothing and consistent with single
+# purchases, aggregates kept in step, and /my_contracts at a constant number of statements.
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, func, insert
+from sqlalchemy.exc import OperationalError
+import aggregates, crud, database, main, models, schemas
+
+
+def _item(token_id: int, quantity: int = 1, delivery_type: str = "money"):
+    return schemas.ContractCreate(token_id=token_id, quantity=quantity, delivery_type=delivery_type)
+
+
+@pytest.fixture
+def open_tokens(catalog):
+    """Tokens 1-50 open with 300 tokens each, aggregates rebuilt to match."""
+    with catalog.begin() as conn:
+        conn.execute(models.Token.__table__.update().where(models.Token.id <= 50).values(
+            token_count=300, tokens_sold=0, is_funded=False, status="open"))
+    return catalog
+
+
+def test_my_contracts_statements_do_not_grow(client, catalog, engine, bearer):
+    counts = [1, 10, 100]
+    with engine.begin() as conn:
+        conn.execute(insert(models.InvestorAccount), [
+            {"email": f"holder{n}@example.com", "hashed_password": "x"} for n in range(len(counts))])
+        ids = dict(conn.execute(models.InvestorAccount.__table__.select().with_only_columns(
+            models.InvestorAccount.email, models.InvestorAccount.id)).all())
+        for n, count in enumerate(counts):
+            conn.execute(insert(models.Contract), [{
+                "token_id": 1 + i, "farmer_id": 1, "investor_id": ids[f"holder{n}@example.com"], "quantity": 1,
+                "price_per_token": 10, "total_value": 10, "delivery_type": "money", "expected_roi": 8.0,
+                "expected_harvest_month": models.MonthEnum.june, "payout_status": models.PayoutStatusEnum.pending,
+                "created_at": datetime(2025, 1, 1) + timedelta(seconds=i),
+            } for i in range(count)])
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    issued = set()
+    for n, count in enumerate(counts):
+        headers = bearer(f"holder{n}@example.com")
+        client.get("/my_contracts?limit=500", headers=headers)  # warm the account lookup
+        statements.clear()
+        response = client.get("/my_contracts?limit=500", headers=headers)
+        assert response.status_code == 200 and len(response.json()) == count
+        issued.add(len(statements))
+    assert len(issued) == 1, issued
+
+
+def test_batch_is_all_or_nothing(db, open_tokens):
+    sold = lambda: (db.query(func.sum(models.Token.tokens_sold)).scalar(), db.query(models.Contract).count())
+    results = crud.create_contracts(db=db, items=[_item(1), _item(2, 2), _item(1, 3)], investor_id=1)
+    assert [(c.token_id, c.quantity) for c in results] == [(1, 1), (2, 2), (1, 3)]
+    before = sold()
+    with pytest.raises(ValueError, match="Token 3"):
+        crud.create_contracts(db=db, items=[_item(2), _item(3, 301)], investor_id=1)
+    assert sold() == before
+
+
+def test_batch_and_single_purchases_return_the_same_created_at(client, open_tokens, bearer):
+    headers = bearer("investor@example.com")
+    single = client.post("/create_contract", headers=headers, json=_item(1).model_dump())
+    batch = client.post("/create_contracts_batch", headers=headers, json=[_item(2).model_dump()])
+    assert single.status_code == 200 and batch.status_code == 200, (single.text, batch.text)
+    stored = {c["id"]: c["created_at"] for c in client.get("/my_contracts", headers=headers).json()}
+    single, batched = single.json(), batch.json()[0]
+    # Naive UTC everywhere: no "Z" or offset on either, and the batch returns what is stored
+    assert len(single["created_at"]) == len(batched["created_at"])
+    assert not batched["created_at"].endswith("Z") and "+" not in batched["created_at"]
+    assert stored == {single["id"]: single["created_at"], batched["id"]: batched["created_at"]}
+
+
+def test_concurrent_buyers_never_oversell(SessionLocal, open_tokens):
+    errors = []
+
+    def buyer(seed):
+        rng = random.Random(seed)
+        while True:
+            with SessionLocal() as db:
+                try:
+                    crud.create_contract(db=db, investor_id=1, contract_data=_item(1, rng.randint(1, 3)))
+                except ValueError:
+                    if crud.get_token_row(db, 1).tokens_left == 0:
+                        return
+                except Exception as e:
+                    errors.append(repr(e))
+                    return
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:5]
+    with SessionLocal() as db:
+        token = db.get(models.Token, 1)
+        contracted = db.query(func.sum(models.Contract.quantity)).filter(models.Contract.token_id == 1).scalar()
+        invested = db.query(func.sum(models.Investment.quantity)).filter(models.Investment.token_id == 1).scalar()
+    assert token.tokens_sold == contracted == invested == token.token_count
+    assert token.is_funded and token.status == "funded"
+
+
+def test_aggregates_follow_concurrent_purchases(SessionLocal, open_tokens):
+    with SessionLocal() as db:
+        aggregates.rebuild(db)
+    errors = []
+
+    def buyer(seed):
+        rng = random.Random(seed)
+        for _ in range(20):
+            with SessionLocal() as db:
+                try:
+                    kind = rng.random()
+                    if kind < 0.4:
+                        crud.create_contract(db=db, investor_id=1, contract_data=_item(rng.randint(1, 50), rng.randint(1, 5)))
+                    elif kind < 0.7:
+                        crud.create_contracts(db=db, investor_id=1, items=[
+                            _item(rng.randint(1, 50), rng.randint(1, 5), "product") for _ in range(3)])
+                    else:
+                        crud.invest_in_token(db=db, token_id=rng.randint(1, 50), investor_id="1",
+                                             quantity=rng.randint(1, 5))
+                except ValueError:
+                    pass
+                except Exception as e:
+                    errors.append(repr(e))
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:5]
+    with SessionLocal() as db:
+        assert aggregates.check(db) == []
+        # No stored total row for every purchase to update: it is summed from the farmer rows
+        assert db.get(models.FundingAggregate, ("total", "")) is None
+        assert aggregates.stats(db, "total")["tokens_sold"] == db.query(func.sum(models.Token.tokens_sold)).scalar()
+
+
+def test_async_contention_backoff_does_not_block_the_loop(engine, open_tokens, monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    write, failures = crud._create_contract, [3]
+
+    def contended(db, *args):
+        if failures[0]:
+            failures[0] -= 1
+            raise OperationalError("UPDATE tokens", {}, Exception("database is locked"))
+        return write(db, *args)
+
+    monkeypatch.setattr(crud, "_create_contract", contended)
+    monkeypatch.setattr(crud, "PURCHASE_BACKOFF_SECONDS", 0.1)
+    monkeypatch.setattr(database, "ASYNC_DB", True)
+
+    async def run():
+        async_engine = create_async_engine(database.async_url(str(engine.url)))
+        stall, running = 0.0, True
+
+        async def ticker():
+            nonlocal stall
+            while running:
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                stall = max(stall, time.perf_counter() - start - 0.005)
+
+        tick = asyncio.create_task(ticker())
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            contract = await main.run_db(session, crud.create_contract, contract_data=_item(1), investor_id=1)
+        running = False
+        await tick
+        await async_engine.dispose()
+        return contract, stall
+
+    contract, stall = asyncio.run(run())
+    assert contract.token_id == 1 and not failures[0]
+    # Sleeping in the retry itself would stall the loop for up to 0.1 + 0.2 + 0.4 s
+    assert stall < 0.1, stall
@@ -0,0 +1,86 @@
+# Identity documents: stored once per content, refused past the size limit without leftovers (oversized upload
+# requests before their body is read), read by range.
+import asyncio
+import os
+import pytest
+from sqlalchemy import insert
+from starlette.datastructures import UploadFile
+import document_store, models
+
+
+@pytest.fixture
+def scan(tmp_path):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(os.urandom(3 * document_store.CHUNK_SIZE + 123))
+    return path
+
+
+def _store(path, backend, max_bytes):
+    return asyncio.run(document_store.store(UploadFile(open(path, "rb"), filename="scan.pdf"), backend, max_bytes))
+
+
+def test_documents_are_deduplicated(scan, tmp_path):
+    backend = document_store.LocalDiskBackend(str(tmp_path / "store"))
+    first, second = _store(scan, backend, scan.stat().st_size), _store(scan, backend, scan.stat().st_size)
+    stored = [f for _, _, files in os.walk(backend.root) for f in files]
+    assert first == second and stored == [first.digest]
+
+
+def test_oversized_documents_are_refused(scan, tmp_path):
+    backend = document_store.LocalDiskBackend(str(tmp_path / "store"))
+    with pytest.raises(document_store.DocumentTooLarge):
+        _store(scan, backend, scan.stat().st_size - 1)
+    assert os.listdir(os.path.join(backend.root, "tmp")) == []
+
+
+def test_range_reads(scan, tmp_path):
+    backend = document_store.LocalDiskBackend(str(tmp_path / "store"))
+    size = scan.stat().st_size
+    stored = _store(scan, backend, size)
+
+    async def read_range(start, end):
+        return b"".join([chunk async for chunk in backend.read(stored.digest, start, end)])
+    content = scan.read_bytes()
+    assert asyncio.run(read_range(size - 100, size - 1)) == content[-100:]
+    assert asyncio.run(read_range(0, size - 1)) == content
+    assert document_store.parse_range("bytes=-100", size) == (size - 100, size - 1)
+
+
+@pytest.fixture
+def uploads(client, monkeypatch):
+    """The client, with a 1 MB document limit and store() failing the test if an upload ever reaches it."""
+    monkeypatch.setattr(document_store, "MAX_DOCUMENT_BYTES", 1024 * 1024)
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("the upload reached the endpoint")
+    monkeypatch.setattr(document_store, "store", unexpected)
+    return client
+
+
+def _register(client, content, **headers):
+    request = client.build_request("POST", "/register_farmer", content=content,
+                                   headers={"Content-Type": "multipart/form-data; boundary=x"})
+    request.headers.update(headers)
+    return client.send(request)
+
+
+def test_upload_requests_are_refused_before_their_body_is_read(uploads):
+    too_large = 1024 * 1024 + document_store.FORM_OVERHEAD_BYTES + 1
+    assert _register(uploads, b"x" * 10, **{"Content-Length": "ten"}).status_code == 400
+    assert _register(uploads, b"x" * too_large).status_code == 413
+
+    # Without a Content-Length the body is counted as it arrives
+    response = _register(uploads, (b"x" * 65536 for _ in range(too_large // 65536 + 1)))
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413 and response.json()["detail"].startswith("Request exceeds"), response.text
+
+
+def test_uploads_within_the_limit_are_stored(client, engine, bearer, tmp_path, monkeypatch):
+    monkeypatch.setattr(document_store, "storage", document_store.LocalDiskBackend(str(tmp_path / "store")))
+    with engine.begin() as conn:
+        conn.execute(insert(models.FarmerAccount), [{"email": "grower@example.com", "hashed_password": "x"}])
+    response = client.post("/register_farmer", headers=bearer("grower@example.com"), data={
+        "name": "Grower", "country": "Kenya", "region": "Central", "address": "1 Hill Road", "farm_size_ha": 2.5,
+    }, files={"identity_document": ("scan.pdf", b"%PDF scan", "application/pdf")})
+    assert response.status_code == 200, response.text
+    assert response.json()["identity_document"].startswith(document_store.URL_PREFIX)
@@ -0,0 +1,69 @@
+# Conditional GET on the polled reads: 304 without a body or a single SQL statement while nothing changed, the
+# full response again after a purchase (which changes the per-token ETag of that token only), and gzip.
+import gzip
+import pytest
+from sqlalchemy import event
+import models
+
+ROUTES = {
+    "/tokens_all?limit=100": (None, "public"),
+    "/tokens_available?limit=100": (None, "public"),
+    "/stats/totals": (None, "public"),
+    "/stats/countries": (None, "public"),
+    "/stats/tokens/{bought}": (None, "public"),
+    "/stats/tokens/{other}": (None, "public"),
+    "/farmer_dashboard": ("farmer1@example.com", "private"),
+    "/my_contracts?limit=100": ("investor1@example.com", "private"),
+    "/investments?limit=100": ("investor1@example.com", "private"),
+    "/portfolio_summary": ("investor1@example.com", "private"),
+}
+
+
+@pytest.fixture
+def tokens(marketplace, db):
+    bought, other = [row.id for row in db.query(models.Token.id).filter(
+        models.Token.is_funded == False, models.Token.token_status == models.TokenStatusEnum.verified,
+        models.Token.tokens_sold < models.Token.token_count,
+    ).order_by(models.Token.id).limit(2)]
+    return {"bought": bought, "other": other}
+
+
+def test_revalidation(client, engine, tokens, bearer):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    etags = {}
+    for route, (email, visibility) in ROUTES.items():
+        path, headers = route.format(**tokens), bearer(email) if email else {}
+        client.get(path, headers=headers)  # warm the account lookup and count caches
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.text)
+        etag = etags[route] = response.headers["etag"]
+        assert etag.startswith('W/"') and response.headers["cache-control"].startswith(visibility), path
+        statements.clear()
+        not_modified = client.get(path, headers={**headers, "If-None-Match": etag})
+        assert not_modified.status_code == 304 and not not_modified.content, path
+        assert not statements, (path, statements)
+
+    # Another investor's ETag for the same page differs; a bad token is not answered 304 but 401
+    mine = etags["/my_contracts?limit=100"]
+    assert client.get("/my_contracts?limit=100", headers=bearer("investor2@example.com")).headers["etag"] != mine
+    bad = client.get("/my_contracts?limit=100", headers={"Authorization": "Bearer nope", "If-None-Match": mine})
+    assert bad.status_code == 401
+
+    response = client.post("/create_contract", headers=bearer("investor1@example.com"),
+                           json={"token_id": tokens["bought"], "quantity": 1, "delivery_type": "money"})
+    assert response.status_code == 200, response.text
+    for route, (email, _) in ROUTES.items():
+        path, headers = route.format(**tokens), bearer(email) if email else {}
+        response = client.get(path, headers={**headers, "If-None-Match": etags[route]})
+        assert response.status_code == (304 if route == "/stats/tokens/{other}" else 200), path
+
+
+def test_large_bodies_are_gzipped(client, marketplace):
+    plain = client.get("/tokens_all?limit=500", headers={"Accept-Encoding": "identity"})
+    compressed = client.send(client.build_request("GET", "/tokens_all?limit=500",
+                                                  headers={"Accept-Encoding": "gzip"}), stream=True)
+    body = b"".join(compressed.iter_raw())
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip" and "Accept-Encoding" in compressed.headers["vary"]
+    assert gzip.decompress(body) == plain.content
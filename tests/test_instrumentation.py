@@ -0,0 +1,53 @@
+# Request instrumentation counts every statement and row, flags N+1 lazy loads but not their eager
+# version, and exports per-route request metrics.
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import selectinload
+import instrumentation, migrations, models
+from benchmarks.common import populate, temp_engine
+
+_LOOKUP = select(models.Token.id, models.Token.tokens_sold).where(models.Token.id == bindparam("token_id"))
+
+
+def _in_request(fn):
+    stats = instrumentation.RequestStats()
+    token = instrumentation._current.set(stats)
+    try:
+        fn()
+    finally:
+        instrumentation._current.reset(token)
+    return stats
+
+
+def test_statements_and_n_plus_one():
+    # Instrumented before its first connection, as main does
+    engine, SessionLocal = temp_engine("instrumented")
+    instrumentation.instrument_engine(engine)
+    migrations.upgrade(engine)
+    populate(engine, tokens=1000)
+
+    def lookups():
+        with engine.connect() as conn:
+            for token_id in range(1, 101):
+                conn.execute(_LOOKUP, {"token_id": token_id}).one()
+    stats = _in_request(lookups)
+    assert stats.statements == 100 and stats.rows == 100
+    assert stats.n_plus_one()[0]["count"] == 100
+
+    def lazy():
+        with SessionLocal() as db:
+            [token.crop.crop_name for token in db.query(models.Token).order_by(models.Token.id).limit(50)]
+
+    def eager():
+        with SessionLocal() as db:
+            [token.crop.crop_name for token in db.query(models.Token).options(selectinload(models.Token.crop))
+             .order_by(models.Token.id).limit(50)]
+    assert _in_request(lazy).n_plus_one()
+    eager_stats = _in_request(eager)
+    assert not eager_stats.n_plus_one() and eager_stats.statements == 2
+    engine.dispose()
+
+
+def test_request_metrics(client, catalog):
+    assert client.get("/tokens_all?limit=20").status_code == 200
+    metrics = client.get("/metrics").text
+    assert 'cropchain_http_requests_total{method="GET",route="/tokens_all",status="200"}' in metrics
@@ -0,0 +1,72 @@
+# Schema migrations: each version does the same on an existing database as on a fresh install.
+import json
+import random
+from datetime import datetime
+from sqlalchemy import insert, inspect
+import aggregates, database, migrations, models, outbox
+from benchmarks.common import populate, temp_engine
+
+
+def _schema(engine) -> dict:
+    """Tables with their columns (type, nullability), primary key, indexes and unique constraints."""
+    inspector = inspect(engine)
+    return {table: {
+        "columns": {c["name"]: (str(c["type"]), c["nullable"]) for c in inspector.get_columns(table)},
+        "primary_key": inspector.get_pk_constraint(table)["constrained_columns"],
+        "indexes": sorted((index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                          for index in inspector.get_indexes(table)),
+        "unique": sorted(tuple(u["column_names"]) for u in inspector.get_unique_constraints(table)),
+    } for table in inspector.get_table_names() if table != "schema_version"}
+
+
+def test_migrations_build_the_schema_the_models_declare():
+    migrated, _ = temp_engine("migrated")
+    declared, _ = temp_engine("declared")
+    migrations.upgrade(migrated)
+    database.Base.metadata.create_all(declared)
+    assert _schema(migrated) == _schema(declared)
+    migrated.dispose()
+    declared.dispose()
+
+
+def test_existing_contracts_are_queued_like_new_ones():
+    engine, SessionLocal = temp_engine("outbox")
+    migrations.upgrade(engine, target=4)
+    populate(engine, tokens=100)
+    with engine.begin() as conn:
+        conn.execute(insert(migrations.BASELINE.tables["contracts"]), [{
+            "id": i, "token_id": i, "farmer_id": 1, "investor_id": 1, "quantity": i, "price_per_token": 10,
+            "total_value": 10 * i, "delivery_type": "money" if i % 2 else "product", "expected_roi": 9.5,
+            "expected_harvest_month": month.name, "payout_status": "pending", "created_at": datetime(2025, 1, 1),
+        } for i, month in enumerate(models.MonthEnum, start=1)])
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        events = {event.aggregate_id: event for event in db.query(models.OutboxEvent)}
+        contracts = db.query(models.Contract, models.Crop.crop_name, models.Crop.variety,
+                             models.Token.funding_deadline) \
+            .join(models.Token, models.Token.id == models.Contract.token_id) \
+            .join(models.Crop, models.Crop.id == models.Token.crop_id).all()
+        assert sorted(events) == list(range(1, 13))
+        for contract, crop_name, variety, deadline in contracts:
+            event = events[contract.id]
+            assert event.topic == outbox.CONTRACT_CREATED and event.status == "pending"
+            assert json.loads(event.payload) == outbox.contract_payload(contract, crop_name, variety, deadline)
+    engine.dispose()
+
+
+def test_funding_aggregates_migration_matches_a_recomputation():
+    engine, SessionLocal = temp_engine("migrations")
+    migrations.upgrade(engine, target=6)
+    populate(engine, tokens=500)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Investment), [
+            {"token_id": rng.randint(1, 500), "investor_id": str(rng.randint(1, 20)), "quantity": rng.randint(1, 9)}
+            for _ in range(300)])
+    assert migrations.upgrade(engine) == [7, 8, 9]
+    with SessionLocal() as db:
+        assert aggregates.check(db) == []
+        assert db.query(models.FundingAggregate).filter(models.FundingAggregate.scope == "total").count() == 0
+        assert aggregates.stats(db, "total")["tokens_offered"] == sum(
+            token.token_count for token in db.query(models.Token.token_count))
+    engine.dispose()
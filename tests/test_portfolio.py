@@ -0,0 +1,46 @@
+# /portfolio_summary's array computation agrees with the same figures computed row by row over the contracts.
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import update
+import crud, models, portfolio
+from benchmarks.common import populate
+
+TODAY = date(2025, 6, 15)
+
+
+def _close(a, b):
+    return abs(a - b) <= 0.01 + 1e-9 * abs(b)
+
+
+def test_summary_matches_row_by_row(engine, db):
+    populate(engine, tokens=1000, contracts=2000, investors=1)
+    with engine.begin() as conn:
+        # A third already paid out, so outstanding figures differ from the totals
+        conn.execute(update(models.Contract).where(models.Contract.id % 3 == 0)
+                     .values(payout_status=models.PayoutStatusEnum.delivered))
+    summary = portfolio.portfolio_summary(db, 1, TODAY)
+
+    countries = dict(db.query(models.Farmer.id, models.Farmer.country).all())
+    invested = payout = 0.0
+    by_crop, by_country, calendar = defaultdict(float), defaultdict(float), defaultdict(float)
+    for row in crud.get_contract_rows_by_investor(db, 1):
+        expected = row.total_value * (1 + row.expected_roi / 100)
+        invested += row.total_value
+        payout += expected
+        if row.payout_status == models.PayoutStatusEnum.pending:
+            by_crop[row.crop_name or portfolio.UNKNOWN] += row.total_value
+            by_country[countries.get(row.farmer_id) or portfolio.UNKNOWN] += row.total_value
+            if row.delivery_type == "money":
+                calendar[row.expected_harvest_month.value] += expected
+
+    assert summary["contracts"] == 2000
+    assert _close(summary["invested"], invested) and _close(summary["expected_payout"], payout)
+    assert len(summary["by_crop"]) == len(by_crop)
+    assert all(_close(group["invested"], by_crop[group["key"]]) for group in summary["by_crop"])
+    assert all(_close(group["invested"], by_country[group["key"]]) for group in summary["by_country"])
+    assert all(_close(month["cash_payout"], calendar.get(month["month"], 0.0)) for month in summary["calendar"])
+
+    # Nothing in the calendar is due before today: the current month's harvests come first, dated today
+    dates = [month["expected_date"] for month in summary["calendar"]]
+    assert summary["calendar"][0]["month"] == "June" and dates[0] == TODAY
+    assert dates == sorted(dates) and dates[1] == date(2025, 7, 1) and dates[-1] == date(2026, 5, 1)
@@ -0,0 +1,106 @@
+# Read endpoints: /farmer_dashboard at a constant number of statements with the same data as the separate
+# endpoints, the list endpoints' bytes equal to validating their rows, and warm requests without account lookups.
+import random
+from datetime import date, datetime, timedelta
+from pydantic import TypeAdapter
+from sqlalchemy import event, insert
+import aggregates, crud, models, schemas
+
+
+def _seed_farmers(engine, token_counts):
+    rng = random.Random(11)
+    with engine.begin() as conn:
+        for n, count in enumerate(token_counts, start=1):
+            account_id = conn.execute(insert(models.FarmerAccount).returning(models.FarmerAccount.id), [{
+                "email": f"grower{n}@example.com", "hashed_password": "x"}]).scalar()
+            farmer_id = conn.execute(insert(models.Farmer).returning(models.Farmer.id), [{
+                "name": f"Grower {n}", "country": "Kenya", "region": "Central", "address": f"{n} Hill Road",
+                "registration_status": models.RegistrationStatusEnum.verified, "account_id": account_id}]).scalar()
+            crop_ids = conn.execute(insert(models.Crop).returning(models.Crop.id), [{
+                "crop_name": "Coffee", "variety": "Arabica", "planting_date": date(2024, 3, 1),
+                "expected_harvest_month": rng.choice(list(models.MonthEnum)), "farmer_id": farmer_id,
+            } for _ in range(max(1, count // 2))]).scalars().all()
+            token_ids = conn.execute(insert(models.Token).returning(models.Token.id), [{
+                "crop_id": rng.choice(crop_ids), "farmer_id": farmer_id, "token_count": 1000, "price_per_token": 10,
+                "expected_yield_unit": "kg", "expected_total_yield": 5000, "expected_roi": 9.5,
+                "tokens_sold": rng.randint(0, 500), "is_funded": False, "funding_deadline": date(2025, 9, 1),
+                "currency": "USDT", "status": "open", "created_at": datetime(2025, 1, 1) + timedelta(seconds=i),
+                "token_status": models.TokenStatusEnum.verified if i % 5 else models.TokenStatusEnum.pending,
+            } for i in range(count)]).scalars().all()
+            conn.execute(insert(models.Contract), [{
+                "token_id": rng.choice(token_ids), "farmer_id": farmer_id, "investor_id": 1, "quantity": 3,
+                "price_per_token": 10, "total_value": 30, "delivery_type": "money", "expected_roi": 9.5,
+                "expected_harvest_month": models.MonthEnum.june,
+                "payout_status": rng.choice(list(models.PayoutStatusEnum)), "created_at": datetime(2025, 1, 1),
+            } for _ in range(count * 4)])
+
+
+def test_farmer_dashboard(client, catalog, engine, db, bearer):
+    token_counts = [1, 10, 100]
+    _seed_farmers(engine, token_counts)
+    aggregates.rebuild(db)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    issued = set()
+    for n, count in enumerate(token_counts, start=1):
+        headers = bearer(f"grower{n}@example.com")
+        client.get("/farmer_dashboard", headers=headers)  # warm the account lookup
+        statements.clear()
+        response = client.get("/farmer_dashboard", headers=headers)
+        assert response.status_code == 200, response.text
+        issued.add(len(statements))
+        dashboard = response.json()
+
+        farmer_id = dashboard["farmer_id"]
+        crops = client.get(f"/crops_by_farmer?farmer_id={farmer_id}").json()
+        tokens = client.get(f"/tokens_by_farmer?farmer_id={farmer_id}&limit=500").json()
+        assert [crop["id"] for crop in dashboard["crops"]] == [crop["id"] for crop in crops]
+        assert [{k: token[k] for k in tokens[0]} for token in dashboard["tokens"]] == tokens
+        assert dashboard["contracts"]["contracts"] == count * 4
+        not_modified = client.get("/farmer_dashboard", headers={**headers, "If-None-Match": response.headers["etag"]})
+        assert not_modified.status_code == 304 and not not_modified.content
+    assert len(issued) == 1, issued
+
+
+def test_list_endpoints_match_their_response_models(client, marketplace, db, bearer):
+    expected = {
+        "/tokens_all?limit=500": (schemas.TokenOut, crud.get_all_tokens(db, limit=500)),
+        "/my_contracts?limit=500": (schemas.ContractOut, crud.get_contract_rows_by_investor(db, 1, limit=500)),
+        "/investments?limit=500": (schemas.InvestmentOut, crud.get_investments_by_investor(db, "1", limit=500)),
+    }
+    for path, (model, rows) in expected.items():
+        validated = TypeAdapter(list[model]).dump_json([model.model_validate(row) for row in rows], by_alias=True)
+        response = client.get(path, headers=bearer("investor1@example.com"))
+        assert response.status_code == 200, response.text
+        assert response.content == validated, path
+        assert len(rows) == 500 and response.headers.get("x-next-cursor"), path
+
+
+def test_warm_requests_skip_the_account_lookup(client, catalog, engine, bearer):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    headers = bearer("investor@example.com")
+    client.get("/my_contracts", headers=headers)
+    statements.clear()
+    assert client.get("/my_contracts", headers=headers).status_code == 200
+    assert not any("investor_accounts" in statement for statement in statements), statements
+
+
+def test_following_the_cursor_returns_every_row(client, marketplace, db, bearer):
+    # What fetchAllPages.js does for the frontend lists
+    expected = {
+        "/tokens_available": [token.id for token in crud.get_filtered_tokens(db=db)],
+        "/my_contracts": [row.id for row in crud.get_contract_rows_by_investor(db, 1)],
+    }
+    headers = bearer("investor1@example.com")
+    for path, ids in expected.items():
+        assert len(ids) > 500, (path, len(ids))
+        seen, params = [], {"limit": 500}
+        while True:
+            response = client.get(path, headers=headers, params=params)
+            assert response.status_code == 200, response.text
+            seen += [row["id"] for row in response.json()]
+            if "x-next-cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["x-next-cursor"]
+        assert sorted(seen) == sorted(ids), path
@@ -0,0 +1,45 @@
+# Marketplace substring filters through the trigram index answer exactly what ILIKE would.
+import pytest
+from sqlalchemy import text
+import crud, http_cache, search_index
+
+FILTERS = [
+    dict(country="nam"), dict(region="delta"), dict(crop_name="coff"), dict(crop_variety="ST2"),
+    dict(country="ghana", crop_name="cocoa", min_roi=19), dict(country="%a_"),
+]
+
+
+def _legacy_filter(db, field, needle):
+    return search_index.SEARCH_FIELDS[field][1].ilike(f"%{needle}%")
+
+
+@pytest.mark.parametrize("filters", FILTERS, ids=lambda f: ",".join(f"{k}={v}" for k, v in f.items()))
+def test_same_tokens_as_ilike(db, catalog, monkeypatch, filters):
+    indexed = sorted(t.id for t in crud.get_filtered_tokens(db=db, **filters))
+    monkeypatch.setattr(search_index, "substring_filter", _legacy_filter)
+    assert indexed == sorted(t.id for t in crud.get_filtered_tokens(db=db, **filters))
+
+
+def test_values_written_out_of_key_order_are_found(db, catalog, engine, monkeypatch):
+    search = search_index.catalog_for(engine)
+    assert search.search(db, "country", "zzland") == [] and search.search(db, "crop_variety", "late-7") == []
+    db.execute(text("UPDATE farmers SET country = 'Zzland' WHERE id = 1"))
+    db.commit()
+    http_cache.versions.bump("farmers")
+    assert search.search(db, "country", "zzland") == ["Zzland"]
+    assert {t.country for t in crud.get_filtered_tokens(db=db, country="zzland")} == {"Zzland"}
+
+    # Another process's write bumps no version here: it shows up once the index is older than the window
+    db.execute(text("UPDATE crops SET variety = 'Late-7' WHERE id = 1"))
+    db.commit()
+    assert search.search(db, "crop_variety", "late-7") == []
+    monkeypatch.setattr(search_index, "REFRESH_SECONDS", 1e-9)
+    assert search.search(db, "crop_variety", "late-7") == ["Late-7"]
+
+
+def test_large_matches_fall_back_to_ilike(db, catalog, engine, monkeypatch):
+    expected = sorted(t.id for t in crud.get_filtered_tokens(db=db, country="a"))
+    monkeypatch.setattr(search_index, "MAX_IN_VALUES", 1)
+    criterion = search_index.substring_filter(db, "country", "a")
+    assert "LIKE" in str(criterion.compile(engine)).upper()
+    assert sorted(t.id for t in crud.get_filtered_tokens(db=db, country="a")) == expected
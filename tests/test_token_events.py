@@ -0,0 +1,61 @@
+# Server push: a purchase reaches the subscribers of its token, its farmer and a matching filter set (not a
+# non-matching one), and a burst of purchases is coalesced into a few messages ending with the final count.
+import json
+import time
+from contextlib import ExitStack
+import models, schemas, token_events
+
+
+def _buy(client, headers, token_id):
+    response = client.post("/create_contract", headers=headers,
+                           json={"token_id": token_id, "quantity": 1, "delivery_type": "money"})
+    assert response.status_code == 200, response.text
+
+
+def _wait_for(condition, timeout: float = 5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_purchases_are_pushed_to_matching_subscribers(client, catalog, db, bearer):
+    token = db.query(models.Token.id, models.Token.farmer_id, models.Farmer.country) \
+        .join(models.Farmer, models.Token.farmer).filter(
+            models.Token.is_funded == False, models.Token.token_status == models.TokenStatusEnum.verified,
+            models.Token.token_count - models.Token.tokens_sold >= 50,
+        ).order_by(models.Token.id).first()
+    subscriptions = {
+        "token": f"token_id={token.id}",
+        "farmer": f"farmer_id={token.farmer_id}",
+        "country": f"country={token.country}",
+        "other country": "country=Atlantis",
+    }
+    headers = bearer("investor@example.com")
+    with ExitStack() as sessions:
+        sockets = {name: sessions.enter_context(client.websocket_connect(f"/ws/token_updates?{query}&rate=2"))
+                   for name, query in subscriptions.items()}
+        _wait_for(lambda: token_events.broker.subscribers == len(sockets))
+
+        _buy(client, headers, token.id)
+        for name in ("token", "farmer", "country"):
+            rows = json.loads(sockets[name].receive_text())
+            assert [row["id"] for row in rows] == [token.id], (name, rows)
+            schemas.TokenOut.model_validate(rows[0])
+        sold = rows[0]["tokens_sold"]
+
+        start = time.perf_counter()
+        for _ in range(20):
+            _buy(client, headers, token.id)
+        elapsed = time.perf_counter() - start
+        messages, last = 0, None
+        while last is None or last["tokens_sold"] < sold + 20:
+            last = json.loads(sockets["token"].receive_text())[-1]
+            messages += 1
+        assert messages <= elapsed * 2 + 2, (messages, elapsed)
+
+        unmatched = token_events.broker._by_filters[(("country", "Atlantis"),)]
+        assert [subscriber.messages for subscriber in unmatched] == [0]
+        for ws in sockets.values():
+            ws.close()
+    _wait_for(lambda: token_events.broker.subscribers == 0)
@@ -0,0 +1,199 @@
+# Server push of token funding progress. The crud writes that change tokens (purchases, status changes, new
+# tokens) publish each token's committed row, the same TokenOut row the listings return, to an in-process
+# broker. /token_updates (Server-Sent Events) and /ws/token_updates (WebSocket) subscribe to some tokens, one
+# farmer's tokens, or a listing filter set. Each subscriber keeps only the latest row of every token that
+# changed since its last message and is sent at most `rate` messages a second (CROPCHAIN_STREAM_RATE), so a
+# burst of purchases of a hot token costs one message per interval, not one per purchase.
+# An idle subscriber is one waiting asyncio task and a few small objects; past MAX_SUBSCRIBERS new ones are
+# refused with TooManySubscribers (503). The broker only knows this process's writes: with several workers,
+# each pushes the purchases it handled, and chain_sync/bulk imports in other processes are not pushed.
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from typing import Optional
+import fast_json
+
+# Messages per second per subscriber (a client may ask for fewer)
+MAX_RATE = float(os.getenv("CROPCHAIN_STREAM_RATE", "2"))
+# Open subscriptions per process
+MAX_SUBSCRIBERS = int(os.getenv("CROPCHAIN_STREAM_MAX_SUBSCRIBERS", "20000"))
+# Comment line sent on an idle event stream so proxies keep the connection open
+HEARTBEAT_SECONDS = 15.0
+
+# Filters of /tokens_available a subscription can use, tested against each published row. Matching is on what
+# a token is, not its funding state: a token leaving an "open" listing is still sent, so clients can drop it.
+SUBSTRING_FILTERS = ("country", "region", "crop_name", "crop_variety")
+FILTERS = SUBSTRING_FILTERS + ("min_roi", "deadline", "organic_only")
+
+
+class TooManySubscribers(Exception):
+    """MAX_SUBSCRIBERS subscriptions are already open in this process."""
+
+
+def matches(filters: tuple, row: dict) -> bool:
+    """Whether a token row passes a subscription's filters, as _filtered_tokens_query would select it."""
+    for name, value in filters:
+        if name in SUBSTRING_FILTERS:
+            if value.lower() not in (row.get(name) or "").lower():
+                return False
+        elif name == "min_roi":
+            if (row.get("expected_roi") or 0) < value:
+                return False
+        elif name == "deadline":
+            if row.get("funding_deadline") is None or row["funding_deadline"] > value:
+                return False
+        elif name == "organic_only":
+            if value and not row.get("organic_certified"):
+                return False
+    return True
+
+
+class Subscriber:
+    """One open stream: the tokens it follows and the rows waiting to be sent to it."""
+
+    __slots__ = ("token_ids", "farmer_id", "filters", "interval", "loop", "pending", "ready", "closed", "messages")
+
+    def __init__(self, token_ids, farmer_id: Optional[int], filters: tuple, rate: float, loop):
+        self.token_ids = frozenset(token_ids or ())
+        self.farmer_id = farmer_id
+        self.filters = filters
+        self.interval = 1.0 / min(rate, MAX_RATE)
+        self.loop = loop
+        # token id -> encoded row: a newer row of the same token replaces the one not yet sent
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.messages = 0
+
+    def offer(self, token_id: int, data: bytes):
+        self.pending[token_id] = data
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def stream(self, heartbeat: Optional[float] = HEARTBEAT_SECONDS):
+        """Yield a JSON array of the changed rows at most once per interval, or None after heartbeat idle
+        seconds. Ends when the subscriber is closed."""
+        while not self.closed:
+            # A timer handle, not wait_for: that would keep one more task alive per idle subscriber
+            timer = heartbeat and self.loop.call_later(heartbeat, self.ready.set)
+            await self.ready.wait()
+            if timer:
+                timer.cancel()
+            self.ready.clear()
+            if self.closed:
+                return
+            if not self.pending:
+                yield None
+                continue
+            rows, self.pending = self.pending, {}
+            self.messages += 1
+            yield b"[" + b",".join(rows.values()) + b"]"
+            # Whatever arrives meanwhile is coalesced into the next message
+            await asyncio.sleep(self.interval)
+
+
+class Broker:
+    """Routes published token rows to subscribers by token id, farmer id, or filter set."""
+
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._by_token = defaultdict(set)
+        self._by_farmer = defaultdict(set)
+        # Subscribers sharing a filter set are matched once per row
+        self._by_filters = defaultdict(set)
+        self.subscribers = 0
+        self.published = 0
+        self.rejected = 0
+
+    @property
+    def active(self) -> bool:
+        return self.subscribers > 0
+
+    def subscribe(self, token_ids=(), farmer_id: Optional[int] = None, filters: dict = None,
+                  rate: float = MAX_RATE) -> Subscriber:
+        """Open a subscription; call from the event loop that will consume it."""
+        filters = tuple(sorted((k, v) for k, v in (filters or {}).items() if k in FILTERS and v not in (None, "")))
+        subscriber = Subscriber(token_ids, farmer_id, filters, rate, asyncio.get_running_loop())
+        with self._lock:
+            if self.subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers()
+            self.subscribers += 1
+            for index, key in self._index_keys(subscriber):
+                index[key].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        with self._lock:
+            removed = False
+            for index, key in self._index_keys(subscriber):
+                members = index.get(key)
+                if members is not None and subscriber in members:
+                    removed = True
+                    members.discard(subscriber)
+                    if not members:
+                        del index[key]
+            if removed:
+                self.subscribers -= 1
+
+    def _index_keys(self, subscriber: Subscriber):
+        if subscriber.token_ids:
+            return [(self._by_token, token_id) for token_id in subscriber.token_ids]
+        if subscriber.farmer_id is not None:
+            return [(self._by_farmer, subscriber.farmer_id)]
+        return [(self._by_filters, subscriber.filters)]
+
+    def publish(self, rows):
+        """Send (farmer_id, TokenOut row dict) pairs to their subscribers. Thread-safe; call after commit."""
+        if not self.active:
+            return
+        deliveries = defaultdict(list)
+        with self._lock:
+            self.published += len(rows)
+            for farmer_id, row in rows:
+                token_id = row["id"]
+                candidates = (*self._by_token.get(token_id, ()), *self._by_farmer.get(farmer_id, ()))
+                targets = {subscriber for subscriber in candidates if matches(subscriber.filters, row)}
+                for filters, members in self._by_filters.items():
+                    if matches(filters, row):
+                        targets.update(members)
+                if not targets:
+                    continue
+                # Encoded once for every subscriber it goes to
+                data = fast_json.dumps(row)
+                for subscriber in targets:
+                    deliveries[subscriber.loop].append((subscriber, token_id, data))
+        # One wake-up per event loop, however many subscribers it serves
+        for loop, batch in deliveries.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, batch)
+            except RuntimeError:
+                pass  # that loop has closed; its subscribers are gone
+
+    def close_all(self):
+        """End every stream (on shutdown, so servers do not wait for open streams)."""
+        with self._lock:
+            subscribers = set().union(*self._by_token.values(), *self._by_farmer.values(), *self._by_filters.values())
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.close)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers, "published": self.published, "rejected": self.rejected,
+            "max_subscribers": self.max_subscribers, "max_rate": MAX_RATE,
+        }
+
+
+def _deliver(batch):
+    for subscriber, token_id, data in batch:
+        if not subscriber.closed:
+            subscriber.offer(token_id, data)
+
+
+broker = Broker()